@@ -13,39 +13,67 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import contextvars
 import mimetypes
 import os
+import queue
 import re
 import shutil
-from typing import Optional
+import threading
+import time
+from typing import Callable, Optional
 
 from smolagents.agent_types import AgentAudio, AgentImage, AgentText, handle_agent_output_types
 from smolagents.agents import ActionStep, MultiStepAgent
-from smolagents.memory import MemoryStep
+from smolagents.memory import FinalAnswerStep, MemoryStep, PlanningStep
+from smolagents.models import ChatMessageStreamDelta
 from smolagents.utils import _is_package_available
 
+from agent_pool import AgentPool
+from run_cache import RunCache, get_run_cache
+from tools import document_store, image_store, research_index, streaming, tracing
+
+
+def clean_model_output(model_output: str) -> str:
+    """Show the model's <code> blocks as Python code and strip legacy <end_code> markers."""
+    model_output = model_output.strip()
+    # <code>...</code> would be swallowed as an HTML tag by the chat's markdown renderer
+    model_output = re.sub(r"<code>\s*(.*?)\s*</code>", lambda m: f"```python\n{m.group(1)}\n```", model_output, flags=re.DOTALL)
+    # Remove any trailing <end_code> and extra backticks, handling multiple possible formats
+    model_output = re.sub(r"```\s*<end_code>", "```", model_output)  # handles ```<end_code>
+    model_output = re.sub(r"<end_code>\s*```", "```", model_output)  # handles <end_code>```
+    model_output = re.sub(r"```\s*\n\s*<end_code>", "```", model_output)  # handles ```\n<end_code>
+    return model_output.strip()
+
 
 def pull_messages_from_step(
     step_log: MemoryStep,
+    streamed: bool = False,
+    ttft: Optional[float] = None,
+    compact: bool = False,
 ):
-    """Extract ChatMessage objects from agent steps with proper nesting"""
+    """Extract ChatMessage objects from agent steps with proper nesting
+
+    With `streamed=True` the step header and model output were already shown token by token,
+    so only the tool call, logs and footnote are yielded. `ttft` is the model's time to first
+    token for this step, shown in the footnote. `compact=True` puts the step header in the
+    same message as the thought and the separator in the same message as the footnote.
+    """
     import gradio as gr
 
     if isinstance(step_log, ActionStep):
         # Output the step number
         step_number = f"Step {step_log.step_number}" if step_log.step_number is not None else ""
-        yield gr.ChatMessage(role="assistant", content=f"**{step_number}**")
+        has_thought = hasattr(step_log, "model_output") and step_log.model_output is not None
+        if not streamed and compact:
+            thought = f"\n\n{clean_model_output(step_log.model_output)}" if has_thought else ""
+            yield gr.ChatMessage(role="assistant", content=f"**{step_number}**{thought}")
+        elif not streamed:
+            yield gr.ChatMessage(role="assistant", content=f"**{step_number}**")
 
         # First yield the thought/reasoning from the LLM
-        if hasattr(step_log, "model_output") and step_log.model_output is not None:
-            # Clean up the LLM output
-            model_output = step_log.model_output.strip()
-            # Remove any trailing <end_code> and extra backticks, handling multiple possible formats
-            model_output = re.sub(r"```\s*<end_code>", "```", model_output)  # handles ```<end_code>
-            model_output = re.sub(r"<end_code>\s*```", "```", model_output)  # handles <end_code>```
-            model_output = re.sub(r"```\s*\n\s*<end_code>", "```", model_output)  # handles ```\n<end_code>
-            model_output = model_output.strip()
-            yield gr.ChatMessage(role="assistant", content=model_output)
+        if not streamed and not compact and has_thought:
+            yield gr.ChatMessage(role="assistant", content=clean_model_output(step_log.model_output))
 
         # For tool calls, create a parent message
         if hasattr(step_log, "tool_calls") and step_log.tool_calls is not None:
@@ -92,6 +120,12 @@ def pull_messages_from_step(
                         content=f"{log_content}",
                         metadata={"title": "📝 Execution Logs", "parent_id": parent_id, "status": "done"},
                     )
+                    # Generated images are shown as thumbnails, served straight from the image store (see launch)
+                    for image_path, thumbnail in image_store.images_in(log_content):
+                        shown = thumbnail or image_path
+                        yield gr.ChatMessage(
+                            role="assistant", content={"path": shown, "mime_type": mimetypes.guess_type(shown)[0]}
+                        )
 
             # Nesting any errors under the tool call
             if hasattr(step_log, "error") and step_log.error is not None:
@@ -110,17 +144,75 @@ def pull_messages_from_step(
 
         # Calculate duration and token information
         step_footnote = f"{step_number}"
-        if hasattr(step_log, "input_token_count") and hasattr(step_log, "output_token_count"):
+        if step_log.token_usage is not None:
             token_str = (
-                f" | Input-tokens:{step_log.input_token_count:,} | Output-tokens:{step_log.output_token_count:,}"
+                f" | Input-tokens:{step_log.token_usage.input_tokens:,} | Output-tokens:{step_log.token_usage.output_tokens:,}"
             )
             step_footnote += token_str
-        if hasattr(step_log, "duration"):
-            step_duration = f" | Duration: {round(float(step_log.duration), 2)}" if step_log.duration else None
-            step_footnote += step_duration
+        if step_log.timing is not None and step_log.timing.duration:
+            step_footnote += f" | Duration: {round(float(step_log.timing.duration), 2)}"
+        if ttft is not None:
+            step_footnote += f" | First token: {ttft:.2f}s"
+        memory_stats = getattr(step_log, "memory_stats", None)
+        if memory_stats and memory_stats["prompt_tokens"] is not None:
+            step_footnote += f" | Prompt: ~{memory_stats['prompt_tokens']:,} tokens"
+            if memory_stats["compacted"]:
+                step_footnote += f" (compacted {memory_stats['compacted']} old steps)"
         step_footnote = f"""<span style="color: #bbbbc2; font-size: 12px;">{step_footnote}</span> """
-        yield gr.ChatMessage(role="assistant", content=f"{step_footnote}")
-        yield gr.ChatMessage(role="assistant", content="-----")
+        if compact:
+            yield gr.ChatMessage(role="assistant", content=f"{step_footnote}\n\n-----")
+        else:
+            yield gr.ChatMessage(role="assistant", content=f"{step_footnote}")
+            yield gr.ChatMessage(role="assistant", content="-----")
+
+
+def format_run_totals(span) -> str:
+    """Footnote with the token totals of a whole run, as counted by its trace span."""
+    totals = span.attributes
+    text = (
+        f"Run: {totals.get('steps', 0)} steps | Input tokens: {totals.get('input_tokens', 0):,} | "
+        f"Output tokens: {totals.get('output_tokens', 0):,}"
+    )
+    if totals.get("tools_input_tokens") or totals.get("tools_output_tokens"):
+        text += f" | Tool model tokens: {totals.get('tools_input_tokens', 0):,} in / {totals.get('tools_output_tokens', 0):,} out"
+    if span.duration is not None:
+        text += f" | Duration: {span.duration:.2f}s"
+    return f'<span style="color: #bbbbc2; font-size: 12px;">{text}</span> '
+
+
+def format_cached_run(entry: dict) -> str:
+    """Footnote for an answer served from the run cache."""
+    age = time.time() - entry["created_at"]
+    age_text = f"{age / 3600:.1f} h" if age >= 3600 else f"{age / 60:.0f} min"
+    input_tokens = sum(step["input_tokens"] or 0 for step in entry["steps"])
+    output_tokens = sum(step["output_tokens"] or 0 for step in entry["steps"])
+    text = (
+        f"♻️ Cached answer from a run {age_text} ago | Saved {len(entry['steps'])} steps, "
+        f"{input_tokens:,} input / {output_tokens:,} output tokens"
+    )
+    return f'<span style="color: #bbbbc2; font-size: 12px;">{text}</span> '
+
+
+def final_answer_message(final_answer):
+    import gradio as gr
+
+    final_answer = handle_agent_output_types(final_answer)
+    if isinstance(final_answer, AgentText):
+        return gr.ChatMessage(
+            role="assistant",
+            content=f"**Final answer:**\n{final_answer.to_string()}\n",
+        )
+    elif isinstance(final_answer, AgentImage):
+        return gr.ChatMessage(
+            role="assistant",
+            content={"path": final_answer.to_string(), "mime_type": "image/png"},
+        )
+    elif isinstance(final_answer, AgentAudio):
+        return gr.ChatMessage(
+            role="assistant",
+            content={"path": final_answer.to_string(), "mime_type": "audio/wav"},
+        )
+    return gr.ChatMessage(role="assistant", content=f"**Final answer:** {str(final_answer)}")
 
 
 def stream_to_gradio(
@@ -128,81 +220,267 @@ def stream_to_gradio(
     task: str,
     reset_agent_memory: bool = False,
     additional_args: Optional[dict] = None,
+    batch: bool = False,
+    min_interval: float = 0.0,
+    compact: bool = False,
+    run_cache: Optional[RunCache] = None,
+    documents: Optional[list] = None,
 ):
-    """Runs an agent with the given task and streams the messages from the agent as gradio ChatMessages."""
+    """Runs an agent with the given task and streams the messages from the agent as gradio ChatMessages.
+
+    The agent runs in a background thread. Model tokens (when the agent has `stream_outputs=True`)
+    and partial output of streaming tools are yielded while they arrive: the same ChatMessage
+    object is yielded again each time its content grows, so callers should append a message
+    only the first time they see it.
+
+    With `batch=True` each yield is instead a list of the messages that are new or changed since
+    the previous yield: all messages of a finished step arrive as one list, and token and tool
+    output updates are coalesced to at most one list per `min_interval` seconds. `compact=True`
+    merges each step's header and separator into neighbouring messages (see pull_messages_from_step).
+
+    With a `run_cache`, a new conversation whose task was answered before gets the cached
+    answer (after its steps, when the cache replays them) instead of a run, and a finished
+    run is offered to the cache. `documents` limits `document_search` to these document ids
+    (the session's uploads).
+    """
     if not _is_package_available("gradio"):
         raise ModuleNotFoundError(
             "Please install 'gradio' extra to use the GradioUI: `pip install 'smolagents[gradio]'`"
         )
     import gradio as gr
 
-    total_input_tokens = 0
-    total_output_tokens = 0
+    pending = {}  # messages changed since the last yield, by id, in order of first change
+    last_flush = 0.0
+
+    def emit(*messages):
+        for message in messages:
+            pending[id(message)] = message
+
+    def deliver():
+        nonlocal last_flush
+        updates = list(pending.values())
+        pending.clear()
+        last_flush = time.perf_counter()
+        if not updates:
+            return
+        if batch:
+            yield updates
+        else:
+            yield from updates
+
+    if run_cache is not None and not run_cache.applies(agent, reset_agent_memory, additional_args):
+        run_cache = None
+    cached = run_cache.get(agent, task, documents) if run_cache is not None else None
+    if cached is not None:
+        steps = run_cache.restore(agent, task, cached)
+        if run_cache.replay:
+            for step in steps:
+                emit(*pull_messages_from_step(step, compact=compact))
+                yield from deliver()
+        emit(final_answer_message(cached["answer"]))
+        emit(gr.ChatMessage(role="assistant", content=format_cached_run(cached)))
+        yield from deliver()
+        return
+
+    events = queue.Queue()
+    finished = object()
+    run = {}
+
+    def run_agent():
+        try:
+            with streaming.capture(events.put), research_index.session(agent), document_store.session(documents):
+                with tracing.run_span(agent, task) as span:
+                    run["span"] = span
+                    answer = None
+                    for event in agent.run(task, stream=True, reset=reset_agent_memory, additional_args=additional_args):
+                        if isinstance(event, FinalAnswerStep):
+                            answer = event.output
+                        events.put(event)
+            if run_cache is not None:
+                try:
+                    run_cache.put(agent, task, answer, documents)
+                except Exception as e:
+                    # The answer is already on its way to the chat: a failed cache write must not replace it with an error
+                    print(f"⚠️ Run cache write failed: {e}")
+        except Exception as e:
+            events.put(e)
+        finally:
+            events.put(finished)
+
+    worker = threading.Thread(target=contextvars.copy_context().run, args=(run_agent,), name="agent-run", daemon=True)
+    worker.start()
+
+    step_number = 1
+    step_started = time.perf_counter()
+    ttft = None
+    draft = None  # model output of the current step, filled token by token
+    draft_prefix = ""
+    tool_messages = {}
+    final_answer = None
+    try:
+        while True:
+            # While coalesced updates are pending, wake up when they are due even if no event arrives
+            timeout = max(0.0, min_interval - (time.perf_counter() - last_flush)) if pending else None
+            try:
+                event = events.get(timeout=timeout)
+            except queue.Empty:
+                yield from deliver()
+                continue
+            if event is finished:
+                break
+            step_done = False
+
+            if isinstance(event, ChatMessageStreamDelta):
+                if not event.content:
+                    continue
+                if draft is None:
+                    ttft = time.perf_counter() - step_started
+                    header = f"**Step {step_number}**"
+                    if compact:
+                        draft_prefix = f"{header}\n\n"
+                    else:
+                        draft_prefix = ""
+                        emit(gr.ChatMessage(role="assistant", content=header))
+                    draft = gr.ChatMessage(role="assistant", content=draft_prefix)
+                draft.content += event.content
+                emit(draft)
+
+            elif isinstance(event, streaming.ToolStream):
+                message = tool_messages.get(event)
+                if message is None:
+                    message = tool_messages[event] = gr.ChatMessage(
+                        role="assistant",
+                        content="",
+                        metadata={"title": f"✍️ {event.label} (streaming...)", "status": "pending"},
+                    )
+                message.content = event.text
+                if event.closed:
+                    first_token = f" | First token: {event.ttft:.2f}s" if event.ttft is not None else ""
+                    message.metadata = {"title": f"✍️ {event.label}{first_token}", "status": "done"}
+                emit(message)
+
+            elif isinstance(event, ActionStep):
+                if draft is not None and event.model_output is not None:
+                    draft.content = draft_prefix + clean_model_output(event.model_output)
+                    emit(draft)
+                emit(*pull_messages_from_step(event, streamed=draft is not None, ttft=ttft, compact=compact))
+                step_number = event.step_number + 1
+                step_started, ttft, draft, tool_messages = time.perf_counter(), None, None, {}
+                step_done = True
+
+            elif isinstance(event, PlanningStep):
+                if draft is not None:
+                    draft.content = draft_prefix + event.plan
+                    emit(draft)
+                    emit(gr.ChatMessage(role="assistant", content="-----"))
+                step_started, ttft, draft = time.perf_counter(), None, None
+                step_done = True
+
+            elif isinstance(event, FinalAnswerStep):
+                final_answer = event.output
+
+            elif isinstance(event, Exception):
+                emit(gr.ChatMessage(role="assistant", content=str(event), metadata={"title": "💥 Error"}))
+                yield from deliver()
+                return
+
+            if step_done or time.perf_counter() - last_flush >= min_interval:
+                yield from deliver()
+        yield from deliver()
+    finally:
+        # The chat was closed or the run failed mid-way: let the agent stop at its next step
+        if worker.is_alive():
+            agent.interrupt()
+
+    emit(final_answer_message(final_answer))
+
+    span = run.get("span")
+    if span is not None:
+        emit(gr.ChatMessage(role="assistant", content=format_run_totals(span)))
+    yield from deliver()
 
-    for step_log in agent.run(task, stream=True, reset=reset_agent_memory, additional_args=additional_args):
-        # Track tokens if model provides them
-        if hasattr(agent.model, "last_input_token_count") and agent.model.last_input_token_count is not None:
-            total_input_tokens += agent.model.last_input_token_count or 0
-            total_output_tokens += agent.model.last_output_token_count or 0
-            if isinstance(step_log, ActionStep):
-                step_log.input_token_count = agent.model.last_input_token_count or 0
-                step_log.output_token_count = agent.model.last_output_token_count or 0
 
-        for message in pull_messages_from_step(
-            step_log,
-        ):
-            yield message
+class GradioUI:
+    """A one-line interface to launch your agent in Gradio
 
-    final_answer = step_log  # Last log is the run's final_answer
-    final_answer = handle_agent_output_types(final_answer)
-
-    if isinstance(final_answer, AgentText):
-        yield gr.ChatMessage(
-            role="assistant",
-            content=f"**Final answer:**\n{final_answer.to_string()}\n",
-        )
-    elif isinstance(final_answer, AgentImage):
-        yield gr.ChatMessage(
-            role="assistant",
-            content={"path": final_answer.to_string(), "mime_type": "image/png"},
-        )
-    elif isinstance(final_answer, AgentAudio):
-        yield gr.ChatMessage(
-            role="assistant",
-            content={"path": final_answer.to_string(), "mime_type": "audio/wav"},
-        )
-    else:
-        yield gr.ChatMessage(role="assistant", content=f"**Final answer:** {str(final_answer)}")
+    `agent` may also be a zero-argument callable returning a new agent. It is then called once
+    per browser session (see `AgentPool`), so every session keeps its own memory; the callable
+    should reuse the tools and model client of an existing agent. A single agent instance is
+    shared by all sessions, one run at a time.
 
+    The chat sends the browser at most one update per `stream_interval` seconds while tokens
+    stream (CHAT_STREAM_INTERVAL, default 0.1) and one update per finished step, and renders
+    only the latest `render_window` messages (CHAT_RENDER_WINDOW, default 80); the full session
+    history stays on the server and "Load more" shows earlier messages.
 
-class GradioUI:
-    """A one-line interface to launch your agent in Gradio"""
+    `run_cache` (default: the RUN_CACHE_* settings, off unless RUN_CACHE_TTL is set) answers
+    the first question of a session from an earlier run of the same question when possible.
+    """
 
-    def __init__(self, agent: MultiStepAgent, file_upload_folder: str | None = None):
+    def __init__(
+        self,
+        agent: MultiStepAgent | Callable[[], MultiStepAgent],
+        file_upload_folder: str | None = None,
+        pool: AgentPool | None = None,
+        render_window: int | None = None,
+        stream_interval: float | None = None,
+        run_cache: RunCache | None = None,
+    ):
         if not _is_package_available("gradio"):
             raise ModuleNotFoundError(
                 "Please install 'gradio' extra to use the GradioUI: `pip install 'smolagents[gradio]'`"
             )
         self.agent = agent
+        if pool is None:
+            pool = AgentPool.from_env(agent if not isinstance(agent, MultiStepAgent) else lambda: agent)
+        self.pool = pool
+        self.render_window = render_window or int(os.getenv("CHAT_RENDER_WINDOW", 80))
+        self.stream_interval = stream_interval if stream_interval is not None else float(os.getenv("CHAT_STREAM_INTERVAL", 0.1))
+        self.run_cache = run_cache if run_cache is not None else get_run_cache()
         self.file_upload_folder = file_upload_folder
         if self.file_upload_folder is not None:
             if not os.path.exists(file_upload_folder):
                 os.mkdir(file_upload_folder)
 
-    def interact_with_agent(self, prompt, messages):
+    def interact_with_agent(self, prompt, messages, session_id: str = "default", documents: Optional[list] = None):
         import gradio as gr
 
         messages.append(gr.ChatMessage(role="user", content=prompt))
         yield messages
-        for msg in stream_to_gradio(self.agent, task=prompt, reset_agent_memory=False):
-            messages.append(msg)
+        ticket = self.pool.enqueue(session_id)
+        try:
+            queued = None
+            while not ticket.wait(timeout=1.0):
+                position = self.pool.position(ticket)
+                if queued is None:
+                    queued = gr.ChatMessage(role="assistant", content="", metadata={"title": "⏳ Queued", "status": "pending"})
+                    messages.append(queued)
+                queued.content = f"All agents are busy. You are number {position} in the queue."
+                yield messages
+            if queued is not None:
+                messages.remove(queued)
+
+            shown = set()
+            for updates in stream_to_gradio(
+                ticket.agent, task=prompt, reset_agent_memory=False,
+                batch=True, min_interval=self.stream_interval, compact=True, run_cache=self.run_cache,
+                documents=documents,
+            ):
+                # Streaming messages come again as they grow; only append them once
+                for msg in updates:
+                    if id(msg) not in shown:
+                        shown.add(id(msg))
+                        messages.append(msg)
+                yield messages
             yield messages
-        yield messages
+        finally:
+            self.pool.release(ticket)
 
     def upload_file(
         self,
         file,
         file_uploads_log,
+        document_ids=None,
         allowed_file_types=[
             "application/pdf",
             "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
@@ -211,19 +489,23 @@ class GradioUI:
     ):
         """
         Handle file uploads, default allowed types are .pdf, .docx, and .txt
+
+        Returns the status, the session's file paths and the session's document ids: the ids
+        (not the paths) are what limits `document_search` to this session's uploads.
         """
         import gradio as gr
 
+        document_ids = list(document_ids or [])
         if file is None:
-            return gr.Textbox("No file uploaded", visible=True), file_uploads_log
+            return gr.Textbox("No file uploaded", visible=True), file_uploads_log, document_ids
 
         try:
             mime_type, _ = mimetypes.guess_type(file.name)
         except Exception as e:
-            return gr.Textbox(f"Error: {e}", visible=True), file_uploads_log
+            return gr.Textbox(f"Error: {e}", visible=True), file_uploads_log, document_ids
 
         if mime_type not in allowed_file_types:
-            return gr.Textbox("File type disallowed", visible=True), file_uploads_log
+            return gr.Textbox("File type disallowed", visible=True), file_uploads_log, document_ids
 
         # Sanitize file name
         original_name = os.path.basename(file.name)
@@ -236,34 +518,82 @@ class GradioUI:
             if t not in type_to_ext:
                 type_to_ext[t] = ext
 
-        # Ensure the extension correlates to the mime type
-        sanitized_name = sanitized_name.split(".")[:-1]
-        sanitized_name.append("" + type_to_ext[mime_type])
-        sanitized_name = "".join(sanitized_name)
-
-        # Save the uploaded file to the specified folder
-        file_path = os.path.join(self.file_upload_folder, os.path.basename(sanitized_name))
+        # Ensure the extension correlates to the mime type (keeping the original one when it does, e.g. .txt rather than .pot)
+        extension = os.path.splitext(sanitized_name)[1]
+        if mimetypes.types_map.get(extension.lower()) != mime_type:
+            extension = type_to_ext[mime_type]
+        sanitized_name = os.path.splitext(sanitized_name)[0] + extension
+
+        # Save the uploaded file to the specified folder, under a subfolder named after its content: sessions
+        # uploading different files with the same name never overwrite each other's copy
+        store = document_store.get_store()
+        folder = os.path.join(self.file_upload_folder, store.file_id(file.name))
+        os.makedirs(folder, exist_ok=True)
+        file_path = os.path.join(folder, os.path.basename(sanitized_name))
         shutil.copy(file.name, file_path)
 
-        return gr.Textbox(f"File uploaded: {file_path}", visible=True), file_uploads_log + [file_path]
+        # Parse and index it once, in the background, for document_search
+        doc_id = store.submit(file_path)
+        return (
+            gr.Textbox(f"File uploaded: {file_path} (indexing in the background)", visible=True),
+            file_uploads_log + [file_path],
+            document_ids + [doc_id] if doc_id not in document_ids else document_ids,
+        )
 
     def log_user_message(self, text_input, file_uploads_log):
         return (
             text_input
             + (
-                f"\nYou have been provided with these files, which might be helpful or not: {file_uploads_log}"
+                f"\nYou have been provided with these files, which might be helpful or not: {file_uploads_log}. "
+                "They are already parsed and indexed: use document_search to read the parts you need instead of opening them."
                 if len(file_uploads_log) > 0
                 else ""
             ),
             "",
         )
 
+    def visible_messages(self, messages: list, window: int) -> list:
+        """The latest `window` messages, behind a note saying how many earlier ones are hidden."""
+        import gradio as gr
+
+        hidden = len(messages) - window
+        if hidden <= 0:
+            return messages
+        note = gr.ChatMessage(
+            role="assistant",
+            content=f"⬆️ {hidden} earlier messages are hidden. Use **Load more** above the chat to show them.",
+        )
+        return [note] + messages[-window:]
+
     def launch(self, **kwargs):
         import gradio as gr
 
+        def interact(prompt, messages, window, document_ids, request: gr.Request):
+            # `messages` is the session's full history (server-side state, extended in place); the chatbot gets a window of it
+            documents = list(document_ids) if self.file_upload_folder is not None else None
+            for current in self.interact_with_agent(
+                prompt, messages, session_id=request.session_hash or "default", documents=documents
+            ):
+                yield self.visible_messages(current, window), gr.update(visible=len(current) > window)
+
+        def load_more(messages, window):
+            window += self.render_window
+            return self.visible_messages(messages, window), window, gr.update(visible=len(messages) > window)
+
+        def end_session(request: gr.Request):
+            self.pool.drop(request.session_hash)
+
+        # Images and thumbnails are served from disk instead of being copied into Gradio's cache
+        os.makedirs(image_store.DEFAULT_IMAGE_DIR, exist_ok=True)
+        gr.set_static_paths([image_store.DEFAULT_IMAGE_DIR])
+
         with gr.Blocks(fill_height=True) as demo:
             stored_messages = gr.State([])
+            chat_history = gr.State([])
+            window = gr.State(self.render_window)
             file_uploads_log = gr.State([])
+            document_ids = gr.State([])
+            load_more_button = gr.Button("⬆️ Load more", size="sm", visible=False)
             chatbot = gr.Chatbot(
                 label="Agent",
                 type="messages",
@@ -274,21 +604,27 @@ class GradioUI:
                 resizable=True,
                 scale=1,
             )
+            load_more_button.click(load_more, [chat_history, window], [chatbot, window, load_more_button])
             # If an upload folder is provided, enable the upload feature
             if self.file_upload_folder is not None:
                 upload_file = gr.File(label="Upload a file")
                 upload_status = gr.Textbox(label="Upload Status", interactive=False, visible=False)
                 upload_file.change(
                     self.upload_file,
-                    [upload_file, file_uploads_log],
-                    [upload_status, file_uploads_log],
+                    [upload_file, file_uploads_log, document_ids],
+                    [upload_status, file_uploads_log, document_ids],
                 )
             text_input = gr.Textbox(lines=1, label="Chat Message")
             text_input.submit(
                 self.log_user_message,
                 [text_input, file_uploads_log],
                 [stored_messages, text_input],
-            ).then(self.interact_with_agent, [stored_messages, chatbot], [chatbot])
+            # The agent pool bounds concurrent runs and shows queue positions, so Gradio itself need not serialize
+            ).then(
+                interact, [stored_messages, chat_history, window, document_ids], [chatbot, load_more_button],
+                concurrency_limit=None,
+            )
+            demo.unload(end_session)
 
         demo.launch(debug=True, share=False, **kwargs)
 
@@ -0,0 +1,157 @@
+"""Session-scoped agents with a bounded number of concurrent runs.
+
+Every chat session gets its own agent (own memory and python executor) from `factory`,
+which is expected to reuse the already-built tools and model client. At most
+`max_concurrent_runs` agents run at once; further runs wait in a FIFO queue and can report
+their position. Sessions idle for longer than `idle_timeout` seconds, or beyond
+`max_sessions`, are evicted together with their agent memory.
+"""
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Optional
+
+
+class _Session:
+    def __init__(self, agent):
+        self.agent = agent
+        self.last_used = time.time()
+
+
+class RunTicket:
+    """A place in the run queue; `granted` is set once the run may start."""
+
+    def __init__(self, number: int, session_id: str):
+        self.number = number
+        self.session_id = session_id
+        self.agent = None
+        self.granted = threading.Event()
+        self.enqueued_at = time.time()
+        self.started_at = None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.granted.wait(timeout)
+
+
+class AgentPool:
+    def __init__(self, factory: Callable, max_concurrent_runs: int = 4, idle_timeout: float = 1800, max_sessions: int = 200):
+        self.factory = factory
+        self.max_concurrent_runs = max(1, max_concurrent_runs)
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.created = 0
+        self.evicted = 0
+        self.started = 0
+        self.total_wait = 0.0
+        self._sessions = OrderedDict()
+        self._waiting = deque()
+        self._running = set()
+        self._numbers = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, factory: Callable) -> "AgentPool":
+        return cls(
+            factory,
+            max_concurrent_runs=int(os.getenv("AGENT_MAX_CONCURRENT_RUNS", 4)),
+            idle_timeout=float(os.getenv("AGENT_SESSION_IDLE_SECONDS", 1800)),
+            max_sessions=int(os.getenv("AGENT_MAX_SESSIONS", 200)),
+        )
+
+    def _busy_agents(self) -> set:
+        return {id(ticket.agent) for ticket in self._running}
+
+    def _grant(self):
+        """Start waiting runs in arrival order while slots are free.
+
+        A run whose agent is still busy (same session submitted twice, or a shared agent)
+        is skipped until that agent is free, so one agent never runs twice at once.
+        """
+        busy = self._busy_agents()
+        for ticket in list(self._waiting):
+            if len(self._running) >= self.max_concurrent_runs:
+                break
+            if id(ticket.agent) in busy:
+                continue
+            self._waiting.remove(ticket)
+            self._running.add(ticket)
+            busy.add(id(ticket.agent))
+            ticket.started_at = time.time()
+            self.started += 1
+            self.total_wait += ticket.started_at - ticket.enqueued_at
+            ticket.granted.set()
+
+    def _evict_idle(self):
+        active = {ticket.session_id for ticket in self._running} | {ticket.session_id for ticket in self._waiting}
+        now = time.time()
+        for session_id, session in list(self._sessions.items()):
+            over_capacity = len(self._sessions) > self.max_sessions
+            if session_id in active or not (over_capacity or now - session.last_used > self.idle_timeout):
+                continue
+            del self._sessions[session_id]
+            self.evicted += 1
+
+    def enqueue(self, session_id: str) -> RunTicket:
+        """Queue a run for the session's agent (created on first use)."""
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id)
+        if session is None:
+            # Built outside the lock so other sessions are not held up while an agent is cloned
+            agent = self.factory()
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session is None:
+                    session = self._sessions[session_id] = _Session(agent)
+                    self.created += 1
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            session.last_used = time.time()
+            ticket = RunTicket(next(self._numbers), session_id)
+            ticket.agent = session.agent
+            self._waiting.append(ticket)
+            self._grant()
+            return ticket
+
+    def position(self, ticket: RunTicket) -> int:
+        """1-based position among waiting runs, 0 once the run has started."""
+        with self._lock:
+            try:
+                return self._waiting.index(ticket) + 1
+            except ValueError:
+                return 0
+
+    def release(self, ticket: RunTicket):
+        """Finish a run, or withdraw it from the queue if it never started."""
+        with self._lock:
+            self._running.discard(ticket)
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+            session = self._sessions.get(ticket.session_id)
+            if session is not None:
+                session.last_used = time.time()
+            self._grant()
+
+    def drop(self, session_id: str):
+        """Forget a session (e.g. its browser tab was closed) unless it is running."""
+        with self._lock:
+            if any(ticket.session_id == session_id for ticket in self._running):
+                return
+            if self._sessions.pop(session_id, None) is not None:
+                self.evicted += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "running": len(self._running),
+                "waiting": len(self._waiting),
+                "max_concurrent_runs": self.max_concurrent_runs,
+                "agents_created": self.created,
+                "sessions_evicted": self.evicted,
+                "runs_started": self.started,
+                "avg_queue_wait": round(self.total_wait / self.started, 2) if self.started else 0.0,
+            }
@@ -8,21 +8,25 @@ timezone conversion, and optional OpenAI-powered tools.
 # ======================
 # Imports
 # ======================
+# Heavy dependencies (openai, ddgs, gradio) are imported on first use: tools are
+# registered as LazyTools and the model and agent are built by get_agent().
 import os
 import datetime
+import importlib.util
+import threading
 import pytz
-import requests
 import yaml
 from dotenv import load_dotenv
 
-from smolagents import CodeAgent, InferenceClientModel, OpenAIModel, load_tool, tool
+from smolagents import CodeAgent, tool
+from smolagents.memory import ActionStep, PlanningStep
+from code_executor import DEFAULT_MAX_RUNAWAY, ContextPythonExecutor, runaway_actions
+from memory_compaction import MemoryCompactor
+from model_router import RouterModel
+from run_cache import get_run_cache
+from tools import http_client, rate_limit, research_index, tracing
 from tools.final_answer import FinalAnswerTool
-from tools.web_search import DuckDuckGoSearchTool as WebSearchTool
-from tools.openai_tools import (
-    OpenAITextAnalysisTool,
-    OpenAICodeReviewTool,
-    OpenAICreativeWritingTool,
-)
+from tools.registry import LazyTool
 from Gradio_UI import GradioUI
 
 # ======================
@@ -58,17 +62,92 @@ def system_status() -> str:
         f"✅ System Status Report - {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
         f"🔑 HF Token: {'✅ Loaded' if hf_token else '❌ Missing'}",
         f"🔑 OpenAI Key: {'✅ Loaded' if openai_key else '❌ Missing'}",
-        f"🤖 Model: {'OpenAI GPT-4o-mini' if openai_key else 'HuggingFace Qwen'}",
+        "🤖 Model: " + (
+            MODEL_LABELS[model_backends()[0]] if len(model_backends()) == 1
+            else "routed over " + ", ".join(MODEL_LABELS[name] for name in model_backends())
+        ),
         "🕐 Timezone Tool: ✅ Working",
-        "🔍 Web Search: ✅ Initialized (ddgs package)",
+        "🔍 Web Search: ✅ Initialized (ddgs package, batched multi-query)",
         "🖼️ Image Generation: ✅ Loaded from HF Hub",
     ]
+    search_tool = globals().get("web_search_tool")
+    if getattr(search_tool, "loaded", False) and search_tool.load().cache is not None:
+        cache_stats = search_tool.load().cache.stats()
+        status.append(
+            f"🗄️ Search Cache: {cache_stats['entries']} entries | "
+            f"hits {cache_stats['hits']} / misses {cache_stats['misses']}"
+        )
+    if getattr(image_generation_tool, "loaded", False):
+        image_stats = image_generation_tool.load().store.stats()
+        status.append(
+            f"🖼️ Image Store: {image_stats['images']} images, {image_stats['bytes'] / 1e6:.1f}/{image_stats['max_bytes'] / 1e6:.0f} MB "
+            f"({image_stats['format']}) | {image_stats['evicted']} evicted"
+        )
+    http_stats = http_client.connection_stats()
+    if http_stats:
+        reused = sum(host["reused"] for host in http_stats.values())
+        sent = sum(host["requests"] for host in http_stats.values())
+        status.append(f"🌐 HTTP Pool: {len(http_stats)} hosts | {reused}/{sent} requests on reused connections")
+    limits = rate_limit.stats()
+    if limits:
+        status.append("🚦 Rate Limits: " + " | ".join(
+            f"{l['provider']} {l['in_flight']}/{l['limit']} in flight, avg wait {l['avg_wait']:.2f}s"
+            + (f", {l['throttled']} throttled" if l["throttled"] else "")
+            + (f", ⛔ blocked {l['blocked_for']:.0f}s" if l["blocked_for"] >= 1 else "")
+            for l in limits
+        ))
+    runaway = runaway_actions()
+    if runaway:
+        limit = int(os.getenv("CODE_EXECUTION_MAX_RUNAWAY", DEFAULT_MAX_RUNAWAY))
+        status.append(f"🧵 Code Execution: {runaway} timed-out code actions still running (new ones refused at {limit})")
+    tool_times = tracing.get_tracer().metrics.summary("agent_tool_duration_seconds", "name")
+    if tool_times:
+        slowest = sorted(tool_times.items(), key=lambda item: -item[1]["total"])[:3]
+        status.append("⏱️ Tool time: " + " | ".join(
+            f"{name} {entry['count']} calls, avg {entry['avg']:.2f}s" for name, entry in slowest
+        ))
+    if _agent is not None and isinstance(_agent.model, RouterModel):
+        status.append("🧭 Model Router: " + " | ".join(
+            f"{b['name']} {'✅' if b['state'] == 'closed' else '⛔ ' + b['state']}"
+            + (f" p50 {b['p50']:.2f}s" if b["p50"] is not None else "")
+            + (f", {b['errors']} errors" if b["errors"] else "")
+            for b in _agent.model.stats()["backends"]
+        ))
+    run_cache = get_run_cache()
+    if run_cache is not None:
+        run_stats = run_cache.stats()
+        status.append(
+            f"♻️ Run Cache: {run_stats['entries']} answers | "
+            f"hits {run_stats['hits']} / misses {run_stats['misses']} | {run_stats['skipped']} runs not reusable"
+        )
+    index = research_index.current()
+    if index is not None and index.documents:
+        index_stats = index.stats()
+        status.append(
+            f"📚 Research Index: {index_stats['documents']} sources, {index_stats['chunks']} passages "
+            f"({'BM25 + vectors' if index_stats['vectors'] else 'BM25'}) | {index_stats['searches']} local searches"
+        )
+    lazy_tools = [t for t in working_tools if isinstance(t, LazyTool)]
+    status.append(f"🧰 Tools built: {sum(t.loaded for t in lazy_tools)}/{len(lazy_tools)} (the rest load on first use)")
     if openai_key:
         status.extend([
-            "📝 Text Analysis: ✅ OpenAI-powered",
+            "📝 Text Analysis: ✅ OpenAI-powered (single and batch)",
             "💻 Code Review: ✅ OpenAI-powered",
             "✍️ Creative Writing: ✅ OpenAI-powered",
         ])
+        from tools.openai_client import get_cache
+        openai_cache = get_cache().stats()
+        status.append(
+            f"🗄️ OpenAI Response Cache: {openai_cache['entries']} entries | "
+            f"hits {openai_cache['hits'] + openai_cache['disk_hits']} / misses {openai_cache['misses']}"
+        )
+    if upload_folder:
+        from tools.document_store import get_store
+        document_stats = get_store().stats()
+        status.append(
+            f"📄 Documents: {document_stats['ready']} indexed ({document_stats['chunks']} passages) | "
+            f"{document_stats['pending']} parsing | {document_stats['failed']} failed"
+        )
     status.append("🚀 Agent: Ready to help!")
     return "\n".join(status)
 
@@ -90,7 +169,9 @@ final_answer = FinalAnswerTool()
 # ======================
 # Model Selection
 # ======================
-if openai_key:
+def _openai_model():
+    from smolagents import OpenAIModel
+
     model = OpenAIModel(
         model_id="gpt-4o-mini",
         api_key=openai_key,
@@ -98,7 +179,12 @@ if openai_key:
         temperature=0.1,
     )
     print("🚀 Using OpenAI GPT-4o-mini model")
-else:
+    return model
+
+
+def _hf_model():
+    from smolagents import InferenceClientModel
+
     model = InferenceClientModel(
         model_id="Qwen/Qwen2.5-Coder-32B-Instruct",
         max_tokens=2096,
@@ -106,18 +192,75 @@ else:
         token=hf_token,
     )
     print("📡 Using HuggingFace Qwen model (fallback)")
+    return model
+
+
+MODEL_LABELS = {"openai": "OpenAI GPT-4o-mini", "hf": "HuggingFace Qwen"}
+
+
+def model_backends() -> list:
+    """The providers the agent's model uses, in order.
+
+    One provider (OpenAI when its key is set, else HF) unless MODEL_ROUTER_BACKENDS opts in to
+    routing by naming several, e.g. "openai,hf".
+    """
+    available = ["openai", "hf"] if openai_key else ["hf"]
+    requested = [name.strip() for name in os.getenv("MODEL_ROUTER_BACKENDS", "").split(",")]
+    return [name for name in dict.fromkeys(requested) if name in available] or available[:1]
+
+
+def build_model():
+    """Create the agent's model (this imports the OpenAI or HF inference client).
+
+    When MODEL_ROUTER_BACKENDS names more than one provider, calls go through a RouterModel
+    that prefers the fastest healthy one and fails over to the others.
+    """
+    providers = {"openai": _openai_model, "hf": _hf_model}
+    names = model_backends()
+    if len(names) == 1:
+        return providers[names[0]]()
+
+    model = RouterModel.from_env([(name, providers[name]()) for name in names])
+    print(f"🧭 Routing model calls over {', '.join(names)} (fastest healthy provider first{', hedged' if model.hedge else ''})")
+    return model
 
 # ======================
 # Load External Tools
 # ======================
 # Load image generation tool
+def _image_generation_unavailable(prompt: str) -> str:
+    return f"Image generation unavailable. Requested image: {prompt}"
+
+
+def _image_search_unavailable(query: str) -> str:
+    return f"Image search unavailable. Query: {query}"
+
+
+def _image_result_unavailable(job_id: str, wait_seconds: float = None) -> str:
+    return f"❌ Image generation unavailable: no result for job {job_id}"
+
+
+# The image tools are built on first use; one that fails to import or construct then answers with these stubs
 try:
-    from tools.image_generation import HuggingFaceImageGenerationTool, ImageSearchTool
-    image_generation_tool = HuggingFaceImageGenerationTool()
-    image_search_tool = ImageSearchTool()
-    print("✅ Custom image generation tool loaded")
+    def _image_job_tool(tool_class_name):
+        def build():
+            from tools import image_generation
+            return getattr(image_generation, tool_class_name)(image_generation_tool.load())
+        return build
+
+    image_generation_tool = LazyTool("tools.image_generation:HuggingFaceImageGenerationTool", fallback=_image_generation_unavailable)
+    image_job_tools = [
+        LazyTool("tools.image_generation:ImageGenerationSubmitTool", factory=_image_job_tool("ImageGenerationSubmitTool"),
+                 fallback=_image_generation_unavailable),
+        LazyTool("tools.image_generation:ImageGenerationResultTool", factory=_image_job_tool("ImageGenerationResultTool"),
+                 fallback=_image_result_unavailable),
+    ]
+    image_search_tool = LazyTool("tools.image_generation:ImageSearchTool", fallback=_image_search_unavailable)
+    print("✅ Custom image generation tool registered")
 except Exception as e:
+    # Only reached when the tools' module cannot even be read for their names and inputs
     print(f"⚠️ Could not load custom image generation tool: {e}")
+    image_job_tools = []
 
     @tool
     def image_generation_tool(prompt: str) -> str:
@@ -125,7 +268,7 @@ except Exception as e:
         Args:
             prompt: Description of the image to generate
         """
-        return f"Image generation unavailable. Requested image: {prompt}"
+        return _image_generation_unavailable(prompt)
     
     @tool
     def image_search_tool(query: str) -> str:
@@ -133,7 +276,7 @@ except Exception as e:
         Args:
             query: What kind of image to search for
         """
-        return f"Image search unavailable. Query: {query}"
+        return _image_search_unavailable(query)
 
 # Load prompt templates
 with open("prompts.yaml", "r") as stream:
@@ -148,13 +291,18 @@ working_tools = [
     system_status,
 ]
 
-# Web search
-try:
-    web_search_tool = WebSearchTool()
-    working_tools.append(web_search_tool)
-    print("✅ Web search tool loaded")
-except Exception as e:
-    print(f"⚠️ Web search tool failed: {e}")
+# Web search (DuckDuckGo, or the JSON backend in WEB_SEARCH_ENDPOINT)
+if importlib.util.find_spec("ddgs") is not None or os.getenv("WEB_SEARCH_ENDPOINT"):
+    def _multi_search_tool():
+        from tools.web_search import MultiQueryWebSearchTool
+        return MultiQueryWebSearchTool(search_tool=web_search_tool.load())
+
+    web_search_tool = LazyTool("tools.web_search:DuckDuckGoSearchTool")
+    multi_search_tool = LazyTool("tools.web_search:MultiQueryWebSearchTool", factory=_multi_search_tool)
+    working_tools.extend([web_search_tool, multi_search_tool])
+    print("✅ Web search tools registered")
+else:
+    print("⚠️ Web search tool failed: ddgs is not installed and WEB_SEARCH_ENDPOINT is not set")
 
     @tool
     def web_search_fallback(query: str) -> str:
@@ -166,40 +314,98 @@ except Exception as e:
 
     working_tools.append(web_search_fallback)
 
+# Web page reader (plain HTTP, no extra dependencies)
+working_tools.append(LazyTool("tools.visit_webpage:VisitWebpageTool"))
+
+# Searches the session's index of the search results and pages seen so far (see tools/research_index.py)
+working_tools.append(LazyTool("tools.research_index:LocalSearchTool"))
+
+# Uploaded files (enabled by UPLOAD_FOLDER) are parsed once in the background and searched by passage
+upload_folder = os.getenv("UPLOAD_FOLDER")
+if upload_folder:
+    working_tools.append(LazyTool("tools.document_store:DocumentSearchTool"))
+    print(f"✅ File uploads enabled ({upload_folder}), with document_search")
+
 # Image generation and search
-working_tools.extend([image_generation_tool, image_search_tool])
+working_tools.extend([image_generation_tool, image_search_tool, *image_job_tools])
 
 # OpenAI-powered tools
 if openai_key:
-    try:
-        text_analysis_tool = OpenAITextAnalysisTool()
-        code_review_tool = OpenAICodeReviewTool()
-        creative_writing_tool = OpenAICreativeWritingTool()
-        working_tools.extend([text_analysis_tool, code_review_tool, creative_writing_tool])
-        print("✅ OpenAI-powered tools added successfully")
-    except Exception as e:
-        print(f"⚠️ Could not load OpenAI tools: {e}")
+    working_tools.extend([
+        LazyTool("tools.openai_tools:OpenAITextAnalysisTool"),
+        LazyTool("tools.openai_tools:OpenAIBatchTextAnalysisTool"),
+        LazyTool("tools.openai_tools:OpenAICodeReviewTool"),
+        LazyTool("tools.openai_tools:OpenAICreativeWritingTool"),
+    ])
+    print("✅ OpenAI-powered tools registered")
 else:
     print("ℹ️ OpenAI tools skipped (no API key)")
 
-print(f"📋 Loaded {len(working_tools)} tools")
+# Runs independent calls to any of the tools above on a thread pool, from inside the agent's code
+def _parallel_map_tool():
+    from tools.parallel_map import ParallelMapTool
+    return ParallelMapTool(tools=working_tools)
+
+
+working_tools.append(LazyTool("tools.parallel_map:ParallelMapTool", factory=_parallel_map_tool))
+
+# Every tool call becomes a trace span (see tools/tracing.py)
+tracing.instrument_tools(working_tools)
+print(f"📋 Registered {len(working_tools)} tools")
 
 # ======================
 # Initialize Agent
 # ======================
-agent = CodeAgent(
-    model=model,
-    tools=working_tools,
-    max_steps=10,
-    verbosity_level=2,
-    name="HuggingFaceAIAgent",
-    description="A helpful AI agent with web search, image generation, and enhanced capabilities",
-    prompt_templates=prompt_templates
-)
+_agent = None
+_agent_lock = threading.Lock()
+
+
+def build_agent(model=None) -> CodeAgent:
+    """Build a new agent over the shared (lazily constructed) tools and `model` (a new one by default)."""
+    return CodeAgent(
+        model=tracing.instrument_model(model or build_model()),
+        tools=working_tools,
+        max_steps=10,
+        verbosity_level=2,
+        name="HuggingFaceAIAgent",
+        description="A helpful AI agent with web search, image generation, and enhanced capabilities",
+        prompt_templates=prompt_templates,
+        stream_outputs=True,
+        # Keeps the replayed history of a long chat session under AGENT_MEMORY_TOKEN_BUDGET
+        # Tracing runs after compaction so step spans include the prompt size it measured
+        step_callbacks={
+            ActionStep: [MemoryCompactor.from_env(), tracing.step_callback],
+            PlanningStep: tracing.step_callback,
+        },
+        # Code actions keep the run's context (tool streaming, trace spans, research index) and a
+        # CODE_EXECUTION_TIMEOUT limit (see code_executor.py)
+        executor=ContextPythonExecutor.from_env(),
+    )
+
+
+def get_agent() -> CodeAgent:
+    """The app's agent, built on first use."""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = build_agent()
+    return _agent
+
+
+def new_session_agent() -> CodeAgent:
+    """A fresh agent (own memory and python executor) reusing the tools and model client of get_agent()."""
+    return build_agent(model=get_agent().model)
+
 
 # ======================
 # Launch Interface
 # ======================
 if __name__ == "__main__":
     print("🚀 Launching HuggingFace AI Agent...")
-    GradioUI(agent).launch()
+    if os.getenv("METRICS_PORT"):
+        tracing.serve_metrics(int(os.getenv("METRICS_PORT")))
+        print(f"📈 Metrics on http://localhost:{os.getenv('METRICS_PORT')}/metrics")
+    # Build the model client in the background while Gradio starts; the first chat waits for it if needed
+    threading.Thread(target=get_agent, name="agent-warmup", daemon=True).start()
+    GradioUI(new_session_agent, file_upload_folder=upload_folder).launch()
@@ -0,0 +1,215 @@
+"""
+Headless batch mode: run a JSONL file of tasks through the agent and write JSONL results.
+
+Usage:
+    python batch_runner.py tasks.jsonl [-o results.jsonl] [--workers 4] [--mode thread|process]
+                           [--timeout 300] [--max-steps 10] [--retry-failed]
+                           [--factory app:new_session_agent]
+
+Each input line is {"id": "...", "task": "..."} ("id" is optional and defaults to the line
+number; "additional_args" is passed to agent.run). Every task gets a fresh agent from
+`--factory`; in thread mode these share the tools and model client of one process, in
+process mode each worker process builds its own. Results are appended to the output file
+as soon as each task finishes, with per-step durations, token counts and tool-call counts.
+
+Re-running the same command resumes: tasks whose id already has a result in the output file
+are skipped (add --retry-failed to run errored and timed-out tasks again). The timeout
+interrupts the agent at its next step boundary; a tool call in progress is not killed.
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable
+
+FINISHED = ("ok", "max_steps")
+
+_factories = {}
+_factory_lock = threading.Lock()
+
+
+def load_factory(path: str) -> Callable:
+    """Import "module:function" once per process."""
+    with _factory_lock:
+        if path not in _factories:
+            module_name, attribute = path.split(":")
+            _factories[path] = getattr(importlib.import_module(module_name), attribute)
+        return _factories[path]
+
+
+def read_tasks(path: str) -> list:
+    tasks = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "task" not in record:
+                raise ValueError(f"{path}:{line_number}: missing 'task'")
+            record["id"] = str(record.get("id", f"line-{line_number}"))
+            tasks.append(record)
+    return tasks
+
+
+def read_done(path: str, retry_failed: bool) -> set:
+    """Ids that already have a result; a torn last line from a crash is ignored."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not retry_failed or result.get("status") in FINISHED:
+                done.add(str(result.get("id")))
+    return done
+
+
+def step_metrics(agent) -> list:
+    from smolagents.memory import ActionStep
+
+    from run_cache import count_tool_calls
+
+    steps = []
+    for step in agent.memory.steps:
+        if not isinstance(step, ActionStep):
+            continue
+        memory_stats = getattr(step, "memory_stats", None) or {}
+        steps.append({
+            "step": step.step_number,
+            "duration": round(step.timing.duration, 3) if step.timing and step.timing.duration else None,
+            "input_tokens": step.token_usage.input_tokens if step.token_usage else None,
+            "output_tokens": step.token_usage.output_tokens if step.token_usage else None,
+            "prompt_tokens": memory_stats.get("prompt_tokens"),
+            "tool_calls": count_tool_calls(step.code_action, agent.tools),
+            "error": str(step.error) if step.error else None,
+        })
+    return steps
+
+
+def run_task(factory_path: str, record: dict, timeout: float = None, max_steps: int = None) -> dict:
+    """Run one task on a fresh agent. Used directly by threads and pickled into worker processes."""
+    from smolagents.utils import AgentMaxStepsError
+
+    from tools import research_index, tracing
+
+    started = time.time()
+    result = {"id": record["id"], "task": record["task"], "worker": f"{os.getpid()}/{threading.current_thread().name}"}
+    agent = None
+    timer = None
+    timed_out = threading.Event()
+    span = None
+    try:
+        agent = load_factory(factory_path)()
+        if timeout:
+            def interrupt():
+                timed_out.set()
+                agent.interrupt()
+
+            timer = threading.Timer(timeout, interrupt)
+            timer.daemon = True
+            timer.start()
+        with research_index.session(agent), tracing.run_span(agent, record["task"], task_id=record["id"]) as span:
+            output = agent.run(record["task"], reset=True, max_steps=max_steps, additional_args=record.get("additional_args"))
+        result["status"] = "ok"
+        result["output"] = str(output)
+    except Exception as e:
+        result["status"] = "timeout" if timed_out.is_set() else "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+    steps = step_metrics(agent) if agent is not None else []
+    if result["status"] == "ok" and isinstance(getattr(agent.memory.steps[-1], "error", None), AgentMaxStepsError):
+        result["status"] = "max_steps"  # the output is the model's best effort without a final_answer call
+    tool_calls = {}
+    for step in steps:
+        for name, count in step["tool_calls"].items():
+            tool_calls[name] = tool_calls.get(name, 0) + count
+    # The run span counts every model call once (planning calls included); tool-side OpenAI calls separately
+    run_totals = span.attributes if span is not None else {}
+    result.update({
+        "duration": round(time.time() - started, 3),
+        "trace_id": span.trace_id if span is not None else None,
+        "steps": steps,
+        "totals": {
+            "steps": len(steps),
+            "input_tokens": run_totals.get("input_tokens", sum(s["input_tokens"] or 0 for s in steps)),
+            "output_tokens": run_totals.get("output_tokens", sum(s["output_tokens"] or 0 for s in steps)),
+            "tool_input_tokens": run_totals.get("tools_input_tokens", 0),
+            "tool_output_tokens": run_totals.get("tools_output_tokens", 0),
+            "tool_calls": tool_calls,
+        },
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tasks", help="JSONL file with one {\"id\", \"task\"} object per line")
+    parser.add_argument("-o", "--output", help="Results JSONL (default: <tasks>.results.jsonl)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mode", choices=("thread", "process"), default="thread")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds per task before the agent is interrupted")
+    parser.add_argument("--max-steps", type=int, default=None)
+    parser.add_argument("--retry-failed", action="store_true", help="Also re-run tasks whose earlier result was an error or timeout")
+    parser.add_argument("--factory", default="app:new_session_agent", help="module:function returning a fresh agent")
+    args = parser.parse_args()
+
+    output = args.output or f"{os.path.splitext(args.tasks)[0]}.results.jsonl"
+    tasks = read_tasks(args.tasks)
+    done = read_done(output, args.retry_failed)
+    pending = [t for t in tasks if t["id"] not in done]
+    print(f"📋 {len(tasks)} tasks, {len(tasks) - len(pending)} already done, running {len(pending)} "
+          f"on {args.workers} {args.mode} workers -> {output}", file=sys.stderr)
+    if not pending:
+        return
+
+    pool_class = ThreadPoolExecutor if args.mode == "thread" else ProcessPoolExecutor
+    counts = {}
+    started = time.time()
+    with open(output, "a", encoding="utf-8") as out, pool_class(max_workers=args.workers) as pool:
+        queue = iter(pending)
+        running = set()
+
+        def submit_next():
+            record = next(queue, None)
+            if record is not None:
+                running.add(pool.submit(run_task, args.factory, record, args.timeout, args.max_steps))
+
+        # Submit only as many tasks as there are workers so an interrupted batch leaves nothing half-queued
+        for _ in range(args.workers):
+            submit_next()
+        try:
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    running.discard(future)
+                    result = future.result()
+                    out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+                    out.flush()
+                    os.fsync(out.fileno())
+                    counts[result["status"]] = counts.get(result["status"], 0) + 1
+                    print(f"[{sum(counts.values())}/{len(pending)}] {result['id']}: {result['status']} "
+                          f"in {result['duration']}s, {result['totals']['steps']} steps", file=sys.stderr)
+                    submit_next()
+        except KeyboardInterrupt:
+            print("⏹️ Interrupted; finished results are saved, re-run the same command to resume", file=sys.stderr)
+            for future in running:
+                future.cancel()
+            raise
+
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"✅ Done in {time.time() - started:.1f}s: {summary}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Offline end-to-end benchmark of the agent loop: scripted model, real tools, mock services.
+
+Usage:
+    python benchmarks/agent_bench.py [--scenarios search_and_read,text_tools,...] [--iterations 8]
+                                     [--concurrency 4] [--first-token 0.3] [--tokens-per-second 80]
+                                     [--save results.json] [--compare baseline.json --tolerance 0.25]
+
+The agents are built by `app.build_agent()` exactly as in the app (same tools, prompts,
+step callbacks and executor), but the LLM is a `ScriptedModel` that replays a fixed code
+action per step after a configurable first-token delay and token rate, and every tool talks
+to `mock_services.MockServices` on localhost (search, pages, image generation, OpenAI chat
+completions), so a run needs no network or API keys and is repeatable.
+
+For each scenario it reports tasks/second, p50/p95 step latency, p50/p95 framework overhead
+(step time minus the scripted model's time, i.e. prompt building, parsing, the executor,
+tools and callbacks) and memory: peak RSS and, with --tracemalloc, peak Python allocations.
+Each iteration uses a fresh query/prompt so the search, page, OpenAI and image caches see
+the same mix of misses a new task would; one untimed warm-up task per scenario first loads
+the lazily imported tools (--no-warmup to measure that cold start too). With --compare, the run exits with status 1 when
+throughput drops or p95 overhead grows by more than --tolerance against a saved baseline.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_services import MockServices  # noqa: E402
+
+from smolagents.models import ChatMessage, ChatMessageStreamDelta, MessageRole, Model  # noqa: E402
+from smolagents.monitoring import TokenUsage  # noqa: E402
+
+SAMPLE_CODE = '''
+def load_users(path):
+    users = []
+    for line in open(path):
+        name, age = line.split(",")
+        users.append({"name": name, "age": int(age)})
+    return users
+'''
+
+# One code action per step; {n} is replaced by the iteration number and {base} by the mock server URL
+SCENARIOS = {
+    "search_and_read": [
+        'Thought: I will search the web first.\n<code>\nresults = web_search(query="python asyncio tutorial {n}")\nprint(results[:400])\n</code>',
+        'Thought: The first result looks relevant, let me read it.\n<code>\npage = visit_webpage(url="{base}/pages/tech_blog_code.html")\nprint(page[:800])\n</code>',
+        'Thought: I will also read the reference page.\n<code>\npage = visit_webpage(url="{base}/pages/docs_sidebar.html")\nprint(page[:800])\n</code>',
+        'Thought: I have enough to answer.\n<code>\nfinal_answer("asyncio runs coroutines on an event loop ({n})")\n</code>',
+    ],
+    "parallel_search": [
+        'Thought: Several independent searches, run them together.\n<code>\nresults = web_search_many(queries=["rust ownership {n}", "go channels {n}", "python gil {n}", "java loom {n}"])\nprint(results[:600])\n</code>',
+        'Thought: Done.\n<code>\nfinal_answer("compared concurrency models ({n})")\n</code>',
+    ],
+    "text_tools": [
+        'Thought: Summarise the text with the analysis tool.\n<code>\nsummary = text_analysis(text="Release {n}: the team shipped streaming, pooling and compaction. " * 20, task="summary")\nprint(summary)\n</code>',
+        'Thought: Now review the code.\n<code>\nreview = code_review(code="""' + SAMPLE_CODE + '# revision {n}\n""", language="python")\nprint(review[:600])\n</code>',
+        'Thought: Done.\n<code>\nfinal_answer(summary[:200])\n</code>',
+    ],
+    "image": [
+        'Thought: Generate the image.\n<code>\nresult = image_generation(prompt="a lighthouse at dawn, variant {n}")\nprint(result)\n</code>',
+        'Thought: Done.\n<code>\nfinal_answer(result)\n</code>',
+    ],
+}
+
+
+class ScriptedModel(Model):
+    """A stand-in LLM that returns `script[i]` on its i-th call, with simulated latency.
+
+    The delay is `first_token_latency` plus one token per 1/`tokens_per_second` (a token is
+    approximated as 4 characters). The time spent in every call is kept in `call_seconds` so
+    the benchmark can separate model time from the rest of a step.
+    """
+
+    def __init__(self, script: list, first_token_latency: float = 0.3, tokens_per_second: float = 80.0, **kwargs):
+        super().__init__(model_id="scripted-model", **kwargs)
+        self.script = list(script)
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.call_seconds = []
+
+    def _next_output(self) -> str:
+        index = len(self.call_seconds)
+        if index < len(self.script):
+            return self.script[index]
+        return 'Thought: The script is over.\n<code>\nfinal_answer("script exhausted")\n</code>'
+
+    def _usage(self, messages, output: str) -> TokenUsage:
+        prompt_chars = sum(len(str(m.content if hasattr(m, "content") else m.get("content"))) for m in messages)
+        return TokenUsage(input_tokens=prompt_chars // 4, output_tokens=max(1, len(output) // 4))
+
+    def generate(self, messages, stop_sequences=None, response_format=None, tools_to_call_from=None, **kwargs) -> ChatMessage:
+        started = time.perf_counter()
+        output = self._next_output()
+        time.sleep(self.first_token_latency + (len(output) / 4) / self.tokens_per_second)
+        self.call_seconds.append(time.perf_counter() - started)
+        return ChatMessage(role=MessageRole.ASSISTANT, content=output, token_usage=self._usage(messages, output))
+
+    def generate_stream(self, messages, stop_sequences=None, response_format=None, tools_to_call_from=None, **kwargs):
+        started = time.perf_counter()
+        output = self._next_output()
+        time.sleep(self.first_token_latency)
+        pieces = [output[i:i + 16] for i in range(0, len(output), 16)]
+        for piece in pieces:
+            time.sleep((len(piece) / 4) / self.tokens_per_second)
+            yield ChatMessageStreamDelta(content=piece)
+        # Recorded before the final usage delta so the time is kept even if the consumer stops early
+        self.call_seconds.append(time.perf_counter() - started)
+        yield ChatMessageStreamDelta(content="", token_usage=self._usage(messages, output))
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def configure_environment(services: MockServices, workdir: str):
+    """Point the app at the mock services and keep every cache inside `workdir`."""
+    os.environ.update(services.env())
+    os.environ.setdefault("HUGGINGFACE_API_TOKEN", "hf_agent_bench")
+    os.environ["OPENAI_API_KEY"] = "sk-agent-bench"
+    os.environ["IMAGE_OUTPUT_DIR"] = os.path.join(workdir, "images")
+    os.environ["VISIT_WEBPAGE_CACHE_DIR"] = os.path.join(workdir, "pages")
+    os.environ["WEB_SEARCH_CACHE_PATH"] = os.path.join(workdir, "search_cache.sqlite")
+    os.environ.pop("OPENAI_CACHE_DISK_PATH", None)
+
+
+def run_task(app, scenario: str, n: int, base_url: str, args, quiet_console) -> dict:
+    from smolagents.memory import ActionStep
+
+    script = [step.replace("{n}", str(n)).replace("{base}", base_url) for step in SCENARIOS[scenario]]
+    model = ScriptedModel(script, first_token_latency=args.first_token, tokens_per_second=args.tokens_per_second)
+    started = time.perf_counter()
+    agent = app.build_agent(model=model)
+    if quiet_console is not None:
+        agent.logger.console = quiet_console  # keep the rich step log out of the measurement
+    error, answer = None, None
+    try:
+        answer = agent.run(f"Benchmark task {scenario} #{n}", reset=True)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    duration = time.perf_counter() - started
+
+    steps, overheads, errors = [], [], []
+    action_steps = [s for s in agent.memory.steps if isinstance(s, ActionStep)]
+    for step, model_seconds in zip(action_steps, model.call_seconds):
+        if step.timing and step.timing.duration:
+            steps.append(step.timing.duration)
+            overheads.append(step.timing.duration - model_seconds)
+        if step.error:
+            errors.append(str(step.error)[:200])
+    return {"duration": duration, "steps": steps, "overheads": overheads, "errors": errors, "error": error, "answer": answer}
+
+
+def run_scenario(app, scenario: str, services: MockServices, args, quiet_console) -> dict:
+    if not args.no_warmup:
+        # Lazy tools import their modules (openai, markdownify, ...) on first use; keep that out of the numbers
+        run_task(app, scenario, -1, services.url, args, quiet_console)
+    before = dict(services.requests)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(
+            lambda n: run_task(app, scenario, n, services.url, args, quiet_console),
+            range(args.iterations),
+        ))
+    wall = time.perf_counter() - started
+    steps = [s for r in results for s in r["steps"]]
+    overheads = [o for r in results for o in r["overheads"]]
+    failures = [r["error"] for r in results if r["error"]] + [e for r in results for e in r["errors"]]
+    return {
+        "tasks": len(results),
+        "wall_seconds": round(wall, 3),
+        "tasks_per_second": round(len(results) / wall, 3),
+        "task_p50": round(percentile([r["duration"] for r in results], 50), 3),
+        "step_p50": round(percentile(steps, 50), 3),
+        "step_p95": round(percentile(steps, 95), 3),
+        "overhead_p50": round(percentile(overheads, 50), 3),
+        "overhead_p95": round(percentile(overheads, 95), 3),
+        "steps": len(steps),
+        "service_requests": {k: v - before.get(k, 0) for k, v in services.requests.items() if v - before.get(k, 0)},
+        "failures": failures[:5],
+        "failure_count": len(failures),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions beyond `tolerance` (a fraction) against a saved run."""
+    regressions = []
+    for scenario, current in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(scenario)
+        if not old:
+            continue
+        if current["tasks_per_second"] < old["tasks_per_second"] * (1 - tolerance):
+            regressions.append(f"{scenario}: throughput {old['tasks_per_second']} -> {current['tasks_per_second']} tasks/s")
+        # Overheads are small; ignore jitter below 20 ms
+        if current["overhead_p95"] > old["overhead_p95"] * (1 + tolerance) + 0.02:
+            regressions.append(f"{scenario}: p95 overhead {old['overhead_p95']} -> {current['overhead_p95']} s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--iterations", type=int, default=8, help="Tasks per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Agents running at once")
+    parser.add_argument("--first-token", type=float, default=0.3, help="Scripted model seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="Scripted model output rate")
+    parser.add_argument("--service-latency", type=float, default=None, help="Override every mock service's latency (seconds)")
+    parser.add_argument("--no-warmup", action="store_true", help="Include each scenario's first (cold) task in the numbers")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also track peak Python allocations (slows the run)")
+    parser.add_argument("--show-steps", action="store_true", help="Print the agents' step log instead of discarding it")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON written earlier with --save")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression against --compare (fraction)")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    latency = {route: args.service_latency for route in ("search", "page", "image", "chat")} if args.service_latency is not None else None
+    services = MockServices(latency=latency).start()
+    workdir = tempfile.mkdtemp(prefix="agent_bench_")
+    configure_environment(services, workdir)
+
+    quiet_console = None
+    if not args.show_steps:
+        from rich.console import Console
+        quiet_console = Console(file=io.StringIO())
+
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if args.tracemalloc:
+        tracemalloc.start()
+    import app  # after configure_environment: the tools read their endpoints from the environment
+
+    results = {
+        "config": {k: getattr(args, k) for k in ("iterations", "concurrency", "first_token", "tokens_per_second", "service_latency")},
+        "scenarios": {},
+    }
+    print(f"🧪 Offline agent benchmark: {args.iterations} tasks x {len(scenarios)} scenarios, "
+          f"{args.concurrency} concurrent, model {args.first_token}s + {args.tokens_per_second:g} tok/s\n")
+    print(f"{'scenario':<18}{'tasks/s':>9}{'step p50':>10}{'step p95':>10}{'ovh p50':>10}{'ovh p95':>10}{'fails':>7}")
+    for scenario in scenarios:
+        result = run_scenario(app, scenario, services, args, quiet_console)
+        results["scenarios"][scenario] = result
+        print(f"{scenario:<18}{result['tasks_per_second']:>9.2f}{result['step_p50']:>9.3f}s{result['step_p95']:>9.3f}s"
+              f"{result['overhead_p50']:>9.3f}s{result['overhead_p95']:>9.3f}s{result['failure_count']:>7}")
+
+    results["memory"] = {
+        "start_rss_mb": round(start_rss / 1024, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "threads": threading.active_count(),
+    }
+    if args.tracemalloc:
+        results["memory"]["tracemalloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        tracemalloc.stop()
+    memory = results["memory"]
+    print(f"\n💾 Peak RSS {memory['peak_rss_mb']} MB (started at {memory['start_rss_mb']} MB)"
+          + (f", peak Python allocations {memory['tracemalloc_peak_mb']} MB" if args.tracemalloc else ""))
+    print(f"🌐 Mock service requests: {dict(services.requests)}")
+    for scenario, result in results["scenarios"].items():
+        for failure in result["failures"]:
+            print(f"⚠️ {scenario}: {failure}")
+    services.stop()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"📝 Saved results to {args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ Regressions against {args.compare} (tolerance {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print(f"✅ No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
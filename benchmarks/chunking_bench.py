@@ -0,0 +1,120 @@
+"""
+Chunked (map-reduce) text_analysis and code_review against a single unchunked pass.
+
+Usage:
+    python benchmarks/chunking_bench.py [--sizes 8000,24000,48000] [--iterations 3]
+                                        [--chat-latency 0.3] [--prompt-tokens-per-second 4000]
+
+Each input is sent to the real tools twice, as one prompt holding the whole input
+(chunked=False) and as a chunked run (`analyze_chunked` / `review_chunked`: parallel map calls
+plus the reduce call, the path chunked=True takes), against the OpenAI stand-in
+of `mock_services.MockServices`. The stand-in answers after its latency plus the prompt's
+tokens / --prompt-tokens-per-second, so a long single prompt costs what it would on a real
+provider. The speed-up reported is the median single-pass time divided by the median chunked
+time; the response cache is off so every iteration calls the stand-in.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_services import MockServices  # noqa: E402
+
+PARAGRAPH = (
+    "The committee reviewed the quarterly figures for every region and noted that shipping delays, "
+    "not demand, explained most of the shortfall. Several members asked for a breakdown by product line "
+    "before the next meeting, and the finance team agreed to circulate one together with revised forecasts."
+)
+
+FUNCTION = '''
+def handler_{n}(request, retries=3):
+    """Handle request {n}, retrying transient failures."""
+    for attempt in range(retries):
+        try:
+            response = request.send(timeout=5 + attempt)
+            if response.status == 200:
+                return response.json()
+        except ConnectionError:
+            continue
+    return None
+'''
+
+
+def make_text(tokens: int, count_tokens) -> str:
+    paragraphs = []
+    while count_tokens("\n\n".join(paragraphs)) < tokens:
+        paragraphs.extend(f"{len(paragraphs) + i}. {PARAGRAPH}" for i in range(20))
+    return "\n\n".join(paragraphs)
+
+
+def make_code(tokens: int, count_tokens) -> str:
+    functions = []
+    while count_tokens("".join(functions)) < tokens:
+        functions.extend(FUNCTION.format(n=len(functions) + i) for i in range(20))
+    return "".join(functions)
+
+
+def timed(call, iterations: int) -> tuple:
+    durations, result = [], None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = call()
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="8000,24000,48000", help="Comma-separated input sizes in tokens")
+    parser.add_argument("--iterations", type=int, default=3, help="Runs per input and mode (the median is reported)")
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="Stand-in seconds per chat completion")
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=4000.0, help="Stand-in prompt processing rate")
+    args = parser.parse_args()
+
+    services = MockServices(latency={"chat": args.chat_latency},
+                            chat_prompt_tokens_per_second=args.prompt_tokens_per_second).start()
+    os.environ.update(services.env())
+    os.environ["OPENAI_API_KEY"] = "sk-chunking-bench"
+    os.environ["OPENAI_CACHE_MAX_TEMPERATURE"] = "-1"  # no cached answers: every run calls the stand-in
+    os.environ.pop("OPENAI_CACHE_DISK_PATH", None)
+
+    from tools.chunking import count_tokens
+    from tools.openai_tools import OpenAICodeReviewTool, OpenAITextAnalysisTool
+
+    text_analysis, code_review = OpenAITextAnalysisTool(), OpenAICodeReviewTool()
+    cases = []
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        text, code = make_text(size, count_tokens), make_code(size, count_tokens)
+        cases.append((
+            f"text_analysis {size}",
+            lambda text=text: text_analysis.forward(text, "summary", chunked=False),
+            lambda text=text: text_analysis.analyze_chunked(text, "summary"),
+        ))
+        cases.append((
+            f"code_review {size}",
+            lambda code=code: code_review.forward(code, "python", chunked=False),
+            lambda code=code: code_review.review_chunked(code, "python"),
+        ))
+
+    print(f"📦 Chunked vs single pass: {args.iterations} runs each, stand-in {args.chat_latency}s "
+          f"+ {args.prompt_tokens_per_second:g} prompt tok/s\n")
+    print(f"{'input':<22}{'chunks':>7}{'single':>9}{'chunked':>9}{'map':>8}{'reduce':>8}{'speed-up':>10}")
+    for label, single_pass, chunked_run in cases:
+        single, _ = timed(single_pass, args.iterations)
+        chunked, (result, stats) = timed(chunked_run, args.iterations)
+        if stats is None or result.startswith("Error"):
+            print(f"{label:<22}  ⚠️ {result[:100]}")
+            continue
+        print(f"{label:<22}{stats['chunks']:>7}{single:>8.2f}s{chunked:>8.2f}s{stats['map_seconds']:>7.2f}s"
+              f"{stats['reduce_seconds']:>7.2f}s{single / chunked:>9.2f}x")
+    print(f"\n🌐 Mock service requests: {dict(services.requests)}")
+    services.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark the visit_webpage HTML -> markdown engines over the saved pages in benchmarks/corpus.
+
+Usage:
+    python benchmarks/html_extraction_bench.py [--iterations 20] [--engines lexbor markdownify]
+
+For every engine it reports pages/sec, peak Python memory during one pass over the
+corpus (tracemalloc) and the markdown output size compared to the raw HTML.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.html_extraction import available_engines, get_engine  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+def load_corpus(corpus_dir: str = CORPUS_DIR) -> dict:
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(corpus_dir, "*.html"))):
+        with open(path, "r", encoding="utf-8") as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+def bench_engine(name: str, pages: dict, iterations: int) -> dict:
+    engine = get_engine(name)
+    html_list = list(pages.values())
+
+    # Warm up once (imports, parser initialisation), then measure peak memory on a single pass
+    outputs = [engine.convert(html) for html in html_list]
+    tracemalloc.start()
+    for html in html_list:
+        engine.convert(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for html in html_list:
+            engine.convert(html)
+    elapsed = time.perf_counter() - start
+
+    input_chars = sum(len(html) for html in html_list)
+    output_chars = sum(len(out) for out in outputs)
+    return {
+        "engine": name,
+        "pages_per_sec": iterations * len(html_list) / elapsed,
+        "peak_mem_kb": peak / 1024,
+        "output_chars": output_chars,
+        "output_ratio": output_chars / input_chars,
+        "per_page": {page: len(out) for page, out in zip(pages, outputs)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--engines", nargs="*", default=None, help="Engines to compare (default: all installed)")
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus)
+    if not pages:
+        raise SystemExit(f"No .html files found in {args.corpus}")
+    engines = args.engines or available_engines()
+    print(f"📄 {len(pages)} pages, {sum(len(p) for p in pages.values()):,} chars of HTML, {args.iterations} iterations\n")
+
+    results = [bench_engine(name, pages, args.iterations) for name in engines]
+    print(f"{'engine':<14}{'pages/sec':>12}{'peak mem (KB)':>16}{'output chars':>15}{'out/in':>9}")
+    for r in results:
+        print(
+            f"{r['engine']:<14}{r['pages_per_sec']:>12.1f}{r['peak_mem_kb']:>16.0f}"
+            f"{r['output_chars']:>15,}{r['output_ratio']:>9.2f}"
+        )
+
+    print("\nOutput size per page (chars):")
+    print(f"{'page':<28}" + "".join(f"{r['engine']:>14}" for r in results))
+    for page in pages:
+        print(f"{page:<28}" + "".join(f"{r['per_page'][page]:>14,}" for r in results))
+
+
+if __name__ == "__main__":
+    main()
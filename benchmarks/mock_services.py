@@ -0,0 +1,218 @@
+"""
+Local stand-ins for the HTTP services the tools call, for offline benchmarks.
+
+One threaded HTTP server on 127.0.0.1 answers:
+
+    GET  /search?q=...&max_results=N   JSON search results (the WEB_SEARCH_ENDPOINT format)
+    GET  /pages/<name>                 pages from benchmarks/corpus, with ETag / 304 support
+    POST /image                        a small PNG (the HF_IMAGE_API_URL format); the first
+                                       `image_warmup` requests get a 503 "model is loading"
+    POST /v1/chat/completions          OpenAI chat completions, plain or streamed (OPENAI_BASE_URL)
+
+Every route sleeps for its configured latency so tool overhead can be measured against a
+realistic but repeatable service time; with `chat_prompt_tokens_per_second`, chat completions
+also take longer the longer their prompt is. `env()` returns the variables that point the app at it.
+"""
+import hashlib
+import http.server
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from urllib.parse import parse_qs, urlparse
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+DEFAULT_LATENCY = {
+    "search": 0.15,
+    "page": 0.1,
+    "image": 0.5,
+    "chat": 0.3,
+}
+
+
+def tiny_png(seed: str, size: int = 64) -> bytes:
+    """A valid single-colour RGB PNG whose colour depends on `seed`."""
+    r, g, b = hashlib.md5(seed.encode()).digest()[:3]
+    row = b"\x00" + bytes((r, g, b)) * size
+    raw = zlib.compress(row * size)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", raw) + chunk(b"IEND", b"")
+
+
+class MockServices:
+    def __init__(self, latency: dict = None, image_warmup: int = 0, chat_tokens_per_second: float = 400.0,
+                 chat_prompt_tokens_per_second: float = 0.0):
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.image_warmup = image_warmup
+        self.chat_tokens_per_second = chat_tokens_per_second
+        self.chat_prompt_tokens_per_second = chat_prompt_tokens_per_second
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+        self.pages = {}
+        for name in sorted(os.listdir(CORPUS_DIR)):
+            if name.endswith(".html"):
+                with open(os.path.join(CORPUS_DIR, name), "rb") as f:
+                    self.pages[name] = f.read()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def env(self) -> dict:
+        return {
+            "WEB_SEARCH_ENDPOINT": f"{self.url}/search",
+            "HF_IMAGE_API_URL": f"{self.url}/image",
+            "OPENAI_BASE_URL": f"{self.url}/v1",
+            # The stand-ins have no quotas: keep only the concurrency limits and the 429/503 backoff
+            "RATE_LIMITS": "openai:rpm=0,tpm=0;huggingface:rpm=0",
+        }
+
+    def start(self) -> "MockServices":
+        services = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path == "/search":
+                    services._count("search")
+                    return services._search(self, parse_qs(parsed.query))
+                if parsed.path.startswith("/pages/"):
+                    services._count("page")
+                    return services._page(self, parsed.path[len("/pages/"):])
+                self._reply(404, b"not found", "text/plain")
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                path = urlparse(self.path).path
+                if path.startswith("/image"):
+                    services._count("image")
+                    return services._image(self, json.loads(body or b"{}"))
+                if path == "/v1/chat/completions":
+                    services._count("chat")
+                    return services._chat(self, json.loads(body or b"{}"))
+                self._reply(404, b"not found", "text/plain")
+
+            def _reply(self, status, body: bytes, content_type: str, headers: dict = None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="mock-services", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _count(self, route: str) -> int:
+        with self._lock:
+            self.requests[route] += 1
+            return self.requests[route]
+
+    def _search(self, handler, params: dict):
+        time.sleep(self.latency["search"])
+        query = params.get("q", [""])[0]
+        max_results = int(params.get("max_results", ["10"])[0])
+        results = []
+        for i, name in enumerate(list(self.pages) * 3):
+            if len(results) >= max_results:
+                break
+            results.append({
+                "title": f"{query.title()} - result {i + 1} ({name})",
+                "href": f"{self.url}/pages/{name}",
+                "body": f"Result {i + 1} for '{query}': " + "lorem ipsum dolor sit amet " * 6,
+            })
+        handler._reply(200, json.dumps(results).encode(), "application/json")
+
+    def _page(self, handler, name: str):
+        body = self.pages.get(name)
+        if body is None:
+            return handler._reply(404, b"<html><body>Not found</body></html>", "text/html")
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if handler.headers.get("If-None-Match") == etag:
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+        time.sleep(self.latency["page"])
+        handler._reply(200, body, "text/html; charset=utf-8", {"ETag": etag})
+
+    def _image(self, handler, payload: dict):
+        count = self.requests["image"]
+        if count <= self.image_warmup:
+            body = json.dumps({"error": "Model is currently loading", "estimated_time": 1.0}).encode()
+            return handler._reply(503, body, "application/json")
+        time.sleep(self.latency["image"])
+        handler._reply(200, tiny_png(str(payload.get("inputs"))), "image/png")
+
+    def _chat(self, handler, body: dict):
+        messages = body.get("messages") or [{}]
+        content = messages[-1].get("content", "")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        words = (f"Mock answer for: {content[:120]} " + "lorem ipsum dolor sit amet " * 10).split()
+        usage = {"prompt_tokens": max(1, len(json.dumps(messages)) // 4), "completion_tokens": len(words)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        time.sleep(self.latency["chat"])
+        if self.chat_prompt_tokens_per_second:
+            time.sleep(usage["prompt_tokens"] / self.chat_prompt_tokens_per_second)
+
+        if not body.get("stream"):
+            reply = {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+            return handler._reply(200, json.dumps(reply).encode(), "application/json")
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def send(data: str):
+            event = f"data: {data}\n\n".encode()
+            handler.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            handler.wfile.flush()
+
+        for word in words:
+            delta = {"index": 0, "delta": {"content": word + " "}, "finish_reason": None}
+            send(json.dumps({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": 0, "model": body.get("model"), "choices": [delta]}))
+            time.sleep(1.0 / self.chat_tokens_per_second)
+        send(json.dumps({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": 0, "model": body.get("model"), "choices": [], "usage": usage}))
+        send("[DONE]")
+        handler.wfile.write(b"0\r\n\r\n")
+        handler.wfile.flush()
+
+
+if __name__ == "__main__":
+    services = MockServices().start()
+    print(f"🧪 Mock services on {services.url}")
+    for key, value in services.env().items():
+        print(f"export {key}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        services.stop()
@@ -0,0 +1,177 @@
+"""
+Simulate provider slowdowns and outages against model_router.RouterModel with stand-in backends.
+
+Usage:
+    python benchmarks/router_bench.py [--calls 200] [--concurrency 8] [--scenarios steady,degraded,outage,tail]
+                                      [--stream]
+
+Each scenario runs the same calls three ways: straight to the primary backend, through a
+RouterModel, and through a RouterModel with hedging. The backends are `StandInModel`s: they
+sleep for a configurable latency (with jitter and occasional slow outliers) and can fail or
+slow down during a window of calls, so no network or API key is needed. It reports p50/p95/max
+latency as the caller sees it (time to first token with --stream), errors that reached the
+caller, how calls were split between backends, hedges sent and won, and circuit-breaker trips.
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from smolagents.models import ChatMessage, ChatMessageStreamDelta, MessageRole, Model  # noqa: E402
+from smolagents.monitoring import TokenUsage  # noqa: E402
+
+from model_router import RouterModel  # noqa: E402
+
+
+class StandInModel(Model):
+    """A fake provider with a latency profile and a window of failing or slow calls.
+
+    Calls number `fail_from` to `fail_until` (counted per backend) raise an error; calls in
+    `slow_from`..`slow_until` take `slow_latency` instead of `latency`. `outlier_rate` of the
+    remaining calls take `outlier_latency` (a long tail).
+    """
+
+    def __init__(self, name: str, latency: float, jitter: float = 0.2, outlier_rate: float = 0.0, outlier_latency: float = 0.0,
+                 fail_from: int = None, fail_until: int = None, slow_from: int = None, slow_until: int = None,
+                 slow_latency: float = 0.0, seed: int = 0):
+        super().__init__(model_id=name)
+        self.latency = latency
+        self.jitter = jitter
+        self.outlier_rate = outlier_rate
+        self.outlier_latency = outlier_latency
+        self.fail_window = (fail_from, fail_until)
+        self.slow_window = (slow_from, slow_until)
+        self.slow_latency = slow_latency
+        self.random = random.Random(seed)
+        self.counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _inside(n: int, window: tuple) -> bool:
+        start, end = window
+        return start is not None and start <= n <= (end if end is not None else n)
+
+    def _delay(self) -> float:
+        with self._lock:
+            n = next(self.counter)
+            roll = self.random.random()
+            jitter = self.random.uniform(-self.jitter, self.jitter)
+        if self._inside(n, self.fail_window):
+            time.sleep(self.latency * 0.2)
+            raise ConnectionError(f"{self.model_id}: simulated outage (call {n})")
+        if self._inside(n, self.slow_window):
+            return self.slow_latency
+        if roll < self.outlier_rate:
+            return self.outlier_latency
+        return max(0.0, self.latency * (1 + jitter))
+
+    def generate(self, messages, stop_sequences=None, response_format=None, tools_to_call_from=None, **kwargs):
+        time.sleep(self._delay())
+        return ChatMessage(role=MessageRole.ASSISTANT, content=f"answer from {self.model_id}",
+                           token_usage=TokenUsage(input_tokens=100, output_tokens=5))
+
+    def generate_stream(self, messages, stop_sequences=None, response_format=None, tools_to_call_from=None, **kwargs):
+        time.sleep(self._delay())
+        for word in ("answer ", "from ", self.model_id):
+            yield ChatMessageStreamDelta(content=word)
+            time.sleep(0.01)
+        yield ChatMessageStreamDelta(content="", token_usage=TokenUsage(input_tokens=100, output_tokens=5))
+
+
+def scenario_backends(name: str, calls: int) -> list:
+    """(primary, secondary) stand-ins for a scenario; fresh instances for every run."""
+    if name == "steady":
+        return [StandInModel("primary", 0.2, seed=1), StandInModel("secondary", 0.35, seed=2)]
+    if name == "degraded":
+        # The primary gets 8x slower a quarter of the way in and stays slow
+        return [StandInModel("primary", 0.2, slow_from=calls // 4, slow_until=None, slow_latency=1.6, seed=1),
+                StandInModel("secondary", 0.35, seed=2)]
+    if name == "outage":
+        # The primary fails every call between a quarter and half of the run
+        return [StandInModel("primary", 0.2, fail_from=calls // 4, fail_until=calls // 2, seed=1),
+                StandInModel("secondary", 0.35, seed=2)]
+    if name == "tail":
+        # 8% of the primary's calls take 2s
+        return [StandInModel("primary", 0.2, outlier_rate=0.08, outlier_latency=2.0, seed=1),
+                StandInModel("secondary", 0.35, seed=2)]
+    raise ValueError(f"unknown scenario {name}")
+
+
+def call_once(model, stream: bool) -> float:
+    started = time.perf_counter()
+    if stream:
+        for delta in model.generate_stream([]):
+            if delta.content:
+                return time.perf_counter() - started
+        return time.perf_counter() - started
+    model.generate([])
+    return time.perf_counter() - started
+
+
+def run(model, calls: int, concurrency: int, stream: bool) -> dict:
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        try:
+            latency = call_once(model, stream)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append(latency)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(calls)))
+    wall = time.perf_counter() - started
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "p50": quantiles[49] if latencies else 0.0,
+        "p95": quantiles[94] if latencies else 0.0,
+        "max": max(latencies) if latencies else 0.0,
+        "errors": errors,
+        "wall": wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scenarios", default="steady,degraded,outage,tail")
+    parser.add_argument("--stream", action="store_true", help="Measure generate_stream (time to first token) instead of generate")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="Circuit breaker cooldown in seconds")
+    args = parser.parse_args()
+
+    mode = "time to first token" if args.stream else "call latency"
+    print(f"🧭 Model router: {args.calls} calls per run, {args.concurrency} concurrent, {mode}\n")
+    print(f"{'scenario':<10}{'setup':<16}{'p50':>8}{'p95':>8}{'max':>8}{'errors':>8}  split / hedges / trips")
+    for scenario in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+        primary, _ = scenario_backends(scenario, args.calls)
+        result = run(primary, args.calls, args.concurrency, args.stream)
+        print(f"{scenario:<10}{'primary only':<16}{result['p50']:>7.2f}s{result['p95']:>7.2f}s{result['max']:>7.2f}s{result['errors']:>8}")
+        for label, hedge in (("router", False), ("router + hedge", True)):
+            primary, secondary = scenario_backends(scenario, args.calls)
+            router = RouterModel([("primary", primary), ("secondary", secondary)], hedge=hedge, cooldown=args.cooldown)
+            result = run(router, args.calls, args.concurrency, args.stream)
+            stats = router.stats()
+            split = " / ".join(f"{b['name']} {b['calls']}" for b in stats["backends"])
+            won = sum(b["hedges_won"] for b in stats["backends"])
+            trips = sum(b["circuit_trips"] for b in stats["backends"])
+            print(f"{'':<10}{label:<16}{result['p50']:>7.2f}s{result['p95']:>7.2f}s{result['max']:>7.2f}s{result['errors']:>8}"
+                  f"  {split} / {stats['hedges']} sent, {won} won / {trips}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark cold start of app.py: import time, resident memory and time to a ready agent.
+
+Usage:
+    python benchmarks/startup_bench.py [--runs 5] [--top 15] [--no-openai]
+
+Every run is a fresh interpreter started with `python -X importtime`. It reports the
+median wall time of `import app`, resident memory (max RSS) after the import, the time
+`get_agent()` then takes to build the model and agent, and the modules with the largest
+cumulative import time. Dummy API keys are used when none are set; nothing is sent over
+the network.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+import_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+heavy_modules = [m for m in ("openai", "ddgs", "gradio", "httpx", "numpy") if m in sys.modules]
+app.get_agent()
+ready = time.perf_counter()
+print("STARTUP_BENCH " + json.dumps({
+    "import_seconds": imported - start,
+    "agent_seconds": ready - imported,
+    "import_rss_kb": import_rss,
+    "ready_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy_modules": heavy_modules,
+}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Cumulative import time (microseconds) of app.py's direct imports, from -X importtime output."""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cum, name = line[len("import time:"):].split("|")
+        if not cum.strip().isdigit():
+            continue  # header line
+        if name.strip() == "app":
+            cumulative["app (total)"] = int(cum)
+            break  # later lines are imports made by get_agent()
+        # Names are indented by two spaces per nesting level; app's own imports are one level deep
+        if len(name) - len(name.lstrip(" ")) == 3:
+            cumulative[name.strip()] = int(cum)
+    return cumulative
+
+
+def run_once(env: dict) -> tuple:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    marker = next(line for line in proc.stdout.splitlines() if line.startswith("STARTUP_BENCH "))
+    return json.loads(marker[len("STARTUP_BENCH "):]), parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="How many of the slowest imports to list")
+    parser.add_argument("--no-openai", action="store_true", help="Start without OPENAI_API_KEY (HF model, no OpenAI tools)")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("HUGGINGFACE_API_TOKEN", "hf_startup_bench")
+    if args.no_openai:
+        env.pop("OPENAI_API_KEY", None)
+    else:
+        env.setdefault("OPENAI_API_KEY", "sk-startup-bench")
+
+    results, imports = [], []
+    for _ in range(args.runs):
+        result, cumulative = run_once(env)
+        results.append(result)
+        imports.append(cumulative)
+
+    def median(key):
+        return statistics.median(r[key] for r in results)
+
+    print(f"🚀 {args.runs} cold starts of app.py ({'without' if args.no_openai else 'with'} OpenAI key)\n")
+    print(f"{'import app':<28}{median('import_seconds') * 1000:>10.0f} ms")
+    print(f"{'get_agent() after import':<28}{median('agent_seconds') * 1000:>10.0f} ms")
+    print(f"{'max RSS after import':<28}{median('import_rss_kb') / 1024:>10.1f} MB")
+    print(f"{'max RSS with agent':<28}{median('ready_rss_kb') / 1024:>10.1f} MB")
+    heavy = results[-1]["heavy_modules"]
+    print(f"{'heavy modules at import':<28}{', '.join(heavy) if heavy else 'none':>10}")
+
+    names = set().union(*imports)
+    slowest = sorted(names, key=lambda n: -statistics.median(i.get(n, 0) for i in imports))[: args.top]
+    print("\nSlowest imports during `import app` (median cumulative, -X importtime):")
+    for name in slowest:
+        print(f"  {name:<40}{statistics.median(i.get(name, 0) for i in imports) / 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
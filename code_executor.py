@@ -0,0 +1,93 @@
+"""Local Python executor that keeps the caller's context and a working time limit.
+
+smolagents' `LocalPythonExecutor` enforces `timeout_seconds` by running each code action on
+a fresh thread, which starts with empty context variables: tool output streaming, trace
+spans, the research index and the session's documents are all lost inside the code. Its
+timeout also waits for that thread before raising, so a `while True` blocks the agent anyway.
+
+`ContextPythonExecutor` runs the code action on a thread that starts from a copy of the
+caller's context and gives up on it after `timeout_seconds` (CODE_EXECUTION_TIMEOUT, default
+120 s, enough for `image_generation`'s 90 s wait). Python cannot kill the thread: a runaway
+action keeps running in the background, but the step fails with `ExecutionTimeoutError` and
+the agent, its pool slot and the batch runner move on.
+
+The runaway action still holds the executor's variables, so after a timeout the executor
+starts over from a fresh state (with the variables the agent sent, not those of earlier
+steps). Runaway actions are counted process-wide (`runaway_actions()`); while
+CODE_EXECUTION_MAX_RUNAWAY of them (default 4) are still running, new code actions are refused
+instead of adding another thread that burns CPU.
+"""
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from smolagents.local_python_executor import CodeOutput, ExecutionTimeoutError, InterpreterError, LocalPythonExecutor
+
+DEFAULT_TIMEOUT = 120
+DEFAULT_MAX_RUNAWAY = 4
+
+_runaway = []  # futures of timed-out code actions, of every executor
+_runaway_lock = threading.Lock()
+
+
+def runaway_actions() -> int:
+    """Timed-out code actions whose threads are still running."""
+    with _runaway_lock:
+        _runaway[:] = [future for future in _runaway if not future.done()]
+        return len(_runaway)
+
+
+class ContextPythonExecutor(LocalPythonExecutor):
+    def __init__(self, additional_authorized_imports: list, timeout_seconds: float = DEFAULT_TIMEOUT,
+                 max_runaway: int = DEFAULT_MAX_RUNAWAY, **kwargs):
+        # The parent's own timeout is off: this class applies it, on a thread with the caller's context
+        super().__init__(additional_authorized_imports, timeout_seconds=None, **kwargs)
+        self.execution_timeout = timeout_seconds
+        self.max_runaway = max_runaway
+        self.timeouts = 0
+        self._variables = {}
+
+    @classmethod
+    def from_env(cls, additional_authorized_imports: list = None, **kwargs) -> "ContextPythonExecutor":
+        timeout = float(os.getenv("CODE_EXECUTION_TIMEOUT", DEFAULT_TIMEOUT))
+        return cls(
+            additional_authorized_imports or [],
+            timeout_seconds=timeout if timeout > 0 else None,
+            max_runaway=int(os.getenv("CODE_EXECUTION_MAX_RUNAWAY", DEFAULT_MAX_RUNAWAY)),
+            **kwargs,
+        )
+
+    def send_variables(self, variables: dict):
+        self._variables.update(variables)
+        super().send_variables(variables)
+
+    def _reset_state(self):
+        # New objects, not cleared ones: the runaway thread keeps writing to the old ones
+        self.state = {"__name__": "__main__", **self._variables}
+        self.custom_tools = {}
+
+    def __call__(self, code_action: str) -> CodeOutput:
+        if not self.execution_timeout:
+            return super().__call__(code_action)
+        running = runaway_actions()
+        if running >= self.max_runaway:
+            raise InterpreterError(
+                f"Code execution refused: {running} earlier code actions exceeded the time limit and are still running"
+            )
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="code_action")
+        try:
+            future = pool.submit(contextvars.copy_context().run, super().__call__, code_action)
+            try:
+                return future.result(timeout=self.execution_timeout)
+            except TimeoutError:
+                with _runaway_lock:
+                    _runaway.append(future)
+                self.timeouts += 1
+                self._reset_state()
+                raise ExecutionTimeoutError(
+                    f"Code execution exceeded the maximum execution time of {self.execution_timeout:g} seconds; "
+                    "variables defined by earlier steps were reset"
+                )
+        finally:
+            pool.shutdown(wait=False)
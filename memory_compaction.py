@@ -0,0 +1,133 @@
+"""Token-budgeted compaction of agent memory for long chat sessions.
+
+`MemoryCompactor` is a step callback. After every action step it measures the prompt the
+agent would send next (`agent.write_memory_to_messages()`); when that passes `token_budget`
+it compacts the oldest action steps until the prompt is back under `target_ratio * budget`:
+
+1. trim: keep the head of the observation and the model's thought, drop the repeated code;
+2. drop: replace the observation with a one-line note and shorten the code action;
+3. remove: take the step out of memory altogether.
+
+Task messages, steps that produced a final answer and the `keep_recent_steps` latest action
+steps are never touched. Every step gets a `memory_stats` dict (prompt tokens it was sent,
+memory tokens after compaction, steps compacted) that the UI shows in the step footnote.
+"""
+import os
+import re
+from collections import deque
+
+from smolagents.memory import ActionStep
+
+from tools.chunking import count_tokens
+
+TRIMMED = 1
+DROPPED = 2
+REMOVED = 3
+
+
+def message_tokens(messages) -> int:
+    total = 0
+    for message in messages:
+        content = message.content if hasattr(message, "content") else message.get("content")
+        if isinstance(content, str):
+            total += count_tokens(content)
+        elif isinstance(content, list):
+            for part in content:
+                if isinstance(part, dict) and part.get("type") == "text":
+                    total += count_tokens(part.get("text") or "")
+                elif isinstance(part, dict) and part.get("type") == "image":
+                    total += 800  # rough allowance per image
+        total += 4  # role and message framing
+    return total
+
+
+class MemoryCompactor:
+    def __init__(self, token_budget: int = 12000, keep_recent_steps: int = 3, observation_chars: int = 500, target_ratio: float = 0.75):
+        self.token_budget = token_budget
+        self.keep_recent_steps = keep_recent_steps
+        self.observation_chars = observation_chars
+        self.target_ratio = target_ratio
+        self.compacted_steps = 0
+        self.metrics = deque(maxlen=200)
+
+    @classmethod
+    def from_env(cls) -> "MemoryCompactor":
+        return cls(
+            token_budget=int(os.getenv("AGENT_MEMORY_TOKEN_BUDGET", 12000)),
+            keep_recent_steps=int(os.getenv("AGENT_MEMORY_KEEP_RECENT_STEPS", 3)),
+            observation_chars=int(os.getenv("AGENT_MEMORY_OBSERVATION_CHARS", 500)),
+        )
+
+    def _candidates(self, agent) -> list:
+        action_steps = [step for step in agent.memory.steps if isinstance(step, ActionStep)]
+        old_steps = action_steps[: -self.keep_recent_steps] if self.keep_recent_steps else action_steps
+        return [step for step in old_steps if not step.is_final_answer]
+
+    def _thought(self, model_output) -> str:
+        if not isinstance(model_output, str):
+            return None
+        # Everything before the first code block is the model's reasoning; the code itself is kept in tool_calls
+        thought = re.split(r"<code>|```", model_output, maxsplit=1)[0].strip()
+        return thought[:300] if thought else None
+
+    def _compact(self, step: ActionStep, level: int):
+        if level == TRIMMED:
+            step.model_output = self._thought(step.model_output)
+            if step.observations and len(step.observations) > self.observation_chars:
+                removed = len(step.observations) - self.observation_chars
+                step.observations = (
+                    step.observations[: self.observation_chars]
+                    + f"\n[... {removed} more characters of this observation were removed to save context]"
+                )
+        else:
+            step.model_output = None
+            if step.observations is not None:
+                step.observations = "[Observation removed to save context; repeat the call if it is still needed]"
+            for tool_call in step.tool_calls or []:
+                if isinstance(tool_call.arguments, str) and len(tool_call.arguments) > 300:
+                    tool_call.arguments = tool_call.arguments[:300] + "\n# ... (code shortened)"
+        # Old prompts are kept on every step and only grow memory use; the metrics already have their size
+        step.model_input_messages = None
+        step.compaction_level = level
+
+    def __call__(self, step: ActionStep, agent=None):
+        prompt_tokens = message_tokens(step.model_input_messages) if step.model_input_messages else None
+        if agent is None:
+            return
+        memory_tokens = message_tokens(agent.write_memory_to_messages())
+        compacted = 0
+        if memory_tokens > self.token_budget:
+            target = self.token_budget * self.target_ratio
+            for level in (TRIMMED, DROPPED, REMOVED):
+                for old_step in self._candidates(agent):
+                    if memory_tokens <= target:
+                        break
+                    if getattr(old_step, "compaction_level", 0) >= level:
+                        continue
+                    before = message_tokens(old_step.to_messages())
+                    if level == REMOVED:
+                        agent.memory.steps.remove(old_step)
+                        memory_tokens -= before
+                    else:
+                        self._compact(old_step, level)
+                        memory_tokens -= before - message_tokens(old_step.to_messages())
+                    compacted += 1
+            self.compacted_steps += compacted
+
+        step.memory_stats = {
+            "prompt_tokens": prompt_tokens,
+            "memory_tokens": memory_tokens,
+            "compacted": compacted,
+            "budget": self.token_budget,
+        }
+        self.metrics.append({"step": step.step_number, **step.memory_stats})
+
+    def stats(self) -> dict:
+        prompts = [m["prompt_tokens"] for m in self.metrics if m["prompt_tokens"] is not None]
+        return {
+            "steps": len(self.metrics),
+            "compacted_steps": self.compacted_steps,
+            "max_prompt_tokens": max(prompts) if prompts else 0,
+            "last_prompt_tokens": prompts[-1] if prompts else 0,
+            "budget": self.token_budget,
+        }
@@ -0,0 +1,349 @@
+"""Latency-aware routing of model calls over several providers.
+
+`RouterModel` is a smolagents `Model` that wraps several backend models (for example OpenAI
+and the HF Inference API). Every call goes to the fastest healthy backend, judged by its
+rolling median time to first output (the whole call for `generate`, the first token for
+`generate_stream`) over its last `window` successful calls. Backends with fewer than
+`min_samples` measurements rank after measured ones, in the order given, so the first
+backend is the default until another one has proven faster. Every `probe_interval`-th call
+goes to the healthy backend that was used least recently instead, so the latencies of the
+others are learned and stay current. A call that fails before any output is retried on the
+next backend.
+
+Circuit breaker: after `failure_threshold` consecutive failures a backend is ejected for
+`cooldown` seconds; then a single trial call is let through (half-open), which closes the
+circuit on success and re-opens it on failure. When every circuit is open, the backend
+ejected longest ago gets that trial call early rather than every call failing for the rest
+of the cooldown.
+
+Hedging (`hedge=True`): when the chosen backend has produced no output after `hedge_after`
+seconds (by default its own rolling p95), the same request is also sent to the next healthy
+backend and whichever answers first is used. The slower call is abandoned (a stream is
+closed at its next chunk) and only feeds the latency statistics.
+"""
+import contextvars
+import itertools
+import os
+import queue
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError, wait
+
+from smolagents.models import Model
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class Backend:
+    """One provider behind the router, with its rolling latency and circuit state."""
+
+    def __init__(self, name: str, model: Model, window: int = 50, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.name = name
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.last_used = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.hedges_won = 0
+        self.circuit_trips = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        return OPEN if time.time() - self.opened_at < self.cooldown else HALF_OPEN
+
+    def available(self) -> bool:
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and not self.trial_in_flight)
+
+    def acquire(self, force: bool = False) -> bool:
+        """Claim a call slot; in the half-open state only one trial call is let through.
+
+        With `force`, an open circuit is treated as half-open (the router's last resort).
+        """
+        with self._lock:
+            state = self.state
+            if state == OPEN and force:
+                state = HALF_OPEN
+            if state == HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+            elif state != CLOSED:
+                return False
+            self.last_used = time.time()
+            return True
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self.calls += 1
+            self.outcomes.append(ok)
+            trial = self.trial_in_flight
+            self.trial_in_flight = False
+            if ok:
+                self.latencies.append(latency)
+                self.consecutive_failures = 0
+                self.opened_at = None
+                return
+            self.errors += 1
+            self.consecutive_failures += 1
+            if trial or self.consecutive_failures >= self.failure_threshold:
+                if self.opened_at is None or trial:
+                    self.circuit_trips += 1
+                self.opened_at = time.time()
+
+    def percentile(self, q: int):
+        latencies = list(self.latencies)
+        if not latencies:
+            return None
+        if len(latencies) == 1:
+            return latencies[0]
+        return statistics.quantiles(latencies, n=100, method="inclusive")[q - 1]
+
+    def stats(self) -> dict:
+        outcomes = list(self.outcomes)
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "name": self.name,
+            "state": self.state,
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(outcomes.count(False) / len(outcomes), 3) if outcomes else 0.0,
+            "p50": round(p50, 3) if p50 is not None else None,
+            "p95": round(p95, 3) if p95 is not None else None,
+            "hedges_won": self.hedges_won,
+            "circuit_trips": self.circuit_trips,
+        }
+
+
+class _StreamRun:
+    def __init__(self, backend: Backend, events: queue.Queue):
+        self.backend = backend
+        self.events = events
+        self.cancelled = threading.Event()
+
+
+class RouterModel(Model):
+    def __init__(
+        self,
+        backends: list,
+        hedge: bool = False,
+        hedge_after: float = None,
+        min_samples: int = 5,
+        probe_interval: int = 20,
+        window: int = 50,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        max_workers: int = 32,
+    ):
+        if not backends:
+            raise ValueError("RouterModel needs at least one backend")
+        super().__init__(model_id="router:" + ",".join(name for name, _ in backends))
+        self.backends = [Backend(name, model, window, failure_threshold, cooldown) for name, model in backends]
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.min_samples = min_samples
+        self.probe_interval = probe_interval
+        self.hedges = 0
+        self.probes = 0
+        self._call_numbers = itertools.count(1)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-router")
+
+    @classmethod
+    def from_env(cls, backends: list) -> "RouterModel":
+        hedge_after = os.getenv("MODEL_ROUTER_HEDGE_AFTER")
+        return cls(
+            backends,
+            hedge=os.getenv("MODEL_ROUTER_HEDGE", "false").lower() in ("1", "true", "yes"),
+            hedge_after=float(hedge_after) if hedge_after else None,
+            probe_interval=int(os.getenv("MODEL_ROUTER_PROBE_INTERVAL", 20)),
+            failure_threshold=int(os.getenv("MODEL_ROUTER_FAILURE_THRESHOLD", 3)),
+            cooldown=float(os.getenv("MODEL_ROUTER_COOLDOWN", 30)),
+        )
+
+    def ranked(self) -> list:
+        """Healthy backends, fastest first; when every circuit is open, the one ejected longest ago (see `_claim_next`)."""
+        def speed(indexed):
+            index, backend = indexed
+            measured = len(backend.latencies) >= self.min_samples
+            return (backend.percentile(50) if measured else float("inf"), index)
+
+        healthy = [b for _, b in sorted(((i, b) for i, b in enumerate(self.backends) if b.available()), key=speed)]
+        if self.probe_interval and len(healthy) > 1 and next(self._call_numbers) % self.probe_interval == 0:
+            probe = min(healthy[1:], key=lambda b: b.last_used)
+            healthy.remove(probe)
+            healthy.insert(0, probe)
+            self.probes += 1
+        if healthy:
+            return healthy
+        return sorted(self.backends, key=lambda b: b.opened_at or 0)[:1]
+
+    def _hedge_delay(self, backend: Backend):
+        if not self.hedge:
+            return None
+        if self.hedge_after is not None:
+            return self.hedge_after
+        if len(backend.latencies) < self.min_samples:
+            return None
+        return backend.percentile(95)
+
+    def _claim_next(self, candidates: list):
+        while candidates:
+            backend = candidates.pop(0)
+            # An open circuit is only offered as the last resort: let its trial call through early
+            if backend.acquire(force=backend.state == OPEN):
+                return backend
+        return None
+
+    def _submit(self, fn, *args):
+        return self._pool.submit(contextvars.copy_context().run, fn, *args)
+
+    def _call(self, backend: Backend, messages, args, kwargs):
+        started = time.perf_counter()
+        try:
+            message = backend.model.generate(messages, *args, **kwargs)
+        except Exception:
+            backend.record(time.perf_counter() - started, ok=False)
+            raise
+        backend.record(time.perf_counter() - started, ok=True)
+        return message
+
+    def generate(self, messages, *args, **kwargs):
+        candidates = self.ranked()
+        last_error = None
+        while True:
+            primary = self._claim_next(candidates)
+            if primary is None:
+                break
+            delay = self._hedge_delay(primary)
+            if delay is None or not candidates:
+                try:
+                    return self._call(primary, messages, args, kwargs)
+                except Exception as e:
+                    last_error = e
+                    continue
+
+            first = self._submit(self._call, primary, messages, args, kwargs)
+            try:
+                return first.result(timeout=delay)
+            except TimeoutError:
+                pass
+            except Exception as e:
+                last_error = e
+                continue
+            secondary = self._claim_next(candidates)
+            if secondary is None:
+                try:
+                    return first.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+            self.hedges += 1
+            pending = {first: primary, self._submit(self._call, secondary, messages, args, kwargs): secondary}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    backend = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if backend is secondary:
+                        secondary.hedges_won += 1
+                    return result
+        if last_error is not None:
+            raise last_error
+        raise RuntimeError("No model backend is available")
+
+    def _run_stream(self, run: _StreamRun, messages, args, kwargs):
+        started = time.perf_counter()
+        first_output = None
+        stream = None
+        try:
+            stream = run.backend.model.generate_stream(messages, *args, **kwargs)
+            for delta in stream:
+                if first_output is None:
+                    first_output = time.perf_counter() - started
+                run.events.put((run, "delta", delta))
+                if run.cancelled.is_set():
+                    break
+            run.backend.record(first_output if first_output is not None else time.perf_counter() - started, ok=True)
+            run.events.put((run, "end", None))
+        except Exception as e:
+            run.backend.record(time.perf_counter() - started, ok=False)
+            run.events.put((run, "error", e))
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+
+    def _start_stream(self, backend: Backend, events: queue.Queue, messages, args, kwargs) -> _StreamRun:
+        run = _StreamRun(backend, events)
+        self._submit(self._run_stream, run, messages, args, kwargs)
+        return run
+
+    def generate_stream(self, messages, *args, **kwargs):
+        candidates = self.ranked()
+        last_error = None
+        while True:
+            primary = self._claim_next(candidates)
+            if primary is None:
+                break
+            events = queue.Queue()
+            runs = [self._start_stream(primary, events, messages, args, kwargs)]
+            delay = self._hedge_delay(primary)
+            hedge_at = time.perf_counter() + delay if delay is not None and candidates else None
+            winner = None
+            try:
+                while True:
+                    timeout = max(0.0, hedge_at - time.perf_counter()) if winner is None and hedge_at is not None else None
+                    try:
+                        run, kind, payload = events.get(timeout=timeout)
+                    except queue.Empty:
+                        hedge_at = None
+                        secondary = self._claim_next(candidates)
+                        if secondary is not None:
+                            self.hedges += 1
+                            runs.append(self._start_stream(secondary, events, messages, args, kwargs))
+                        continue
+
+                    if winner is None:
+                        if kind == "error":
+                            last_error = payload
+                            runs.remove(run)
+                            if runs:
+                                continue
+                            break  # nothing was yielded yet: fail over to the next backend
+                        winner = run
+                        if run.backend is not primary:
+                            run.backend.hedges_won += 1
+                        for other in runs:
+                            if other is not winner:
+                                other.cancelled.set()
+                    if run is not winner:
+                        continue
+                    if kind == "delta":
+                        yield payload
+                    elif kind == "end":
+                        return
+                    else:
+                        raise payload  # failed mid-stream; the output already shown cannot be retried elsewhere
+            finally:
+                for run in runs:
+                    run.cancelled.set()
+        if last_error is not None:
+            raise last_error
+        raise RuntimeError("No model backend is available")
+
+    def stats(self) -> dict:
+        return {"hedges": self.hedges, "probes": self.probes, "backends": [backend.stats() for backend in self.backends]}
@@ -0,0 +1,380 @@
+"""Memoization of complete agent runs.
+
+`RunCache` stores the final answer and step trace of a finished run in SQLite, keyed on the
+normalized task, a fingerprint of the agent's tools (name, description, inputs, output
+type), the model id and the content ids of the documents uploaded for the run. When the
+same question comes in again, the stored answer is returned at once, without any model or
+tool calls.
+
+Only the first task of a conversation is looked up or stored: a follow-up question depends
+on the earlier turns, which are not part of the key. Runs that did not end with a final
+answer, returned an image or audio, or were given `additional_args` are never stored.
+
+Freshness: every entry expires after `ttl` seconds, or sooner when the run called a tool
+with a shorter lifetime in `tool_ttls` (search results an hour, fetched pages a few hours).
+Runs that used a tool with a lifetime of 0, such as `get_current_time_in_timezone`, are
+never stored: any mention of the tool in a code action counts (`f = tool; f()` too), and calls
+made through `parallel_map` count as calls to the tool they name. Runs whose code reads the
+clock (`datetime.now()`, `time.time()`, ...) are never stored either.
+
+A hit also restores the cached steps into the agent's memory, so follow-up questions see
+them as if the run had happened (variables set by its code actions are not restored).
+"""
+import ast
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Optional
+
+from smolagents.memory import ActionStep, TaskStep, ToolCall
+from smolagents.monitoring import Timing, TokenUsage
+from smolagents.utils import AgentError
+
+from tools import tracing
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "agent_runs.sqlite3")
+
+# Seconds a result stays valid when the run called the tool; 0 means never reuse it
+DEFAULT_TOOL_TTLS = {
+    "get_current_time_in_timezone": 0,
+    "system_status": 0,
+    "image_generation_submit": 0,
+    "image_generation_result": 0,
+    # Answer from the session's own state (its index, its uploads), not from the task
+    "local_search": 0,
+    "document_search": 0,
+    # Only when the tool it fans out to is not a literal name (see `parallel_map_targets`)
+    "parallel_map": 0,
+    "web_search": 3600,
+    "web_search_many": 3600,
+    "visit_webpage": 6 * 3600,
+}
+
+# Calls that read the current time: a run making them answers for the moment it ran
+CLOCK_METHODS = ("now", "utcnow", "today")
+CLOCK_FUNCTIONS = ("time", "time_ns", "localtime", "gmtime", "ctime", "asctime", "strftime")
+
+
+def parse_tool_ttls(text: str) -> dict:
+    """Parse "web_search=600,visit_webpage=0" into {name: seconds}."""
+    ttls = {}
+    for item in (text or "").split(","):
+        if "=" in item:
+            name, seconds = item.split("=", 1)
+            ttls[name.strip()] = float(seconds)
+    return ttls
+
+
+def normalize_task(task: str) -> str:
+    """Case, spacing and trailing punctuation are ignored for one-line questions.
+
+    Multi-line tasks (code to review, text to analyse) keep their case and indentation; only
+    trailing whitespace on each line is dropped.
+    """
+    task = unicodedata.normalize("NFKC", task).strip()
+    if "\n" in task:
+        return "\n".join(line.rstrip() for line in task.splitlines())
+    return re.sub(r"[\s?!.]+$", "", " ".join(task.casefold().split()))
+
+
+def tool_fingerprint(tools: dict) -> str:
+    spec = sorted(
+        (name, tool.description, json.dumps(tool.inputs, sort_keys=True, default=str), tool.output_type)
+        for name, tool in tools.items()
+    )
+    return hashlib.sha256(json.dumps(spec).encode()).hexdigest()[:16]
+
+
+def count_tool_calls(code: str, tool_names) -> dict:
+    """Calls to the agent's tools written in a code action (each call site counted once)."""
+    counts = {}
+    try:
+        tree = ast.parse(code or "")
+    except SyntaxError:
+        return counts
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in tool_names:
+            counts[node.func.id] = counts.get(node.func.id, 0) + 1
+    return counts
+
+
+def tool_references(code: str, tool_names) -> set:
+    """Tools a code action mentions by name, called directly or not (`f = tool; f()`, `for t in (tool,)`)."""
+    try:
+        tree = ast.parse(code or "")
+    except SyntaxError:
+        return set()
+    return {
+        node.id for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id in tool_names
+    }
+
+
+def reads_clock(code: str) -> bool:
+    """Whether a code action calls `datetime.now()`, `date.today()`, `time.time()` and the like."""
+    try:
+        tree = ast.parse(code or "")
+    except SyntaxError:
+        return False
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        if isinstance(func, ast.Attribute):
+            if func.attr in CLOCK_METHODS:
+                return True
+            if func.attr in CLOCK_FUNCTIONS and isinstance(func.value, ast.Name) and func.value.id == "time":
+                return True
+        elif isinstance(func, ast.Name) and func.id in CLOCK_FUNCTIONS:
+            return True  # from time import time
+    return False
+
+
+def parallel_map_targets(code: str) -> Optional[set]:
+    """Tools named by the `parallel_map(...)` calls in a code action, or None when one is not a literal.
+
+    None too when `parallel_map` is used other than by a direct call, e.g. passed around as a value.
+    """
+    targets = set()
+    try:
+        tree = ast.parse(code or "")
+    except SyntaxError:
+        return None
+    calls = [node for node in ast.walk(tree)
+             if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "parallel_map"]
+    called = {id(node.func) for node in calls}
+    if any(isinstance(node, ast.Name) and node.id == "parallel_map" and id(node) not in called for node in ast.walk(tree)):
+        return None
+    for node in calls:
+        name = next((kw.value for kw in node.keywords if kw.arg == "tool_name"), node.args[0] if node.args else None)
+        if not (isinstance(name, ast.Constant) and isinstance(name.value, str)):
+            return None
+        targets.add(name.value)
+    return targets
+
+
+def tools_used(step: ActionStep, tool_names) -> set:
+    names = {call.name for call in step.tool_calls or [] if call.name in tool_names}
+    names |= tool_references(step.code_action, tool_names)
+    if "parallel_map" in names:
+        targets = {call.arguments.get("tool_name") for call in step.tool_calls or []
+                   if call.name == "parallel_map" and isinstance(call.arguments, dict)}
+        from_code = parallel_map_targets(step.code_action) if step.code_action else set()
+        if from_code is not None and None not in targets:
+            names.discard("parallel_map")
+            names |= (targets | from_code) & set(tool_names)
+    return names
+
+
+def step_record(step: ActionStep) -> dict:
+    return {
+        "step_number": step.step_number,
+        "duration": step.timing.duration if step.timing else None,
+        "model_output": step.model_output if isinstance(step.model_output, str) else None,
+        "code_action": step.code_action,
+        "tool_calls": [{"name": call.name, "arguments": call.arguments, "id": call.id} for call in step.tool_calls or []],
+        "observations": step.observations,
+        "error": str(step.error) if step.error else None,
+        "input_tokens": step.token_usage.input_tokens if step.token_usage else None,
+        "output_tokens": step.token_usage.output_tokens if step.token_usage else None,
+        "is_final_answer": step.is_final_answer,
+    }
+
+
+def restore_step(record: dict, logger) -> ActionStep:
+    now = time.time()
+    token_usage = None
+    if record["input_tokens"] is not None:
+        token_usage = TokenUsage(input_tokens=record["input_tokens"], output_tokens=record["output_tokens"])
+    return ActionStep(
+        step_number=record["step_number"],
+        timing=Timing(start_time=now - (record["duration"] or 0), end_time=now),
+        model_output=record["model_output"],
+        code_action=record["code_action"],
+        tool_calls=[ToolCall(name=c["name"], arguments=c["arguments"], id=c["id"]) for c in record["tool_calls"]] or None,
+        observations=record["observations"],
+        error=AgentError(record["error"], logger) if record["error"] else None,
+        token_usage=token_usage,
+        is_final_answer=record["is_final_answer"],
+    )
+
+
+class RunCache:
+    """Disk-backed cache of finished agent runs, shared by every process on the host."""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl: float = 24 * 3600,
+        max_entries: int = 2000,
+        tool_ttls: dict = None,
+        replay: bool = True,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.tool_ttls = {**DEFAULT_TOOL_TTLS, **(tool_ttls or {})}
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.skipped = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " key TEXT PRIMARY KEY, task TEXT NOT NULL, answer TEXT NOT NULL, steps TEXT NOT NULL,"
+                " tools TEXT NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_last_access ON runs (last_access)")
+
+    @classmethod
+    def from_env(cls) -> Optional["RunCache"]:
+        """Build the cache from RUN_CACHE_* variables; off unless RUN_CACHE_TTL is above 0."""
+        ttl = float(os.getenv("RUN_CACHE_TTL", 0))
+        if ttl <= 0:
+            return None
+        return cls(
+            path=os.getenv("RUN_CACHE_PATH", DEFAULT_CACHE_PATH),
+            ttl=ttl,
+            max_entries=int(os.getenv("RUN_CACHE_MAX_ENTRIES", 2000)),
+            tool_ttls=parse_tool_ttls(os.getenv("RUN_CACHE_TOOL_TTLS", "")),
+            replay=os.getenv("RUN_CACHE_REPLAY", "true").lower() in ("1", "true", "yes"),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def applies(agent, reset: bool = False, additional_args: dict = None) -> bool:
+        """Whether a run of `agent` starts a new conversation and so can be cached."""
+        return not additional_args and (reset or not agent.memory.steps)
+
+    def key(self, agent, task: str, documents: Optional[list] = None) -> str:
+        """`documents` are the content ids of the run's uploads: a file name in the task says nothing of its content."""
+        model_id = getattr(agent.model, "model_id", None) or type(agent.model).__name__
+        text = "\x00".join((normalize_task(task), tool_fingerprint(agent.tools), model_id, ",".join(sorted(documents or []))))
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, agent, task: str, documents: Optional[list] = None) -> Optional[dict]:
+        """The cached run for `task`, or None. Fields: answer, steps, tools, created_at."""
+        conn = self._connect()
+        key = self.key(agent, task, documents)
+        now = time.time()
+        row = conn.execute("SELECT answer, steps, tools, created_at, expires_at FROM runs WHERE key = ?", (key,)).fetchone()
+        if row is None or row[4] <= now:
+            if row is not None:
+                conn.execute("DELETE FROM runs WHERE key = ?", (key,))
+            self._count("misses")
+            tracing.record_cache("agent_run", "miss")
+            return None
+        conn.execute("UPDATE runs SET last_access = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        tracing.record_cache("agent_run", "hit")
+        return {"answer": row[0], "steps": json.loads(row[1]), "tools": json.loads(row[2]), "created_at": row[3]}
+
+    def put(self, agent, task: str, answer, documents: Optional[list] = None) -> bool:
+        """Store the run now in `agent.memory` if its answer and tools allow reuse."""
+        from smolagents.agent_types import AgentText
+
+        if isinstance(answer, AgentText):
+            answer = answer.to_string()
+        if not isinstance(answer, (str, int, float, bool)):
+            self._count("skipped")
+            return False
+        steps = [step for step in agent.memory.steps if isinstance(step, ActionStep)]
+        if not any(step.is_final_answer for step in steps):
+            self._count("skipped")  # ended on an error or at max_steps
+            return False
+        used = set()
+        for step in steps:
+            used |= tools_used(step, agent.tools)
+        lifetime = min([self.ttl] + [self.tool_ttls[name] for name in used if name in self.tool_ttls])
+        if lifetime <= 0 or any(reads_clock(step.code_action) for step in steps):
+            self._count("skipped")
+            return False
+
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO runs (key, task, answer, steps, tools, created_at, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.key(agent, task, documents), task, str(answer), json.dumps([step_record(step) for step in steps], default=str),
+                    json.dumps(sorted(used)), now, now + lifetime, now,
+                ),
+            )
+            conn.execute("DELETE FROM runs WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM runs WHERE key IN ("
+                " SELECT key FROM runs ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._count("stored")
+        return True
+
+    def restore(self, agent, task: str, entry: dict) -> list:
+        """Put a cached run into `agent.memory` as if it had just run; returns its action steps."""
+        agent.memory.reset()
+        agent.memory.steps.append(TaskStep(task=task))
+        steps = [restore_step(record, agent.logger) for record in entry["steps"]]
+        agent.memory.steps.extend(steps)
+        return steps
+
+    def clear(self):
+        self._connect().execute("DELETE FROM runs")
+
+    def stats(self) -> dict:
+        entries = self._connect().execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stored": self.stored,
+            "skipped": self.skipped,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        }
+
+
+_cache = None
+_cache_loaded = False
+_lock = threading.Lock()
+
+
+def get_run_cache() -> Optional[RunCache]:
+    """The process-wide run cache from the environment (None when it is off)."""
+    global _cache, _cache_loaded
+    if not _cache_loaded:
+        with _lock:
+            if not _cache_loaded:
+                _cache = RunCache.from_env()
+                _cache_loaded = True
+    return _cache
@@ -0,0 +1,40 @@
+import argparse
+import io
+import os
+import sys
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS)
+
+import agent_bench  # noqa: E402
+from mock_services import MockServices  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def bench(tmp_path_factory):
+    services = MockServices(latency={"search": 0, "page": 0, "image": 0, "chat": 0}).start()
+    environ = dict(os.environ)
+    agent_bench.configure_environment(services, str(tmp_path_factory.mktemp("agent_bench")))
+    import app  # after configure_environment, as in the benchmark
+
+    yield app, services
+    services.stop()
+    os.environ.clear()
+    os.environ.update(environ)
+
+
+def test_scripted_scenario_runs_every_step(bench):
+    from rich.console import Console
+
+    app, services = bench
+    args = argparse.Namespace(first_token=0.0, tokens_per_second=1e6)
+    result = agent_bench.run_task(app, "search_and_read", 0, services.url, args, Console(file=io.StringIO()))
+
+    assert result["error"] is None
+    assert result["errors"] == []
+    assert len(result["steps"]) == len(agent_bench.SCENARIOS["search_and_read"])
+    assert result["answer"] == "asyncio runs coroutines on an event loop (0)"
+    assert services.requests["search"] >= 1
+    assert services.requests["page"] >= 1
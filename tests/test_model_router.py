@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from router_bench import StandInModel  # noqa: E402
+
+from model_router import CLOSED, HALF_OPEN, OPEN, RouterModel  # noqa: E402
+
+
+def router(primary: StandInModel, secondary: StandInModel, **kwargs) -> RouterModel:
+    return RouterModel([("primary", primary), ("secondary", secondary)], probe_interval=0, **kwargs)
+
+
+def backend(model: RouterModel, name: str):
+    return next(b for b in model.backends if b.name == name)
+
+
+def test_failed_call_fails_over_to_next_backend():
+    model = router(StandInModel("primary", 0.01, jitter=0, fail_from=1, fail_until=1), StandInModel("secondary", 0.01, jitter=0))
+
+    assert model.generate([]).content == "answer from secondary"
+    assert backend(model, "primary").stats()["errors"] == 1
+    assert model.generate([]).content == "answer from primary"
+
+
+def test_circuit_opens_then_half_opens_and_closes():
+    model = router(
+        StandInModel("primary", 0.01, jitter=0, fail_from=1, fail_until=2),
+        StandInModel("secondary", 0.01, jitter=0),
+        failure_threshold=2,
+        cooldown=0.2,
+    )
+    primary = backend(model, "primary")
+
+    for _ in range(2):
+        assert model.generate([]).content == "answer from secondary"
+    assert primary.state == OPEN
+    assert model.generate([]).content == "answer from secondary"  # ejected: not even tried
+
+    time.sleep(0.25)
+    assert primary.state == HALF_OPEN
+    assert model.generate([]).content == "answer from primary"  # the trial call succeeds
+    assert primary.state == CLOSED
+    assert primary.stats()["circuit_trips"] == 1
+
+
+def test_every_circuit_open_still_tries_the_longest_ejected():
+    model = router(
+        StandInModel("primary", 0.01, jitter=0, fail_from=1, fail_until=1),
+        StandInModel("secondary", 0.01, jitter=0, fail_from=1, fail_until=1),
+        failure_threshold=1,
+        cooldown=60,
+    )
+    try:
+        model.generate([])
+    except ConnectionError:
+        pass
+    assert [b.state for b in model.backends] == [OPEN, OPEN]
+
+    assert model.generate([]).content == "answer from primary"
+    assert backend(model, "primary").state == CLOSED
+
+
+def test_hedge_to_faster_backend_wins():
+    model = router(StandInModel("primary", 1.0, jitter=0), StandInModel("secondary", 0.02, jitter=0), hedge=True, hedge_after=0.05)
+
+    started = time.perf_counter()
+    assert model.generate([]).content == "answer from secondary"
+    assert time.perf_counter() - started < 0.5
+    assert model.hedges == 1
+    assert backend(model, "secondary").hedges_won == 1
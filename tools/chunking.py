@@ -0,0 +1,159 @@
+"""Token-aware chunking and a parallel map-reduce helper for long tool inputs."""
+import ast
+import contextvars
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encodings = {}
+
+# Top-level definitions in common languages; used to cut non-Python code between functions
+CODE_BOUNDARY = re.compile(
+    r"^(?:export\s+)?(?:async\s+)?(?:def|class|function|func|fn|impl|struct|interface|enum|module|"
+    r"public|private|protected|static|const\s+\w+\s*=\s*(?:async\s*)?\()",
+)
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Exact count with tiktoken when it is installed, otherwise the usual ~4 characters per token."""
+    if tiktoken is None:
+        return len(text) // 4 + 1
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return len(_encodings[model].encode(text, disallowed_special=()))
+
+
+def _pack(units: List[str], max_tokens: int, separator: str, model: str) -> List[str]:
+    chunks, current, current_tokens = [], [], 0
+    for unit in units:
+        tokens = count_tokens(unit, model)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += tokens
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def _split_oversized(unit: str, max_tokens: int, model: str) -> List[str]:
+    """Break a single paragraph that is larger than a chunk on sentences, then on characters."""
+    if count_tokens(unit, model) <= max_tokens:
+        return [unit]
+    sentences = re.split(r"(?<=[.!?])\s+", unit)
+    if len(sentences) > 1:
+        return _pack(sentences, max_tokens, " ", model)
+    width = max_tokens * 4
+    return [unit[i:i + width] for i in range(0, len(unit), width)]
+
+
+def split_text(text: str, max_tokens: int = 2000, model: str = "gpt-4o-mini") -> List[str]:
+    """Split prose on paragraph boundaries into chunks of at most ~max_tokens tokens."""
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    units = [piece for p in paragraphs for piece in _split_oversized(p, max_tokens, model)]
+    return _pack(units, max_tokens, "\n\n", model)
+
+
+def _python_units(code: str) -> List[str]:
+    tree = ast.parse(code)
+    lines = code.splitlines(keepends=True)
+    starts = []
+    for node in tree.body:
+        start = node.lineno - 1
+        # Keep decorators and the comments right above a definition with it
+        if getattr(node, "decorator_list", None):
+            start = min(d.lineno for d in node.decorator_list) - 1
+        while start > 0 and lines[start - 1].lstrip().startswith("#"):
+            start -= 1
+        starts.append(start)
+    starts = sorted(set([0] + starts))
+    bounds = starts + [len(lines)]
+    return ["".join(lines[a:b]) for a, b in zip(bounds, bounds[1:]) if "".join(lines[a:b]).strip()]
+
+
+def _generic_code_units(code: str) -> List[str]:
+    units, current = [], []
+    for line in code.splitlines(keepends=True):
+        if current and CODE_BOUNDARY.match(line):
+            units.append("".join(current))
+            current = []
+        current.append(line)
+    if current:
+        units.append("".join(current))
+    return units
+
+
+def split_code(code: str, language: str = "python", max_tokens: int = 2000, model: str = "gpt-4o-mini") -> List[str]:
+    """Split source code between top-level functions/classes into chunks of at most ~max_tokens tokens."""
+    units = None
+    if (language or "").lower() in ("python", "py"):
+        try:
+            units = _python_units(code)
+        except SyntaxError:
+            units = None
+    if units is None:
+        units = _generic_code_units(code)
+    # A single function larger than a chunk is cut on line boundaries
+    sized = []
+    for unit in units:
+        if count_tokens(unit, model) <= max_tokens:
+            sized.append(unit)
+        else:
+            sized.extend(_pack(unit.splitlines(keepends=True), max_tokens, "", model))
+    return _pack(sized, max_tokens, "", model)
+
+
+def map_reduce(chunks: List[str], map_fn: Callable[[int, str], str], reduce_fn: Callable[[List[str]], str], max_workers: int = 6):
+    """Run map_fn over chunks in parallel, then reduce_fn over the partial results.
+
+    Returns (result, stats); with no chunks, ("", stats) without calling either function.
+    How this compares with one unchunked call is measured by benchmarks/chunking_bench.py.
+    """
+    if not chunks:
+        return "", {"chunks": 0, "map_seconds": 0.0, "reduce_seconds": 0.0, "total_seconds": 0.0, "slowest_chunk_seconds": 0.0}
+    durations = [0.0] * len(chunks)
+
+    def timed(args):
+        index, chunk = args
+        start = time.perf_counter()
+        try:
+            return map_fn(index, chunk)
+        finally:
+            durations[index] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        # Each chunk runs in a copy of the caller's context so its model calls join the caller's trace
+        futures = [pool.submit(contextvars.copy_context().run, timed, item) for item in enumerate(chunks)]
+        partials = [future.result() for future in futures]
+    map_seconds = time.perf_counter() - start
+
+    reduce_start = time.perf_counter()
+    result = reduce_fn(partials) if len(partials) > 1 else partials[0]
+    reduce_seconds = time.perf_counter() - reduce_start
+
+    stats = {
+        "chunks": len(chunks),
+        "map_seconds": round(map_seconds, 2),
+        "reduce_seconds": round(reduce_seconds, 2),
+        "total_seconds": round(map_seconds + reduce_seconds, 2),
+        "slowest_chunk_seconds": round(max(durations), 2),
+    }
+    return result, stats
+
+
+def format_stats(stats: dict) -> str:
+    return (
+        f"📦 Chunked run: {stats['chunks']} chunks | map {stats['map_seconds']}s (parallel, slowest chunk "
+        f"{stats['slowest_chunk_seconds']}s) | reduce {stats['reduce_seconds']}s | total {stats['total_seconds']}s"
+    )
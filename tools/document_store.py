@@ -0,0 +1,475 @@
+"""Parse-once storage and search for uploaded documents.
+
+`DocumentStore.submit(path)` returns a document id at once and parses the file in a
+background worker: plain text, DOCX (read straight from its XML, no extra package) and PDF
+(with `pypdf`, page by page). The text is split into passages of about `chunk_tokens`
+tokens and written with a BM25 index to `<store dir>/<sha256 of the file>/`:
+
+    text.bin       UTF-8 passages, back to back
+    chunks.bin     per passage: byte offset, byte length, token count, page ("<QIII")
+    postings.bin   per term occurrence: passage number, term frequency ("<II")
+    meta.json      name, counts, average passage length, and term -> [first posting, count]
+
+The binary files are memory-mapped when searched, so only the passages that are returned
+are read from disk. A file with the same content is parsed once, however often and under
+whatever name it is uploaded; documents already on disk are found again after a restart.
+
+`document_search` returns the passages relevant to a query instead of the whole file. In
+the UI it only sees the documents uploaded in the current session (see `session`).
+
+At most `max_open` documents (DOCUMENT_STORE_MAX_OPEN) are kept open, each holding three
+maps (and their file descriptors): beyond that the least recently searched ones are closed and
+forgotten. Their files stay on disk, so a session that still refers to one reopens it.
+"""
+import array
+import contextvars
+import hashlib
+import json
+import math
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+from xml.etree import ElementTree
+
+from smolagents.tools import Tool
+
+from tools.chunking import split_text
+from tools.research_index import tokenize
+
+DEFAULT_STORE_DIR = os.path.join(".cache", "documents")
+
+CHUNK_FORMAT = "<QIII"
+CHUNK_SIZE = struct.calcsize(CHUNK_FORMAT)
+
+# Document states
+QUEUED = "queued"
+PARSING = "parsing"
+READY = "ready"
+FAILED = "failed"
+
+_WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+_session_documents = contextvars.ContextVar("session_documents", default=None)
+
+
+def read_txt(path: str) -> list:
+    with open(path, "rb") as f:
+        raw = f.read()
+    for encoding in ("utf-8", "utf-16"):
+        try:
+            return [(raw.decode(encoding), 0)]
+        except UnicodeDecodeError:
+            continue
+    return [(raw.decode("latin-1"), 0)]
+
+
+def read_docx(path: str) -> list:
+    """Paragraph text of word/document.xml; tables come out one cell per paragraph."""
+    with zipfile.ZipFile(path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    paragraphs = []
+    for paragraph in root.iter(f"{_WORD_NAMESPACE}p"):
+        text = "".join(node.text or "" for node in paragraph.iter(f"{_WORD_NAMESPACE}t"))
+        if text.strip():
+            paragraphs.append(text)
+    return [("\n\n".join(paragraphs), 0)]
+
+
+def read_pdf(path: str) -> list:
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise ImportError("Reading PDF files needs the `pypdf` package: run `pip install pypdf`.") from e
+    reader = PdfReader(path)
+    return [(page.extract_text() or "", number) for number, page in enumerate(reader.pages, start=1)]
+
+
+READERS = {".txt": read_txt, ".md": read_txt, ".docx": read_docx, ".pdf": read_pdf}
+
+
+class Document:
+    def __init__(self, doc_id: str, name: str, path: str):
+        self.id = doc_id
+        self.name = name
+        self.path = path
+        self.status = QUEUED
+        self.error = None
+        self.chunks = 0
+        self.pages = 0
+        self.characters = 0
+        self.parse_seconds = None
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.readers = 0  # searches using the index right now; it is not closed under them
+        self.done = threading.Event()
+        self._index = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (READY, FAILED)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "chunks": self.chunks,
+            "pages": self.pages,
+            "characters": self.characters,
+            "parse_seconds": self.parse_seconds,
+            "error": str(self.error) if self.error else None,
+        }
+
+
+class MappedIndex:
+    """Read-only view of one document's files; the binary ones are memory-mapped."""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.text = self._map(os.path.join(directory, "text.bin"))
+        self.chunks = self._map(os.path.join(directory, "chunks.bin"))
+        self._postings_map = self._map(os.path.join(directory, "postings.bin"))
+        self._views = [memoryview(self._postings_map)] if len(self._postings_map) else []
+        self.postings = self._views[0].cast("I") if self._views else []
+
+    @staticmethod
+    def _map(path: str):
+        # The map keeps its own descriptor, so the file itself is closed at once
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        """Unmap the files and close their descriptors; the index cannot be read afterwards."""
+        if isinstance(self.postings, memoryview):
+            self.postings.release()
+        for view in self._views:
+            view.release()
+        self.postings, self._views = [], []
+        for mapped in (self.text, self.chunks, self._postings_map):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+    def chunk(self, number: int) -> tuple:
+        """(text, page) of passage `number`."""
+        offset, length, _, page = struct.unpack_from(CHUNK_FORMAT, self.chunks, number * CHUNK_SIZE)
+        return self.text[offset:offset + length].decode("utf-8"), page
+
+    def chunk_length(self, number: int) -> int:
+        return struct.unpack_from(CHUNK_FORMAT, self.chunks, number * CHUNK_SIZE)[2]
+
+    def postings_for(self, term: str):
+        """(passage number, term frequency) pairs of `term`."""
+        entry = self.meta["terms"].get(term)
+        if entry is None:
+            return
+        first, count = entry
+        for i in range(first, first + count):
+            yield self.postings[2 * i], self.postings[2 * i + 1]
+
+
+def write_index(directory: str, name: str, sections: list, chunk_tokens: int) -> dict:
+    """Chunk the (text, page) sections of a document and write its files to `directory`."""
+    staging = directory + ".partial"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    postings = {}
+    chunk_records = array.array("B")
+    offset = 0
+    total_tokens = 0
+    number = 0
+    with open(os.path.join(staging, "text.bin"), "wb") as text_file:
+        for text, page in sections:
+            for passage in split_text(text, max_tokens=chunk_tokens) if text.strip() else []:
+                tokens = tokenize(passage)
+                if not tokens:
+                    continue
+                data = passage.encode("utf-8")
+                text_file.write(data)
+                chunk_records.frombytes(struct.pack(CHUNK_FORMAT, offset, len(data), len(tokens), page))
+                for term, count in Counter(tokens).items():
+                    postings.setdefault(term, []).append((number, count))
+                offset += len(data)
+                total_tokens += len(tokens)
+                number += 1
+    with open(os.path.join(staging, "chunks.bin"), "wb") as f:
+        chunk_records.tofile(f)
+    terms = {}
+    flat = array.array("I")
+    for term in sorted(postings):
+        terms[term] = [len(flat) // 2, len(postings[term])]
+        for chunk_number, count in postings[term]:
+            flat.extend((chunk_number, count))
+    with open(os.path.join(staging, "postings.bin"), "wb") as f:
+        flat.tofile(f)
+    meta = {
+        "name": name,
+        "chunks": number,
+        "pages": max((page for _, page in sections), default=0),
+        "characters": sum(len(text) for text, _ in sections),
+        "average_tokens": total_tokens / number if number else 0.0,
+        "terms": terms,
+    }
+    with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    # Readers only ever see a complete directory
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+    return meta
+
+
+class DocumentStore:
+    def __init__(self, directory: str = DEFAULT_STORE_DIR, chunk_tokens: int = 300, max_workers: int = 2,
+                 max_open: int = 64, k1: float = 1.5, b: float = 0.75):
+        self.directory = directory
+        self.chunk_tokens = chunk_tokens
+        self.max_workers = max_workers
+        self.max_open = max_open
+        self.evicted = 0
+        self.k1 = k1
+        self.b = b
+        self.documents = {}  # id -> Document
+        self._lock = threading.Lock()
+        self._executor = None
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "DocumentStore":
+        return cls(
+            directory=os.getenv("DOCUMENT_STORE_DIR", DEFAULT_STORE_DIR),
+            chunk_tokens=int(os.getenv("DOCUMENT_CHUNK_TOKENS", 300)),
+            max_open=int(os.getenv("DOCUMENT_STORE_MAX_OPEN", 64)),
+        )
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="document_ingest")
+            return self._executor
+
+    @staticmethod
+    def file_id(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()[:24]
+
+    def submit(self, path: str) -> str:
+        """Queue `path` for parsing and return its document id (the same for identical content)."""
+        doc_id = self.file_id(path)
+        name = os.path.basename(path)
+        with self._lock:
+            document = self.documents.get(doc_id)
+            if document is not None and document.status != FAILED:
+                return doc_id
+            document = self.documents[doc_id] = Document(doc_id, name, path)
+        if os.path.exists(os.path.join(self.directory, doc_id, "meta.json")):
+            self._open(document)
+        else:
+            self._pool().submit(self._ingest, document)
+        return doc_id
+
+    def _open(self, document: Document):
+        index = MappedIndex(os.path.join(self.directory, document.id))
+        document._index = index
+        document.name = document.name or index.meta["name"]
+        document.chunks = index.meta["chunks"]
+        document.pages = index.meta["pages"]
+        document.characters = index.meta["characters"]
+        document.status = READY
+        document.done.set()
+        self._evict()
+
+    def reopen(self, doc_ids: list):
+        """Open again the documents among `doc_ids` that were evicted but are still on disk."""
+        for doc_id in doc_ids:
+            if doc_id in self.documents or not os.path.exists(os.path.join(self.directory, doc_id, "meta.json")):
+                continue
+            with self._lock:
+                if doc_id in self.documents:
+                    continue
+                document = self.documents[doc_id] = Document(doc_id, "", "")
+            try:
+                self._open(document)
+            except Exception as e:
+                document.error = e
+                document.status = FAILED
+                document.done.set()
+
+    def _evict(self):
+        """Close and forget the least recently used finished documents beyond `max_open`."""
+        with self._lock:
+            excess = len(self.documents) - self.max_open
+            if excess <= 0:
+                return
+            idle = sorted((d for d in self.documents.values() if d.finished and not d.readers), key=lambda d: d.last_used)
+            victims = idle[:excess]
+            for document in victims:
+                del self.documents[document.id]
+            self.evicted += len(victims)
+        for document in victims:
+            if document._index is not None:
+                document._index.close()
+                document._index = None
+
+    def _ingest(self, document: Document):
+        started = time.perf_counter()
+        try:
+            document.status = PARSING
+            reader = READERS.get(os.path.splitext(document.path)[1].lower())
+            if reader is None:
+                raise ValueError(f"Unsupported file type: {document.name}")
+            sections = reader(document.path)
+            write_index(os.path.join(self.directory, document.id), document.name, sections, self.chunk_tokens)
+            document.parse_seconds = round(time.perf_counter() - started, 3)
+            self._open(document)
+        except Exception as e:
+            document.error = e
+            document.status = FAILED
+            document.done.set()
+
+    def wait(self, doc_ids: list, timeout: Optional[float] = None) -> list:
+        """Block until the documents are parsed (or `timeout` passes); returns those still pending."""
+        deadline = time.time() + timeout if timeout is not None else None
+        for doc_id in doc_ids:
+            document = self.documents.get(doc_id)
+            if document is not None:
+                document.done.wait(None if deadline is None else max(0.0, deadline - time.time()))
+        return [doc_id for doc_id in doc_ids if doc_id in self.documents and not self.documents[doc_id].finished]
+
+    def search(self, query: str, doc_ids: Optional[list] = None, k: int = 5) -> list:
+        """The `k` best passages over the ready documents, as dicts (document, page, text, score)."""
+        terms = set(tokenize(query))
+        now = time.time()
+        with self._lock:
+            ready = [
+                d for d in self.documents.values()
+                if d.status == READY and d.chunks and (doc_ids is None or d.id in doc_ids)
+            ]
+            for document in ready:
+                document.readers += 1
+                document.last_used = now
+        try:
+            return self._search(terms, ready, k)
+        finally:
+            with self._lock:
+                for document in ready:
+                    document.readers -= 1
+
+    def _search(self, terms: set, ready: list, k: int) -> list:
+        total_chunks = sum(d.chunks for d in ready)
+        if not terms or not total_chunks:
+            return []
+        average = sum(d._index.meta["average_tokens"] * d.chunks for d in ready) / total_chunks
+        frequencies = {term: sum(d._index.meta["terms"].get(term, (0, 0))[1] for d in ready) for term in terms}
+        scores = {}
+        for document in ready:
+            index = document._index
+            for term in terms:
+                if not frequencies[term]:
+                    continue
+                idf = math.log(1 + (total_chunks - frequencies[term] + 0.5) / (frequencies[term] + 0.5))
+                for number, frequency in index.postings_for(term):
+                    length = index.chunk_length(number)
+                    denominator = frequency + self.k1 * (1 - self.b + self.b * length / average)
+                    key = (document.id, number)
+                    scores[key] = scores.get(key, 0.0) + idf * frequency * (self.k1 + 1) / denominator
+        results = []
+        by_id = {d.id: d for d in ready}
+        for doc_id, number in sorted(scores, key=scores.get, reverse=True)[:k]:
+            text, page = by_id[doc_id]._index.chunk(number)
+            results.append({"document": by_id[doc_id].name, "page": page, "text": text, "score": scores[(doc_id, number)]})
+        return results
+
+    def stats(self) -> dict:
+        documents = list(self.documents.values())
+        return {
+            "documents": len(documents),
+            "ready": sum(d.status == READY for d in documents),
+            "pending": sum(not d.finished for d in documents),
+            "failed": sum(d.status == FAILED for d in documents),
+            "chunks": sum(d.chunks for d in documents),
+            "evicted": self.evicted,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> DocumentStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DocumentStore.from_env()
+    return _store
+
+
+@contextmanager
+def session(doc_ids: Optional[list]):
+    """Limit document_search to `doc_ids` (the current chat's uploads) while a run executes."""
+    token = _session_documents.set(list(doc_ids) if doc_ids is not None else None)
+    try:
+        yield
+    finally:
+        _session_documents.reset(token)
+
+
+class DocumentSearchTool(Tool):
+    name = "document_search"
+    description = (
+        "Searches the files uploaded in this conversation (PDF, DOCX, TXT), which are already parsed and indexed, "
+        "and returns only the passages relevant to the query, with their file name and page. Use this instead of "
+        "opening or reading uploaded files in code."
+    )
+    inputs = {
+        'query': {'type': 'string', 'description': 'What to look for in the uploaded documents.'},
+        'document': {'type': 'string', 'description': 'Only search the uploaded file with this name.', 'nullable': True},
+        'max_results': {'type': 'integer', 'description': 'How many passages to return (default 5).', 'nullable': True},
+    }
+    output_type = "string"
+
+    def __init__(self, store: Optional[DocumentStore] = None, wait_seconds: float = 60, **kwargs):
+        super().__init__()
+        self.store = store or get_store()
+        self.wait_seconds = wait_seconds
+
+    def forward(self, query: str, document: Optional[str] = None, max_results: Optional[int] = None) -> str:
+        scope = _session_documents.get()
+        if scope is not None:
+            self.store.reopen(scope)
+        doc_ids = list(self.store.documents) if scope is None else scope
+        if document:
+            doc_ids = [i for i in doc_ids if i in self.store.documents and self.store.documents[i].name == os.path.basename(document)]
+            if not doc_ids:
+                return f"No uploaded file is named '{document}'."
+        if not doc_ids:
+            return "No files have been uploaded in this conversation."
+        still_parsing = self.store.wait(doc_ids, timeout=self.wait_seconds)
+        notes = []
+        for doc_id in doc_ids:
+            entry = self.store.documents.get(doc_id)
+            if entry is not None and entry.status == FAILED:
+                notes.append(f"⚠️ {entry.name} could not be read: {entry.error}")
+            elif doc_id in still_parsing:
+                notes.append(f"⏳ {entry.name} is still being parsed; search again shortly.")
+        results = self.store.search(query, doc_ids=doc_ids, k=max_results or 5)
+        if not results:
+            return "\n".join(notes + [f"No passages in the uploaded files match '{query}'."])
+        sections = [f"## Passages for: {query}"] + notes
+        for result in results:
+            where = f"{result['document']}, page {result['page']}" if result["page"] else result["document"]
+            sections.append(f"[{where}]\n{result['text']}")
+        return "\n\n".join(sections)
@@ -0,0 +1,286 @@
+"""HTML -> markdown extraction engines for visit_webpage.
+
+Two engines are registered:
+
+- `lexbor`: strips boilerplate (scripts, navigation, footers, sidebars...), picks the
+  main content block and converts only that to markdown, using the compiled Lexbor
+  parser from `selectolax`.
+- `markdownify`: the original full-DOM conversion, kept as the fallback.
+
+`extract_markdown` uses the engine named in VISIT_WEBPAGE_ENGINE ("auto" by default:
+lexbor when selectolax is installed, markdownify otherwise) and falls back to
+markdownify if the fast engine fails or finds no content.
+"""
+import os
+import re
+from typing import Dict, Optional
+from urllib.parse import urljoin
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# Removed together with their content before looking for the main block
+BOILERPLATE_TAGS = [
+    "script", "style", "noscript", "template", "iframe", "svg", "canvas", "form", "button",
+    "select", "input", "nav", "footer", "aside", "header", "dialog",
+]
+BOILERPLATE_HINTS = re.compile(
+    r"nav|menu|footer|sidebar|cookie|consent|banner|breadcrumb|social|share|comment|related|"
+    r"advert|\bads?\b|promo|sponsor|subscribe|newsletter|popup|modal|masthead|toolbar",
+    re.IGNORECASE,
+)
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "body", "figure", "figcaption", "details", "summary",
+    "dl", "dt", "dd", "address", "center",
+}
+INLINE_MARKERS = {"strong": "**", "b": "**", "em": "*", "i": "*", "del": "~~", "s": "~~"}
+MIN_MAIN_CONTENT_CHARS = 250
+MAX_DEPTH = 200
+
+
+class MarkdownifyEngine:
+    name = "markdownify"
+
+    def convert(self, html: str, base_url: Optional[str] = None) -> str:
+        from markdownify import markdownify
+
+        return markdownify(html).strip()
+
+
+class LexborEngine:
+    name = "lexbor"
+
+    def __init__(self):
+        if LexborHTMLParser is None:
+            raise ImportError("You must install package `selectolax` to use the lexbor engine: run `pip install selectolax`.")
+
+    def convert(self, html: str, base_url: Optional[str] = None) -> str:
+        tree = LexborHTMLParser(html)
+        if tree.body is None:
+            return ""
+        tree.strip_tags(BOILERPLATE_TAGS)
+        self._drop_hinted_blocks(tree)
+        root = self._main_content(tree)
+        title = tree.css_first("title")
+        parts = []
+        if title is not None and root.css_first("h1") is None:
+            title_text = _collapse(title.text(deep=True)).strip()
+            if title_text:
+                parts.append(f"# {title_text}")
+        parts.append(_Renderer(base_url).render(root))
+        return _tidy("\n\n".join(parts))
+
+    @staticmethod
+    def _drop_hinted_blocks(tree):
+        """Remove blocks whose class/id marks them as boilerplate, unless they hold a lot of prose."""
+        for node in tree.body.css("[class], [id], [role]"):
+            if node.tag in ("body", "main", "article"):
+                continue
+            attrs = node.attributes
+            hint = " ".join(filter(None, (attrs.get("class"), attrs.get("id"), attrs.get("role"))))
+            if not BOILERPLATE_HINTS.search(hint):
+                continue
+            text = node.text(deep=True, strip=True)
+            link_text = sum(len(a.text(deep=True, strip=True)) for a in node.css("a"))
+            if len(text) < MIN_MAIN_CONTENT_CHARS or link_text > 0.5 * len(text):
+                node.decompose()
+
+    @staticmethod
+    def _main_content(tree):
+        """Pick <main>/<article> when present, otherwise the block that holds the most paragraph text."""
+        body = tree.body
+        for selector in ("main", "[role=main]", "article"):
+            candidates = tree.css(selector)
+            if candidates:
+                best = max(candidates, key=lambda n: len(n.text(deep=True, strip=True)))
+                if len(best.text(deep=True, strip=True)) >= MIN_MAIN_CONTENT_CHARS:
+                    return best
+
+        scores: Dict[int, float] = {}
+        nodes = {}
+        for paragraph in body.css("p, pre, li, td, blockquote"):
+            length = len(paragraph.text(deep=True, strip=True))
+            if length < 25:
+                continue
+            parent = paragraph.parent
+            weight = 1.0
+            while parent is not None and weight >= 0.25:
+                key = parent.mem_id
+                nodes[key] = parent
+                scores[key] = scores.get(key, 0.0) + length * weight
+                if parent.tag == "body":
+                    break
+                parent = parent.parent
+                weight /= 2
+        if not scores:
+            return body
+        best = nodes[max(scores, key=scores.get)]
+        if len(best.text(deep=True, strip=True)) < MIN_MAIN_CONTENT_CHARS:
+            return body
+        return best
+
+
+class _Renderer:
+    """Small markdown writer over a Lexbor DOM; covers the tags that carry meaning for an LLM."""
+
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = base_url
+
+    def render(self, node) -> str:
+        return self._children(node, 0)
+
+    def _children(self, node, depth: int) -> str:
+        out = []
+        child = node.child
+        while child is not None:
+            out.append(self._node(child, depth + 1))
+            child = child.next
+        return "".join(out)
+
+    def _href(self, href: str) -> str:
+        return urljoin(self.base_url, href) if self.base_url else href
+
+    def _node(self, node, depth: int) -> str:
+        tag = node.tag
+        if tag == "-text":
+            return _collapse(node.text_content or "")
+        if tag in ("-comment", "head", "title", "meta", "link"):
+            return ""
+        if depth > MAX_DEPTH:
+            return _collapse(node.text(deep=True))
+
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            text = _collapse(self._children(node, depth)).strip()
+            return f"\n\n{'#' * int(tag[1])} {text}\n\n" if text else ""
+        if tag in BLOCK_TAGS:
+            return f"\n\n{self._children(node, depth)}\n\n"
+        if tag == "br":
+            return "\n"
+        if tag == "hr":
+            return "\n\n---\n\n"
+        if tag == "pre":
+            code = node.text(deep=True).strip("\n")
+            return f"\n\n```\n{code}\n```\n\n" if code.strip() else ""
+        if tag == "code":
+            text = node.text(deep=True)
+            return f"`{text}`" if text.strip() else ""
+        if tag in INLINE_MARKERS:
+            text = self._children(node, depth)
+            marker = INLINE_MARKERS[tag]
+            return f"{marker}{text.strip()}{marker}" if text.strip() else text
+        if tag == "a":
+            text = self._children(node, depth).strip()
+            href = node.attributes.get("href") or ""
+            if not text:
+                return ""
+            if not href or href.startswith(("#", "javascript:", "mailto:")):
+                return text
+            return f"[{text}]({self._href(href)})"
+        if tag == "img":
+            alt = (node.attributes.get("alt") or "").strip()
+            src = node.attributes.get("src") or ""
+            return f"![{_collapse(alt)}]({self._href(src)})" if alt and src else ""
+        if tag in ("ul", "ol"):
+            return self._list(node, depth, ordered=tag == "ol")
+        if tag == "blockquote":
+            text = _tidy(self._children(node, depth))
+            return "\n\n" + "\n".join(f"> {line}" if line else ">" for line in text.splitlines()) + "\n\n"
+        if tag == "table":
+            return self._table(node)
+        return self._children(node, depth)
+
+    def _list(self, node, depth: int, ordered: bool) -> str:
+        lines = []
+        index = 1
+        for item in node.iter():
+            if item.tag != "li":
+                continue
+            text = _tidy(self._children(item, depth))
+            if not text:
+                continue
+            bullet = f"{index}." if ordered else "-"
+            first, *rest = text.splitlines()
+            lines.append(f"{bullet} {first}")
+            lines.extend(f"  {line}" if line else "" for line in rest)
+            index += 1
+        return "\n\n" + "\n".join(lines) + "\n\n" if lines else ""
+
+    def _table(self, node) -> str:
+        rows = []
+        for row in node.css("tr"):
+            cells = [_collapse(cell.text(deep=True)).strip().replace("|", "\\|") for cell in row.css("th, td")]
+            if any(cells):
+                rows.append(cells)
+        if not rows:
+            return ""
+        width = max(len(r) for r in rows)
+        rows = [r + [""] * (width - len(r)) for r in rows]
+        lines = ["| " + " | ".join(rows[0]) + " |", "|" + " --- |" * width]
+        lines.extend("| " + " | ".join(r) + " |" for r in rows[1:])
+        return "\n\n" + "\n".join(lines) + "\n\n"
+
+
+def _collapse(text: str) -> str:
+    return re.sub(r"\s+", " ", text)
+
+
+def _tidy(markdown: str) -> str:
+    lines = []
+    in_fence = False
+    for line in markdown.splitlines():
+        if line.startswith("```"):
+            in_fence = not in_fence
+        elif not in_fence:
+            # A single leading space is collapsed whitespace between tags; list indentation uses two
+            line = re.sub(r"^ (?=\S)", "", line.rstrip())
+        lines.append(line)
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+ENGINES = {
+    MarkdownifyEngine.name: MarkdownifyEngine,
+    LexborEngine.name: LexborEngine,
+}
+_instances = {}
+
+
+def register_engine(engine_cls):
+    """Register an extra engine class (needs a `name` attribute and a `convert(html, base_url)` method)."""
+    ENGINES[engine_cls.name] = engine_cls
+    _instances.pop(engine_cls.name, None)
+
+
+def available_engines() -> list:
+    names = []
+    for name in ENGINES:
+        try:
+            get_engine(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_engine(name: Optional[str] = None):
+    name = name or os.getenv("VISIT_WEBPAGE_ENGINE", "auto")
+    if name == "auto":
+        name = LexborEngine.name if LexborHTMLParser is not None else MarkdownifyEngine.name
+    if name not in ENGINES:
+        raise ValueError(f"Unknown extraction engine '{name}', choose one of {list(ENGINES)}")
+    if name not in _instances:
+        _instances[name] = ENGINES[name]()
+    return _instances[name]
+
+
+def extract_markdown(html: str, engine: Optional[str] = None, base_url: Optional[str] = None) -> str:
+    selected = get_engine(engine)
+    if selected.name != MarkdownifyEngine.name:
+        try:
+            markdown = selected.convert(html, base_url=base_url)
+            if markdown:
+                return markdown
+        except Exception:
+            pass
+    return get_engine(MarkdownifyEngine.name).convert(html, base_url=base_url)
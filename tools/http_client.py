@@ -0,0 +1,113 @@
+"""Shared, pooled HTTP session used by every HTTP-based tool.
+
+One `requests.Session` is created per process. Its adapters keep a keep-alive
+connection pool per host, so repeated requests to the same domain reuse their
+TCP/TLS connection instead of opening a new one every call.
+"""
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TIMEOUT = 20
+
+_config = {
+    "pool_connections": int(os.getenv("HTTP_POOL_CONNECTIONS", 16)),  # number of hosts kept in the pool
+    "pool_maxsize": int(os.getenv("HTTP_POOL_MAXSIZE", 16)),  # sockets kept alive per host
+    "max_retries": int(os.getenv("HTTP_MAX_RETRIES", 0)),
+}
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+
+
+def _accept_encoding() -> str:
+    """Advertise brotli only when urllib3 is able to decode it."""
+    encodings = ["gzip", "deflate"]
+    for module in ("brotli", "brotlicffi"):
+        try:
+            __import__(module)
+        except ImportError:
+            continue
+        encodings.append("br")
+        break
+    return ", ".join(encodings)
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=_config["pool_connections"],
+        pool_maxsize=_config["pool_maxsize"],
+        max_retries=_config["max_retries"],
+        pool_block=False,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": _accept_encoding(), "Connection": "keep-alive"})
+    return session
+
+
+def configure(pool_connections: Optional[int] = None, pool_maxsize: Optional[int] = None, max_retries: Optional[int] = None):
+    """Change the pool sizes; the shared session is rebuilt on next use."""
+    global _session
+    with _lock:
+        for key, value in (
+            ("pool_connections", pool_connections),
+            ("pool_maxsize", pool_maxsize),
+            ("max_retries", max_retries),
+        ):
+            if value is not None:
+                _config[key] = value
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def connection_stats() -> dict:
+    """Per-host connection reuse: sockets opened vs requests sent over them."""
+    session = _session
+    if session is None:
+        return {}
+    stats = {}
+    for adapter in {id(a): a for a in session.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        with pools.lock:
+            keys = list(pools.keys())
+        for key in keys:
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{key.key_scheme}://{key.key_host}:{key.key_port or ''}".rstrip(":")
+            opened = pool.num_connections
+            sent = pool.num_requests
+            stats[host] = {
+                "connections_opened": opened,
+                "requests": sent,
+                "reused": max(sent - opened, 0),
+                "idle": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0,
+            }
+    return stats
@@ -2,9 +2,23 @@ import os
 import requests
 from smolagents.tools import Tool
 from dotenv import load_dotenv
+from tools import http_client, rate_limit
+from tools.image_jobs import DONE, FAILED, ImageGenerationQueue
+from tools.image_store import DEFAULT_IMAGE_DIR, ImageStore
 
 load_dotenv()
 
+
+class ImageGenerationError(Exception):
+    """Non-200 answer from the Inference API."""
+
+    def __init__(self, status_code: int, message: str = "", estimated_time: float = None, retry_after: float = None):
+        super().__init__(message or f"Status {status_code}")
+        self.status_code = status_code
+        self.estimated_time = estimated_time  # seconds until the model is loaded, sent with 503s
+        self.retry_after = retry_after
+
+
 class HuggingFaceImageGenerationTool(Tool):
     name = "image_generation"
     description = "Generate images from text descriptions using Stable Diffusion via HuggingFace Inference API"
@@ -13,58 +27,131 @@ class HuggingFaceImageGenerationTool(Tool):
     }
     output_type = "string"
 
-    def __init__(self):
+    def __init__(self, store: ImageStore = None, max_concurrency: int = 2, wait_seconds: float = 90):
         super().__init__()
         self.api_token = os.getenv('HUGGINGFACE_API_TOKEN')
-        self.api_url = "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-xl-base-1.0"
+        self.api_url = os.getenv("HF_IMAGE_API_URL", "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-xl-base-1.0")
         self.headers = {"Authorization": f"Bearer {self.api_token}"}
+        self.store = store or ImageStore.from_env(DEFAULT_IMAGE_DIR)
+        self.queue = ImageGenerationQueue(
+            self,
+            max_concurrency=max_concurrency,
+            retention=float(os.getenv("IMAGE_JOB_RETENTION", 3600)),
+            max_finished=int(os.getenv("IMAGE_JOB_MAX_FINISHED", 200)),
+        )
+        self.wait_seconds = wait_seconds
 
-    def forward(self, prompt: str) -> str:
-        """Generate an image from a text prompt using HuggingFace Inference API"""
-        try:
-            if not self.api_token:
-                return "❌ Image generation unavailable: HuggingFace API token not found"
-            
-            # Clean and enhance the prompt
-            enhanced_prompt = f"{prompt}, high quality, detailed, professional"
-            
-            payload = {
-                "inputs": enhanced_prompt,
-                "parameters": {
-                    "num_inference_steps": 30,
-                    "guidance_scale": 7.5,
-                    "width": 512,
-                    "height": 512
-                }
+    def build_payload(self, prompt: str) -> dict:
+        # Clean and enhance the prompt
+        enhanced_prompt = f"{prompt}, high quality, detailed, professional"
+        return {
+            "inputs": enhanced_prompt,
+            "parameters": {
+                "num_inference_steps": 30,
+                "guidance_scale": 7.5,
+                "width": 512,
+                "height": 512
             }
-            
-            response = requests.post(self.api_url, headers=self.headers, json=payload, timeout=60)
-            
-            if response.status_code == 200:
-                # Save the image temporarily (in a real deployment, you'd want to save to a proper location)
-                image_filename = f"generated_image_{hash(prompt) % 10000}.png"
-                image_path = f"./temp_images/{image_filename}"
-                
-                # Create temp directory if it doesn't exist
-                os.makedirs("./temp_images", exist_ok=True)
-                
-                with open(image_path, "wb") as f:
-                    f.write(response.content)
-                
-                return f"✅ Image generated successfully! Saved as: {image_filename}\n📝 Prompt used: {enhanced_prompt}\n📁 Location: {image_path}"
-            
-            elif response.status_code == 503:
-                return f"⏳ Image generation service is loading. Please try again in a few moments.\n📝 Prompt: {prompt}"
-            
-            else:
-                return f"❌ Image generation failed (Status: {response.status_code})\n📝 Prompt: {prompt}\n💡 Try a different description or wait a moment"
-                
-        except requests.exceptions.Timeout:
-            return f"⏰ Image generation timed out. The service might be busy.\n📝 Prompt: {prompt}\n💡 Try again with a simpler prompt"
-        
-        except Exception as e:
+        }
+
+    def request_image(self, payload: dict) -> bytes:
+        # The queue retries 429/503 itself; the limiter spaces out the calls of every job and session
+        with rate_limit.get_limiter("huggingface").acquire():
+            return self._post(payload)
+
+    def _post(self, payload: dict) -> bytes:
+        response = http_client.post(self.api_url, headers=self.headers, json=payload, timeout=60)
+        if response.status_code != 200:
+            estimated_time = None
+            try:
+                estimated_time = float(response.json().get("estimated_time"))
+            except (ValueError, TypeError, AttributeError):
+                pass
+            retry_after = response.headers.get("Retry-After")
+            raise ImageGenerationError(
+                response.status_code,
+                response.text[:500],
+                estimated_time=estimated_time,
+                retry_after=rate_limit.parse_retry_after(retry_after),
+            )
+        return response.content
+
+    def describe_job(self, job) -> str:
+        """Human readable status of a queued job, in the same format as a direct call."""
+        if job.status == DONE:
+            image_filename = os.path.basename(job.path)
+            enhanced_prompt = self.build_payload(job.prompt)["inputs"]
+            if job.source == "generated":
+                return f"✅ Image generated successfully! Saved as: {image_filename}\n📝 Prompt used: {enhanced_prompt}\n📁 Location: {job.path}"
+            return f"♻️ Reused an identical image generated earlier (no new API call). Saved as: {image_filename}\n📝 Prompt used: {enhanced_prompt}\n📁 Location: {job.path}"
+
+        prompt = job.prompt
+        if job.status == FAILED:
+            e = job.error
+            if isinstance(e, ImageGenerationError) and e.status_code == 503:
+                return f"⏳ Image generation service is still loading after {job.attempts} attempts. Please try again later.\n📝 Prompt: {prompt}"
+            if isinstance(e, ImageGenerationError):
+                return f"❌ Image generation failed (Status: {e.status_code})\n📝 Prompt: {prompt}\n💡 Try a different description or wait a moment"
+            if isinstance(e, requests.exceptions.Timeout):
+                return f"⏰ Image generation timed out. The service might be busy.\n📝 Prompt: {prompt}\n💡 Try again with a simpler prompt"
             return f"❌ Image generation error: {str(e)}\n📝 Prompt: {prompt}\n💡 Please check your HuggingFace API token and try again"
 
+        return (
+            f"⏳ Image job {job.id} is {job.status} (attempt {job.attempts}, {job.to_dict()['elapsed']}s so far).\n"
+            f"📝 Prompt: {prompt}\n💡 Call image_generation_result(job_id=\"{job.id}\") later to collect it."
+        )
+
+    def forward(self, prompt: str) -> str:
+        """Generate an image from a text prompt using HuggingFace Inference API"""
+        if not self.api_token:
+            return "❌ Image generation unavailable: HuggingFace API token not found"
+
+        # The queue retries "model is loading" answers itself, so the agent does not spend a step on it
+        job = self.queue.wait(self.queue.submit(prompt), timeout=self.wait_seconds)
+        return self.describe_job(job)
+
+
+class ImageGenerationSubmitTool(Tool):
+    name = "image_generation_submit"
+    description = (
+        "Queues an image generation (Stable Diffusion) and returns a job id immediately, without waiting for the render. "
+        "Submit several images first, do other work, then collect them with image_generation_result."
+    )
+    inputs = {
+        'prompt': {'type': 'string', 'description': 'Description of the image to generate'}
+    }
+    output_type = "string"
+
+    def __init__(self, generation_tool: HuggingFaceImageGenerationTool):
+        super().__init__()
+        self.generation_tool = generation_tool
+
+    def forward(self, prompt: str) -> str:
+        if not self.generation_tool.api_token:
+            return "❌ Image generation unavailable: HuggingFace API token not found"
+        job_id = self.generation_tool.queue.submit(prompt)
+        return f"🧾 Image job queued: {job_id}\n📝 Prompt: {prompt}"
+
+
+class ImageGenerationResultTool(Tool):
+    name = "image_generation_result"
+    description = "Returns the result of an image job created by image_generation_submit, waiting up to wait_seconds for it to finish."
+    inputs = {
+        'job_id': {'type': 'string', 'description': 'The job id returned by image_generation_submit'},
+        'wait_seconds': {'type': 'number', 'description': 'How long to wait for the job to finish (default 60)', 'nullable': True}
+    }
+    output_type = "string"
+
+    def __init__(self, generation_tool: HuggingFaceImageGenerationTool):
+        super().__init__()
+        self.generation_tool = generation_tool
+
+    def forward(self, job_id: str, wait_seconds: float = 60) -> str:
+        job = self.generation_tool.queue.wait(job_id, timeout=wait_seconds if wait_seconds is not None else 60)
+        if job is None:
+            return f"❌ Unknown image job id: {job_id}"
+        return self.generation_tool.describe_job(job)
+
 # Alternative simple tool for web search of images
 class ImageSearchTool(Tool):
     name = "image_search"
@@ -93,5 +180,5 @@ class ImageSearchTool(Tool):
             f"💡 **Alternative Approach:**",
             f"If image generation fails, you can describe the image in detail instead!"
         ]
-        
+
         return "\n".join(search_suggestions)
\ No newline at end of file
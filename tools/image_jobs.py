@@ -0,0 +1,147 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import requests
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+WAITING = "waiting for model"
+DONE = "done"
+FAILED = "failed"
+
+
+class ImageJob:
+    def __init__(self, job_id: str, prompt: str):
+        self.id = job_id
+        self.prompt = prompt
+        self.status = QUEUED
+        self.attempts = 0
+        self.path = None
+        self.source = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "prompt": self.prompt,
+            "status": self.status,
+            "attempts": self.attempts,
+            "path": self.path,
+            "source": self.source,
+            "error": str(self.error) if self.error else None,
+            "elapsed": round((self.finished_at or time.time()) - self.created_at, 2),
+        }
+
+
+class ImageGenerationQueue:
+    """Background queue for image generation requests.
+
+    `submit` returns a job id immediately; up to `max_concurrency` jobs render at once.
+    A 503 "model is loading" answer is retried after the API's `estimated_time` (or an
+    exponential backoff when it gives none) until `max_wait` seconds have passed.
+
+    Finished jobs are forgotten `retention` seconds after they finish, and the oldest ones
+    once more than `max_finished` are kept; their ids are then unknown to `get` and `wait`.
+    """
+
+    def __init__(self, tool, max_concurrency: int = 2, max_attempts: int = 8, max_wait: float = 300, base_delay: float = 2.0,
+                 retention: float = 3600, max_finished: int = 200):
+        self.tool = tool
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.max_wait = max_wait
+        self.base_delay = base_delay
+        self.retention = retention
+        self.max_finished = max_finished
+        self.pruned = 0
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="image_job")
+            return self._executor
+
+    def submit(self, prompt: str) -> str:
+        with self._lock:
+            self._prune()
+            job = ImageJob(f"img-{next(self._ids)}", prompt)
+            self.jobs[job.id] = job
+        self._pool().submit(self._run, job)
+        return job.id
+
+    def get(self, job_id: str) -> Optional[ImageJob]:
+        return self.jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[ImageJob]:
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+    def pending(self) -> list:
+        return [job for job in list(self.jobs.values()) if not job.finished]
+
+    def _prune(self):
+        """Drop finished jobs past `retention`, then the oldest beyond `max_finished`. Called with the lock held."""
+        cutoff = time.time() - self.retention
+        finished = sorted((job for job in self.jobs.values() if job.finished), key=lambda job: job.finished_at or 0)
+        expired = [job for job in finished if (job.finished_at or 0) < cutoff]
+        kept = finished[len(expired):]
+        expired += kept[:max(len(kept) - self.max_finished, 0)]
+        for job in expired:
+            del self.jobs[job.id]
+        self.pruned += len(expired)
+
+    def _retry_delay(self, error, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying, or None when the error is not retryable."""
+        from tools.image_generation import ImageGenerationError
+
+        backoff = min(self.base_delay * 2 ** (attempt - 1), 60)
+        if isinstance(error, ImageGenerationError) and error.status_code in (429, 503):
+            hinted = error.retry_after or error.estimated_time
+            return min(max(hinted, self.base_delay), 60) if hinted else backoff
+        if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+            return backoff
+        return None
+
+    def _run(self, job: ImageJob):
+        payload = self.tool.build_payload(job.prompt)
+        key = self.tool.store.key_for(self.tool.api_url, payload)
+        deadline = job.created_at + self.max_wait
+        try:
+            while True:
+                job.attempts += 1
+                job.status = RUNNING
+                try:
+                    job.path, job.source = self.tool.store.get_or_create(key, lambda: self.tool.request_image(payload))
+                    job.error = None
+                    job.status = DONE
+                    return
+                except Exception as e:
+                    delay = self._retry_delay(e, job.attempts)
+                    if delay is None or job.attempts >= self.max_attempts or time.time() + delay > deadline:
+                        raise
+                    job.error = e
+                    job.status = WAITING
+                    time.sleep(delay)
+        except Exception as e:
+            job.error = e
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            job.done.set()
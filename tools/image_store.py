@@ -0,0 +1,264 @@
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from tools import tracing
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+DEFAULT_IMAGE_DIR = os.getenv("IMAGE_OUTPUT_DIR", "./temp_images")
+THUMBNAIL_DIR = "thumbs"
+
+# IMAGE_STORE_FORMAT -> (Pillow format, file extension, save options); "png" keeps the API's bytes as they are
+FORMATS = {
+    "png": (None, "png", {}),
+    "webp-lossless": ("WEBP", "webp", {"lossless": True, "method": 4}),
+    "webp": ("WEBP", "webp", {"method": 4}),
+    "jpeg": ("JPEG", "jpg", {"optimize": True, "progressive": True}),
+}
+EXTENSIONS = ("png", "webp", "jpg")
+IMAGE_NAME = re.compile(r"generated_image_[0-9a-f]{16}\.(?:png|webp|jpg)")
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.path = None
+        self.error = None
+
+
+class ImageStore:
+    """Stores generated images under a key derived from the model and every generation parameter.
+
+    The same prompt + parameters always map to the same file, so a repeat request is served
+    from disk. Concurrent requests for a key that is still being generated wait for the first
+    one instead of calling the API again.
+
+    Disk use is bounded: after each new image, files older than `max_age` seconds and then the
+    least recently used ones (a file's mtime is refreshed when it is served again) are deleted
+    until the directory, thumbnails included, is under `max_bytes`. With Pillow installed,
+    images can be re-encoded to WebP or JPEG (`image_format`) and a small WebP thumbnail of
+    each is written to `thumbs/` for the chat view.
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_IMAGE_DIR,
+        max_bytes: int = 500 * 1024 * 1024,
+        max_age: Optional[float] = 30 * 24 * 3600,
+        image_format: str = "png",
+        quality: int = 85,
+        thumbnail_size: int = 256,
+    ):
+        if image_format not in FORMATS:
+            raise ValueError(f"Unknown image format {image_format!r}; use one of {', '.join(FORMATS)}")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.image_format = image_format if Image is not None else "png"
+        self.quality = quality
+        self.thumbnail_size = thumbnail_size if Image is not None else 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._in_flight = {}
+        if os.path.isdir(directory):
+            self.enforce_quota()
+
+    @classmethod
+    def from_env(cls, directory: str = DEFAULT_IMAGE_DIR) -> "ImageStore":
+        max_age_days = float(os.getenv("IMAGE_STORE_MAX_AGE_DAYS", 30))
+        return cls(
+            directory=directory,
+            max_bytes=int(float(os.getenv("IMAGE_STORE_MAX_MB", 500)) * 1024 * 1024),
+            max_age=max_age_days * 24 * 3600 if max_age_days > 0 else None,
+            image_format=os.getenv("IMAGE_STORE_FORMAT", "png"),
+            quality=int(os.getenv("IMAGE_STORE_QUALITY", 85)),
+            thumbnail_size=int(os.getenv("IMAGE_THUMBNAIL_SIZE", 256)),
+        )
+
+    @staticmethod
+    def key_for(model: str, payload: dict) -> str:
+        canonical = json.dumps({"model": model, "payload": payload}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str, extension: str = None) -> str:
+        extension = extension or FORMATS[self.image_format][1]
+        return os.path.join(self.directory, f"generated_image_{key[:16]}.{extension}")
+
+    def get(self, key: str):
+        # An image stored before IMAGE_STORE_FORMAT changed is still served
+        for extension in dict.fromkeys((FORMATS[self.image_format][1], *EXTENSIONS)):
+            path = self.path_for(key, extension)
+            try:
+                modified = os.path.getmtime(path)
+            except OSError:
+                continue
+            if time.time() - modified > 60:
+                try:
+                    os.utime(path)  # recently used: evicted last
+                except OSError:
+                    pass
+            return path
+        return None
+
+    def encode(self, data: bytes) -> bytes:
+        pillow_format, _, options = FORMATS[self.image_format]
+        if pillow_format is None:
+            return data
+        with Image.open(io.BytesIO(data)) as image:
+            if pillow_format == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            output = io.BytesIO()
+            if not options.get("lossless"):
+                options = {**options, "quality": self.quality}
+            image.save(output, format=pillow_format, **options)
+        return output.getvalue()
+
+    def write_thumbnail(self, path: str, data: bytes):
+        if not self.thumbnail_size or not features.check("webp"):
+            return
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail((self.thumbnail_size, self.thumbnail_size))
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+            output = io.BytesIO()
+            image.save(output, format="WEBP", quality=80, method=4)
+        self._write(thumbnail_path(path), output.getvalue())
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put(self, key: str, data: bytes) -> str:
+        path = self.path_for(key)
+        try:
+            encoded = self.encode(data)
+        except Exception:
+            # Not an image Pillow can read: keep the bytes as they came
+            encoded, path = data, self.path_for(key, "png")
+        self._write(path, encoded)
+        try:
+            self.write_thumbnail(path, data)
+        except Exception:
+            pass  # the chat falls back to the full image
+        self.enforce_quota(keep=path)
+        return path
+
+    def _entries(self) -> list:
+        """(mtime, size including thumbnail, path) of every stored image."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.startswith("generated_image_") or name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            size = stat.st_size
+            try:
+                size += os.path.getsize(thumbnail_path(path))
+            except OSError:
+                pass
+            entries.append((stat.st_mtime, size, path))
+        return entries
+
+    def enforce_quota(self, keep: str = None) -> int:
+        """Delete expired, then least recently used images until under `max_bytes`; returns how many."""
+        with self._evict_lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            now = time.time()
+            removed = 0
+            for modified, size, path in entries:
+                expired = self.max_age is not None and now - modified > self.max_age
+                if not expired and total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                for victim in (path, thumbnail_path(path)):
+                    try:
+                        os.remove(victim)
+                    except OSError:
+                        pass
+                total -= size
+                removed += 1
+            self.evicted += removed
+        if removed:
+            tracing.get_tracer().metrics.inc("image_store_evictions_total", removed, help="Images deleted by the image store quota")
+        return removed
+
+    def stats(self) -> dict:
+        entries = self._entries() if os.path.isdir(self.directory) else []
+        return {
+            "images": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "evicted": self.evicted,
+            "format": self.image_format,
+        }
+
+    def get_or_create(self, key: str, produce: Callable[[], bytes]) -> Tuple[str, str]:
+        """Return (path, source), where source is "cached", "joined" or "generated"."""
+        path = self.get(key)
+        if path is not None:
+            tracing.record_cache("image", "hit")
+            return path, "cached"
+
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                # A leader may have finished between the check above and taking the lock
+                path = self.get(key)
+                if path is not None:
+                    tracing.record_cache("image", "hit")
+                    return path, "cached"
+                flight = self._in_flight[key] = _InFlight()
+
+        tracing.record_cache("image", "miss" if leader else "joined")
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.path, "joined"
+
+        try:
+            flight.path = self.put(key, produce())
+            return flight.path, "generated"
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.done.set()
+
+
+def thumbnail_path(path: str) -> str:
+    directory, name = os.path.split(path)
+    return os.path.join(directory, THUMBNAIL_DIR, os.path.splitext(name)[0] + ".webp")
+
+
+def images_in(text: str, directory: str = DEFAULT_IMAGE_DIR) -> list:
+    """Stored images named in a tool output, as (image, thumbnail or None) pairs that still exist."""
+    found = []
+    for name in dict.fromkeys(IMAGE_NAME.findall(text or "")):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            thumbnail = thumbnail_path(path)
+            found.append((path, thumbnail if os.path.exists(thumbnail) else None))
+    return found
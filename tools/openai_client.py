@@ -0,0 +1,236 @@
+"""Process-wide OpenAI client and chat-completion response cache for the OpenAI tools.
+
+All OpenAI tools share one `OpenAI` client, and so one httpx connection pool, instead of
+building a client per tool. Deterministic-enough calls (temperature at or below
+OPENAI_CACHE_MAX_TEMPERATURE) are cached on (model, messages, temperature, max_tokens)
+in an in-memory LRU, optionally backed by a SQLite file (OPENAI_CACHE_DISK_PATH).
+
+Calls wait for the "openai" rate limiter (see `tools.rate_limit`), which is charged with the
+estimated tokens of each call and adapts to every 429/503 the client sees, retries included.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from tools import rate_limit, streaming, tracing
+
+_client = None
+_cache = None
+_lock = threading.Lock()
+
+
+def _observe_response(response):
+    rate_limit.get_limiter("openai").record_response(response.status_code, response.headers)
+
+
+def estimate_tokens(messages: list, max_tokens: int) -> int:
+    """Rough upper bound of a call's tokens (about 4 characters per token) for the token bucket."""
+    return sum(tracing.payload_chars(m.get("content")) for m in messages) // 4 + max_tokens
+
+
+def get_client():
+    """Return the shared OpenAI client, creating it (and its connection pool) on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import httpx
+                from openai import OpenAI
+
+                limits = httpx.Limits(
+                    max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", 20)),
+                    max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", 10)),
+                    keepalive_expiry=60,
+                )
+                _client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    http_client=httpx.Client(
+                        limits=limits,
+                        timeout=httpx.Timeout(60.0, connect=10.0),
+                        event_hooks={"response": [_observe_response]},
+                    ),
+                    max_retries=2,
+                )
+    return _client
+
+
+class ResponseCache:
+    """LRU cache of chat completion texts with an optional on-disk tier."""
+
+    def __init__(self, max_entries: int = 512, disk_path: Optional[str] = None, disk_max_entries: int = 5000, max_temperature: float = 0.5):
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self.max_temperature = max_temperature
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if disk_path:
+            directory = os.path.dirname(disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT NOT NULL, last_access REAL NOT NULL)"
+            )
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(
+            max_entries=int(os.getenv("OPENAI_CACHE_MAX_ENTRIES", 512)),
+            disk_path=os.getenv("OPENAI_CACHE_DISK_PATH") or None,
+            max_temperature=float(os.getenv("OPENAI_CACHE_MAX_TEMPERATURE", 0.5)),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key_for(model: str, messages: list, temperature: float, max_tokens: int) -> str:
+        canonical = json.dumps([model, messages, temperature, max_tokens], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def should_cache(self, temperature: float) -> bool:
+        # High-temperature styles (creative writing) are expected to vary between calls
+        return self.max_entries > 0 and temperature <= self.max_temperature
+
+    def record_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                tracing.record_cache("openai", "hit")
+                return self._memory[key]
+        if self.disk_path:
+            conn = self._connect()
+            row = conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._remember(key, row[0])
+                with self._lock:
+                    self.disk_hits += 1
+                tracing.record_cache("openai", "disk_hit")
+                return row[0]
+        with self._lock:
+            self.misses += 1
+        tracing.record_cache("openai", "miss")
+        return None
+
+    def _remember(self, key: str, content: str):
+        with self._lock:
+            self._memory[key] = content
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def set(self, key: str, content: str):
+        self._remember(key, content)
+        if self.disk_path:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, last_access) VALUES (?, ?, ?)",
+                (key, content, time.time()),
+            )
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,),
+            )
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "entries": len(self._memory),
+        }
+
+
+def get_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = ResponseCache.from_env()
+    return _cache
+
+
+def chat_completion(messages: list, model: str, temperature: float, max_tokens: int, use_cache: bool = True, label: str = None) -> str:
+    """Run a chat completion on the shared client and return the text of the first choice.
+
+    When a UI is capturing tool streams (see `tools.streaming`), the completion is requested
+    with `stream=True` and every delta is forwarded to a stream named `label` as it arrives.
+    Each call is traced as an "llm" span (see `tools.tracing`) with its token usage.
+    """
+    tracer = tracing.get_tracer()
+    with tracer.span(model, "llm", label=label, input_chars=sum(tracing.payload_chars(m.get("content")) for m in messages)) as span:
+        cache = get_cache() if use_cache else None
+        key = None
+        if cache is not None:
+            if cache.should_cache(temperature):
+                key = cache.key_for(model, messages, temperature, max_tokens)
+                cached = cache.get(key)
+                if cached is not None:
+                    span.set(output_chars=len(cached))
+                    return cached
+            else:
+                cache.record_skip()
+
+        usage = None
+        limiter = rate_limit.get_limiter("openai")
+        estimate = estimate_tokens(messages, max_tokens)
+        # The client's response hook reports every answer to the limiter, so no feedback from here
+        with limiter.acquire(tokens=estimate, feedback=False):
+            stream = streaming.open_stream(label or model)
+            if stream is None:
+                response = get_client().chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                )
+                content = response.choices[0].message.content
+                usage = response.usage
+            else:
+                try:
+                    for chunk in get_client().chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                    ):
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            stream.write(chunk.choices[0].delta.content)
+                        if getattr(chunk, "usage", None) is not None:
+                            usage = chunk.usage
+                finally:
+                    stream.close()
+                content = stream.text
+        span.set(output_chars=len(content or ""))
+        if usage is not None:
+            limiter.charge(usage.prompt_tokens + usage.completion_tokens - estimate)
+            span.set(input_tokens=usage.prompt_tokens, output_tokens=usage.completion_tokens)
+            tracer.record_tokens(usage.prompt_tokens, usage.completion_tokens, source="tools")
+        if key is not None and content:
+            cache.set(key, content)
+        return content
@@ -1,63 +1,249 @@
-import os
+import contextvars
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from smolagents.tools import Tool
-from openai import OpenAI
 from dotenv import load_dotenv
+from tools.chunking import count_tokens, format_stats, map_reduce, split_code, split_text
+from tools.openai_client import chat_completion, get_client
 
 load_dotenv()
 
+TEXT_ANALYSIS_MODEL = "gpt-3.5-turbo"
+CODE_REVIEW_MODEL = "gpt-4o-mini"
+TASK_INSTRUCTIONS = {
+    "sentiment": "Analyze the sentiment of this text and provide a detailed explanation",
+    "summary": "Provide a concise summary of this text",
+    "translate": "Translate this text to English",
+    "grammar_check": "Check and correct grammar in this text",
+}
+
+
+def task_instruction(task: str) -> str:
+    return TASK_INSTRUCTIONS.get(task, f"Analyze this text for {task}")
+
+
+# Results of these tasks are simply concatenated in chunked mode instead of merged by the model
+CONCATENATED_TASKS = ("translate", "grammar_check")
+# Inputs above this many tokens are processed in chunked (map-reduce) mode unless told otherwise
+CHUNK_THRESHOLD_TOKENS = 6000
+CHUNK_TOKENS = 2500
+
+
+def build_analysis_prompt(text: str, task: str) -> str:
+    return f"{task_instruction(task)}:\n\n{text}"
+
+
+def use_chunked_mode(text: str, chunked, model: str) -> bool:
+    if chunked is not None:
+        return bool(chunked)
+    return count_tokens(text, model) > CHUNK_THRESHOLD_TOKENS
+
+
 class OpenAITextAnalysisTool(Tool):
     name = "text_analysis"
     description = "Analyze text for sentiment, summarization, translation, or other advanced text processing using OpenAI"
     inputs = {
         'text': {'type': 'string', 'description': 'The text to analyze'},
-        'task': {'type': 'string', 'description': 'Type of analysis: sentiment, summary, translate, grammar_check, etc.', 'nullable': True}
+        'task': {'type': 'string', 'description': 'Type of analysis: sentiment, summary, translate, grammar_check, etc.', 'nullable': True},
+        'chunked': {'type': 'boolean', 'description': 'Split long text into chunks processed in parallel and merged (default: automatic for very long text)', 'nullable': True}
     }
     output_type = "string"
 
     def __init__(self):
         super().__init__()
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.client = get_client()
+
+    def analyze_chunked(self, text: str, task: str) -> tuple:
+        """(result, `map_reduce` stats) of a chunked run; the stats are None when the text is empty."""
+        chunks = split_text(text, CHUNK_TOKENS, TEXT_ANALYSIS_MODEL)
+        if not chunks:
+            return "Error in text analysis: the text is empty", None
+
+        def analyze_part(index, chunk):
+            prompt = f"(This is part {index + 1} of {len(chunks)} of a longer document.)\n" + build_analysis_prompt(chunk, task)
+            return chat_completion(model=TEXT_ANALYSIS_MODEL, messages=[{"role": "user", "content": prompt}], max_tokens=1000, temperature=0.3)
 
-    def forward(self, text: str, task: str = "summary") -> str:
+        def merge(partials):
+            if task in CONCATENATED_TASKS:
+                return "\n\n".join(partials)
+            parts = "\n\n".join(f"### Part {i}\n{p}" for i, p in enumerate(partials, start=1))
+            prompt = (
+                f"The following are results of the task '{task_instruction(task)}' run separately on {len(partials)} "
+                f"consecutive parts of one document. Merge them into a single, coherent result for the whole document, "
+                f"without mentioning the parts:\n\n{parts}"
+            )
+            return chat_completion(model=TEXT_ANALYSIS_MODEL, messages=[{"role": "user", "content": prompt}], max_tokens=1000, temperature=0.3, label=self.name)
+
+        # Returned rather than kept on the tool, which every session and parallel_map worker shares
+        return map_reduce(chunks, analyze_part, merge)
+
+    def forward(self, text: str, task: str = "summary", chunked: bool = None) -> str:
         try:
-            if task == "sentiment":
-                prompt = f"Analyze the sentiment of this text and provide a detailed explanation:\n\n{text}"
-            elif task == "summary":
-                prompt = f"Provide a concise summary of this text:\n\n{text}"
-            elif task == "translate":
-                prompt = f"Translate this text to English:\n\n{text}"
-            elif task == "grammar_check":
-                prompt = f"Check and correct grammar in this text:\n\n{text}"
-            else:
-                prompt = f"Analyze this text for {task}:\n\n{text}"
+            task = task or "summary"
+            if use_chunked_mode(text, chunked, TEXT_ANALYSIS_MODEL):
+                result, stats = self.analyze_chunked(text, task)
+                return f"{result}\n\n{format_stats(stats)}" if stats is not None else result
+            prompt = build_analysis_prompt(text, task)
 
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            return chat_completion(
+                model=TEXT_ANALYSIS_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=1000,
-                temperature=0.3
+                temperature=0.3,
+                label=self.name
             )
             
-            return response.choices[0].message.content
-            
         except Exception as e:
             return f"Error in text analysis: {str(e)}"
 
+class OpenAIBatchTextAnalysisTool(Tool):
+    name = "batch_text_analysis"
+    description = (
+        "Runs the same text_analysis task (sentiment, summary, translate, grammar_check, etc.) over a list of texts "
+        "in one call, concurrently, and returns one numbered result per text. Use it instead of looping over text_analysis."
+    )
+    inputs = {
+        'texts': {'type': 'array', 'description': 'The list of texts to analyze'},
+        'task': {'type': 'string', 'description': 'Type of analysis: sentiment, summary, translate, grammar_check, etc.', 'nullable': True},
+        'pack_short_texts': {'type': 'boolean', 'description': 'Group short texts into shared prompts to send fewer requests (default true)', 'nullable': True}
+    }
+    output_type = "string"
+
+    def __init__(self, max_concurrency: int = 8, pack_threshold: int = 400, pack_size: int = 10, pack_max_chars: int = 4000):
+        super().__init__()
+        self.client = get_client()
+        self.max_concurrency = max_concurrency
+        # Shared by every batch running on this tool, so parallel sessions stay under the same bound
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.pack_threshold = pack_threshold
+        self.pack_size = pack_size
+        self.pack_max_chars = pack_max_chars
+
+    def _complete(self, prompt: str, max_tokens: int) -> str:
+        with self.semaphore:
+            return chat_completion(
+                model=TEXT_ANALYSIS_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=0.3
+            )
+
+    def _make_packs(self, texts: list) -> list:
+        """Split item indices into packs of short texts and single long texts."""
+        packs, current, current_chars = [], [], 0
+        for index, text in enumerate(texts):
+            if len(text) > self.pack_threshold:
+                packs.append([index])
+                continue
+            if current and (len(current) >= self.pack_size or current_chars + len(text) > self.pack_max_chars):
+                packs.append(current)
+                current, current_chars = [], 0
+            current.append(index)
+            current_chars += len(text)
+        if current:
+            packs.append(current)
+        return packs
+
+    def _run_single(self, texts: list, index: int, task: str) -> dict:
+        try:
+            return {"index": index, "result": self._complete(build_analysis_prompt(texts[index], task), 1000), "error": None}
+        except Exception as e:
+            return {"index": index, "result": None, "error": str(e)}
+
+    def _run_pack(self, texts: list, indices: list, task: str) -> list:
+        if len(indices) == 1:
+            return [self._run_single(texts, indices[0], task)]
+        numbered = "\n\n".join(f"[{n}] {texts[i]}" for n, i in enumerate(indices, start=1))
+        prompt = (
+            f"{task_instruction(task)}. Do this separately for each of the {len(indices)} numbered texts below.\n"
+            f"Answer with only a JSON array of {len(indices)} strings, one answer per text, in the same order.\n\n"
+            f"{numbered}"
+        )
+        try:
+            reply = self._complete(prompt, min(300 * len(indices), 3000))
+            match = re.search(r"\[.*\]", reply or "", re.DOTALL)
+            answers = json.loads(match.group(0)) if match else None
+            if isinstance(answers, list) and len(answers) == len(indices):
+                return [{"index": i, "result": str(a), "error": None} for i, a in zip(indices, answers)]
+        except Exception:
+            pass
+        # The packed answer could not be split reliably: fall back to one request per text
+        with ThreadPoolExecutor(max_workers=len(indices)) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, self._run_single, texts, i, task) for i in indices]
+            return [future.result() for future in futures]
+
+    def analyze_many(self, texts: list, task: str = "summary", pack_short_texts: bool = True) -> list:
+        """Return [{"index", "result", "error"}] in input order."""
+        texts = [str(t) for t in texts]
+        packs = self._make_packs(texts) if pack_short_texts else [[i] for i in range(len(texts))]
+        results = [None] * len(texts)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrency, len(packs)))) as pool:
+            # Copies of the caller's context: the requests' llm spans and tokens belong to the caller's run
+            futures = [pool.submit(contextvars.copy_context().run, self._run_pack, texts, pack, task) for pack in packs]
+            for future in futures:
+                for item in future.result():
+                    results[item["index"]] = item
+        return results
+
+    def forward(self, texts: list, task: str = "summary", pack_short_texts: bool = True) -> str:
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return "Error in batch text analysis: no texts given"
+        results = self.analyze_many(texts, task or "summary", True if pack_short_texts is None else pack_short_texts)
+        sections = []
+        for item in results:
+            body = item["result"] if item["error"] is None else f"❌ Error: {item['error']}"
+            sections.append(f"### [{item['index'] + 1}]\n{body}")
+        return "\n\n".join(sections)
+
 class OpenAICodeReviewTool(Tool):
     name = "code_review"
     description = "Review and improve code quality, suggest optimizations, and find bugs using OpenAI"
     inputs = {
         'code': {'type': 'string', 'description': 'The code to review'},
-        'language': {'type': 'string', 'description': 'Programming language (python, javascript, etc.)', 'nullable': True}
+        'language': {'type': 'string', 'description': 'Programming language (python, javascript, etc.)', 'nullable': True},
+        'chunked': {'type': 'boolean', 'description': 'Review long files function by function in parallel and merge the reviews (default: automatic for very long code)', 'nullable': True}
     }
     output_type = "string"
 
     def __init__(self):
         super().__init__()
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.client = get_client()
+
+    def review_chunked(self, code: str, language: str) -> tuple:
+        """(review, `map_reduce` stats) of a chunked run; the stats are None when the code is empty."""
+        chunks = split_code(code, language, CHUNK_TOKENS, CODE_REVIEW_MODEL)
+        if not chunks:
+            return "Error in code review: the code is empty", None
 
-    def forward(self, code: str, language: str = "python") -> str:
+        def review_part(index, chunk):
+            prompt = (
+                f"Review section {index + 1} of {len(chunks)} of a longer {language} file. List code quality problems, "
+                f"potential bugs, performance optimizations and best practice issues, quoting the relevant lines. "
+                f"Do not rewrite the whole section.\n\n```{language}\n{chunk}\n```"
+            )
+            return chat_completion(model=CODE_REVIEW_MODEL, messages=[{"role": "user", "content": prompt}], max_tokens=1000, temperature=0.2)
+
+        def merge(partials):
+            parts = "\n\n".join(f"### Section {i}\n{p}" for i, p in enumerate(partials, start=1))
+            prompt = (
+                f"Below are reviews of {len(partials)} consecutive sections of one {language} file. Merge them into one review "
+                f"with these headings: 1. Code quality assessment 2. Potential bugs or issues 3. Performance optimizations "
+                f"4. Best practice suggestions 5. Improved version (only the most important snippets). Remove duplicates.\n\n{parts}"
+            )
+            return chat_completion(model=CODE_REVIEW_MODEL, messages=[{"role": "user", "content": prompt}], max_tokens=1500, temperature=0.2, label=self.name)
+
+        return map_reduce(chunks, review_part, merge)
+
+    def forward(self, code: str, language: str = "python", chunked: bool = None) -> str:
         try:
+            language = language or "python"
+            if use_chunked_mode(code, chunked, CODE_REVIEW_MODEL):
+                result, stats = self.review_chunked(code, language)
+                return f"{result}\n\n{format_stats(stats)}" if stats is not None else result
             prompt = f"""
             Please review this {language} code and provide:
             1. Code quality assessment
@@ -72,15 +258,14 @@ class OpenAICodeReviewTool(Tool):
             ```
             """
 
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
+            return chat_completion(
+                model=CODE_REVIEW_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=1500,
-                temperature=0.2
+                temperature=0.2,
+                label=self.name
             )
             
-            return response.choices[0].message.content
-            
         except Exception as e:
             return f"Error in code review: {str(e)}"
 
@@ -95,7 +280,7 @@ class OpenAICreativeWritingTool(Tool):
 
     def __init__(self):
         super().__init__()
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.client = get_client()
 
     def forward(self, prompt: str, style: str = "story") -> str:
         try:
@@ -110,17 +295,17 @@ class OpenAICreativeWritingTool(Tool):
             else:
                 system_prompt = f"You are a {style} writer. Create high-quality content in the {style} style."
 
-            response = self.client.chat.completions.create(
+            # temperature 0.7 is above the cache policy threshold, so stories are never replayed
+            return chat_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": prompt}
                 ],
                 max_tokens=1500,
-                temperature=0.7
+                temperature=0.7,
+                label=self.name
             )
             
-            return response.choices[0].message.content
-            
         except Exception as e:
             return f"Error in creative writing: {str(e)}"
\ No newline at end of file
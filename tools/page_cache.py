@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Optional
+
+DEFAULT_PAGE_CACHE_DIR = os.path.join(".cache", "pages")
+
+
+class PageCache:
+    """On-disk cache of fetched pages plus their ETag / Last-Modified validators.
+
+    Each URL is stored as one JSON file named after the SHA-256 of the URL. Writes go
+    through a unique temporary file and `os.replace`, so concurrent workers (and threads)
+    never read a half-written entry; a write that fails is skipped, the page is simply not
+    cached. The oldest entries are dropped once `max_entries` is exceeded.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_PAGE_CACHE_DIR, max_entries: int = 500):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.revalidated = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url: str) -> Optional[dict]:
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("url") == url else None
+
+    def put(self, url: str, entry: dict) -> bool:
+        entry = {**entry, "url": url, "stored_at": time.time()}
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(url))
+        except (OSError, TypeError, ValueError):
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            return False
+        self._evict()
+        return True
+
+    def touch(self, url: str):
+        try:
+            os.utime(self._path(url))
+        except OSError:
+            pass
+
+    def _evict(self):
+        try:
+            entries = [e for e in os.scandir(self.cache_dir) if e.name.endswith(".json")]
+        except OSError:
+            return
+        if len(entries) <= self.max_entries:
+            return
+
+        def modified(entry) -> float:
+            try:
+                return entry.stat().st_mtime
+            except OSError:
+                return 0.0  # removed by another worker meanwhile
+
+        entries.sort(key=modified)
+        for entry in entries[: len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        return {"revalidated": self.revalidated, "misses": self.misses}
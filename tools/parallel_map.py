@@ -0,0 +1,71 @@
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from smolagents.tools import Tool
+
+# Tools that must not be fanned out: the answer ends the run, and nesting would multiply the pool
+EXCLUDED_TOOLS = ("final_answer", "parallel_map")
+
+
+class ParallelMapTool(Tool):
+    name = "parallel_map"
+    description = (
+        "Calls one tool several times concurrently and returns the list of results in the same order as `calls`. "
+        "Use it instead of a for loop whenever the calls do not depend on each other, e.g. "
+        "parallel_map(tool_name=\"visit_webpage\", calls=[{\"url\": u} for u in urls]): five pages then take as long "
+        "as the slowest one. A call that fails does not stop the others: its result is a string starting with 'Error'."
+    )
+    inputs = {
+        'tool_name': {'type': 'string', 'description': 'The name of the tool to call, e.g. "visit_webpage".'},
+        'calls': {
+            'type': 'array',
+            'description': 'One dict of keyword arguments per call. For a tool with a single input, plain values are accepted too.',
+        },
+        'max_workers': {'type': 'integer', 'description': 'How many calls run at the same time (default 8).', 'nullable': True},
+    }
+    output_type = "array"
+
+    def __init__(self, tools: list = None, max_workers: int = None, max_calls: int = None, **kwargs):
+        super().__init__()
+        self.tools = tools if tools is not None else []
+        self.max_workers = max_workers or int(os.getenv("PARALLEL_MAP_WORKERS", 8))
+        self.max_calls = max_calls or int(os.getenv("PARALLEL_MAP_MAX_CALLS", 32))
+
+    def _resolve(self, tool_name: str) -> Tool:
+        available = {tool.name: tool for tool in self.tools if tool.name not in EXCLUDED_TOOLS}
+        if tool_name not in available:
+            raise Exception(f"Unknown tool '{tool_name}' for parallel_map. Available: {', '.join(sorted(available))}")
+        return available[tool_name]
+
+    @staticmethod
+    def _arguments(tool: Tool, call) -> dict:
+        if isinstance(call, dict):
+            return call
+        if len(tool.inputs) == 1:
+            return {next(iter(tool.inputs)): call}
+        raise TypeError(f"expected a dict of arguments for {', '.join(tool.inputs)}, got {call!r}")
+
+    def _call(self, tool: Tool, call):
+        try:
+            return tool(**self._arguments(tool, call))
+        except Exception as e:
+            return f"Error: {tool.name} failed for {call!r}: {type(e).__name__}: {e}"
+
+    def forward(self, tool_name: str, calls: list, max_workers: Optional[int] = None) -> list:
+        tool = self._resolve(tool_name)
+        if isinstance(calls, (str, dict)):
+            calls = [calls]
+        calls = list(calls)
+        if len(calls) > self.max_calls:
+            raise Exception(f"parallel_map takes at most {self.max_calls} calls at once, got {len(calls)}: split the list.")
+        if not calls:
+            return []
+
+        workers = max(1, min(max_workers or self.max_workers, self.max_workers, len(calls)))
+        # Each call runs in a copy of this context, so its trace span, tool output streaming and the
+        # session's research index and documents are the same as for a direct call
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parallel_map") as pool:
+            futures = [pool.submit(contextvars.copy_context().run, self._call, tool, call) for call in calls]
+            return [future.result() for future in futures]
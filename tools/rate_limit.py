@@ -0,0 +1,306 @@
+"""Process-wide rate limits per upstream provider, shared by every tool and session.
+
+Each provider (DuckDuckGo, the JSON search endpoint, the HF Inference API, OpenAI) has one
+`ProviderLimiter`. A call waits in `acquire()` until
+
+- the provider is not blocked by an earlier `Retry-After` (or, without one, a backoff),
+- fewer than `limit` calls to it are in flight,
+- its request bucket (`rpm` per minute, bursts of `burst`) has a request left, and
+- for OpenAI, its token bucket (`tpm` per minute) covers the call's estimated tokens.
+
+The concurrency `limit` adapts AIMD-style: it is halved when the provider answers 429 or 503
+(once per wave of calls sent under the same limit), and grows by one for every `limit`
+successful calls, up to `max_concurrency`.
+
+The time spent waiting is observed in the `rate_limit_wait_seconds` histogram and on the
+current trace span, so a slow tool call can be told apart from a throttled one. Limits come
+from RATE_LIMITS, e.g. "openai:rpm=500,tpm=200000;duckduckgo:rpm=20,concurrency=2"; a rate
+of 0 turns that bucket off.
+"""
+import email.utils
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from tools import tracing
+
+THROTTLE_STATUSES = (429, 503)
+
+DEFAULT_LIMITS = {
+    "duckduckgo": {"rpm": 30, "burst": 3, "concurrency": 4},
+    "search_endpoint": {"rpm": 0, "burst": 10, "concurrency": 16},
+    "huggingface": {"rpm": 60, "burst": 2, "concurrency": 2},
+    "openai": {"rpm": 500, "burst": 10, "tpm": 200000, "concurrency": 8},
+}
+
+
+class RateLimitTimeout(Exception):
+    """A call waited longer than `max_wait` seconds for its turn."""
+
+
+def parse_limits(text: str) -> dict:
+    """Parse "openai:rpm=500,tpm=200000;duckduckgo:rpm=20" into {provider: {setting: value}}."""
+    limits = {}
+    for item in (text or "").split(";"):
+        if ":" not in item:
+            continue
+        provider, settings = item.split(":", 1)
+        for setting in settings.split(","):
+            if "=" in setting:
+                name, value = setting.split("=", 1)
+                limits.setdefault(provider.strip(), {})[name.strip()] = float(value)
+    return limits
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Seconds to wait from a Retry-After header: delta-seconds or an HTTP date."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def throttle_info(error: Exception) -> tuple:
+    """(status code, Retry-After seconds) of a failed call, each None when unknown.
+
+    Understands `requests` and OpenAI errors (`.response`), the image API's error
+    (`.status_code`, `.retry_after`) and DDGS's `RatelimitException` (reported as 429).
+    """
+    if "ratelimit" in type(error).__name__.lower():
+        return 429, None
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None and response is not None:
+        retry_after = parse_retry_after(getattr(response, "headers", {}).get("Retry-After"))
+    return status, retry_after
+
+
+class _Bucket:
+    """Token bucket refilled at `rate` per second up to `capacity`; a rate of 0 never limits."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def shortfall(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 when it is)."""
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        if self.rate > 0:
+            self.level -= amount
+
+
+class ProviderLimiter:
+    def __init__(
+        self,
+        name: str,
+        rpm: float = 0,
+        burst: float = 1,
+        tpm: float = 0,
+        concurrency: int = 8,
+        min_concurrency: int = 1,
+        decrease_interval: float = 2.0,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        max_wait: float = 120.0,
+        retries: int = 2,
+    ):
+        self.name = name
+        self.max_concurrency = max(int(concurrency), 1)
+        self.min_concurrency = max(min(int(min_concurrency), self.max_concurrency), 1)
+        self.decrease_interval = decrease_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_wait = max_wait
+        self.retries = retries
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.blocked_until = 0.0
+        self.calls = 0
+        self.throttled = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self._requests = _Bucket(rpm / 60.0, burst)
+        self._tokens = _Bucket(tpm / 60.0, tpm)  # a minute's worth of tokens can be spent at once
+        self._consecutive_throttles = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls, name: str) -> "ProviderLimiter":
+        settings = {**DEFAULT_LIMITS.get(name, {}), **parse_limits(os.getenv("RATE_LIMITS", "")).get(name, {})}
+        return cls(
+            name,
+            max_wait=float(os.getenv("RATE_LIMIT_MAX_WAIT", 120)),
+            retries=int(os.getenv("RATE_LIMIT_RETRIES", 2)),
+            **settings,
+        )
+
+    def _delay(self, now: float, tokens: float) -> Optional[float]:
+        """Seconds until a call can start, or None when only a finishing call can free a slot."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.in_flight >= int(self.limit):
+            return None
+        self._requests.refill(now)
+        self._tokens.refill(now)
+        return max(self._requests.shortfall(1), self._tokens.shortfall(tokens))
+
+    @contextmanager
+    def acquire(self, tokens: float = 0, feedback: bool = True):
+        """Wait for a turn to call the provider; yields the seconds spent waiting.
+
+        With `feedback`, the outcome of the block adjusts the limits: a 429/503 raised inside
+        it (see `throttle_info`) halves the concurrency and blocks the provider for its
+        Retry-After, a normal exit counts as a success. Callers that see every HTTP answer
+        themselves report them with `record_response` instead.
+        """
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._delay(now, tokens)
+                    if delay == 0:
+                        break
+                    if now >= deadline:
+                        self.timeouts += 1
+                        raise RateLimitTimeout(f"Rate limit: waited {self.max_wait:.0f}s for a {self.name} slot")
+                    self._cond.wait(min(delay if delay is not None else self.max_wait, deadline - now))
+            finally:
+                self.waiting -= 1
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self.in_flight += 1
+            self.calls += 1
+            admitted = time.monotonic()
+            waited = admitted - started
+            self.wait_total += waited
+        tracing.record_rate_limit_wait(self.name, waited)
+
+        try:
+            yield waited
+        except Exception as e:
+            status, retry_after = throttle_info(e)
+            if feedback and status in THROTTLE_STATUSES:
+                self.record_throttle(status, retry_after, sent_at=admitted)
+            raise
+        else:
+            if feedback:
+                self.record_success()
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def call(self, fn, *args, tokens: float = 0, **kwargs):
+        """`fn(*args, **kwargs)` in a slot, retried up to `retries` times when throttled."""
+        for attempt in range(self.retries + 1):
+            try:
+                with self.acquire(tokens):
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.retries or throttle_info(e)[0] not in THROTTLE_STATUSES:
+                    raise
+
+    def charge(self, tokens: float):
+        """Take `tokens` more (or, if negative, fewer) from the token bucket, once a call's real size is known."""
+        with self._cond:
+            self._tokens.take(tokens)
+
+    def record_response(self, status_code: int, headers=None):
+        """Adjust the limits from one HTTP answer of the provider."""
+        if status_code in THROTTLE_STATUSES:
+            self.record_throttle(status_code, parse_retry_after((headers or {}).get("Retry-After")))
+        elif status_code < 400:
+            self.record_success()
+
+    def record_success(self):
+        with self._cond:
+            self._consecutive_throttles = 0
+            if self.limit < self.max_concurrency:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+                self._cond.notify_all()
+
+    def record_throttle(self, status: int, retry_after: Optional[float] = None, sent_at: Optional[float] = None):
+        """The provider answered 429/503: back off and shrink the concurrency.
+
+        Answers to calls sent before the last decrease (`sent_at`, a `time.monotonic()`) do not
+        shrink it again; without `sent_at`, it shrinks at most once per `decrease_interval`.
+        """
+        with self._cond:
+            now = time.monotonic()
+            self.throttled += 1
+            self._consecutive_throttles += 1
+            if retry_after is None:
+                retry_after = self.base_backoff * 2 ** (self._consecutive_throttles - 1)
+            self.blocked_until = max(self.blocked_until, now + min(retry_after, self.max_backoff))
+            # Calls that were already in flight often fail together: count that as one signal
+            if sent_at is not None:
+                decrease = sent_at >= self._last_decrease
+            else:
+                decrease = now - self._last_decrease >= self.decrease_interval
+            if decrease:
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                self._last_decrease = now
+        tracing.get_tracer().metrics.inc(
+            "rate_limit_throttled_total", help="Throttling answers (429/503) from providers", provider=self.name, status=status,
+        )
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "provider": self.name,
+                "limit": int(self.limit),
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "timeouts": self.timeouts,
+                "avg_wait": self.wait_total / self.calls if self.calls else 0.0,
+                "blocked_for": max(self.blocked_until - time.monotonic(), 0.0),
+            }
+
+
+_limiters = {}
+_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> ProviderLimiter:
+    """The process-wide limiter of provider `name`, configured from the environment on first use."""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                limiter = _limiters[name] = ProviderLimiter.from_env(name)
+    return limiter
+
+
+def stats() -> list:
+    """Stats of every limiter used so far."""
+    return [limiter.stats() for limiter in list(_limiters.values())]
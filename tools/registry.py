@@ -0,0 +1,120 @@
+"""Lazily constructed tools.
+
+A `LazyTool` exposes a tool's name, description, inputs and output type to the agent
+without importing the module that implements it. The metadata is read from the class
+body in the module's source (with `ast`, so none of the module's imports run); the real
+tool is imported and constructed by `setup()`, which smolagents calls on first use. When
+that fails and the tool was given a `fallback` function, the fallback answers its calls
+instead (the way a tool that failed to load at startup used to be replaced by a stub).
+"""
+import ast
+import importlib
+import importlib.util
+import threading
+from typing import Callable, Optional
+
+from smolagents.tools import Tool
+
+SPEC_ATTRIBUTES = ("name", "description", "inputs", "output_type")
+
+_spec_cache = {}
+
+
+def _literal_class_attributes(module_name: str, class_name: str) -> Optional[dict]:
+    spec = importlib.util.find_spec(module_name)
+    if spec is None or not spec.origin or not spec.origin.endswith(".py"):
+        return None
+    with open(spec.origin, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=spec.origin)
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == class_name:
+            attributes = {}
+            for statement in node.body:
+                if (
+                    isinstance(statement, ast.Assign)
+                    and len(statement.targets) == 1
+                    and isinstance(statement.targets[0], ast.Name)
+                    and statement.targets[0].id in SPEC_ATTRIBUTES
+                ):
+                    try:
+                        attributes[statement.targets[0].id] = ast.literal_eval(statement.value)
+                    except ValueError:
+                        return None
+            return attributes
+    return None
+
+
+def read_tool_spec(target: str) -> dict:
+    """Return {name, description, inputs, output_type} for a "module:ClassName" target.
+
+    Falls back to importing the class when an attribute is computed rather than a literal
+    or is inherited from a base class.
+    """
+    if target not in _spec_cache:
+        module_name, class_name = target.split(":")
+        attributes = _literal_class_attributes(module_name, class_name)
+        if attributes is None or any(key not in attributes for key in SPEC_ATTRIBUTES):
+            tool_class = getattr(importlib.import_module(module_name), class_name)
+            attributes = {key: getattr(tool_class, key) for key in SPEC_ATTRIBUTES}
+        _spec_cache[target] = attributes
+    return dict(_spec_cache[target])
+
+
+class LazyTool(Tool):
+    """Stand-in for the tool class named by `target` ("module:ClassName").
+
+    The tool is built on first call with `factory()` when given (for tools that need other
+    tools or settings), otherwise with `ToolClass(**kwargs)`. If building it fails, calls go
+    to `fallback(**arguments)` when given; `error` then holds the exception.
+    """
+
+    skip_forward_signature_validation = True
+
+    def __init__(self, target: str, factory: Callable[[], Tool] = None, fallback: Callable[..., str] = None, **kwargs):
+        spec = read_tool_spec(target)
+        self.name = spec["name"]
+        self.description = spec["description"]
+        self.inputs = spec["inputs"]
+        self.output_type = spec["output_type"]
+        self.target = target
+        self._factory = factory
+        self._fallback = fallback
+        self._kwargs = kwargs
+        self._tool = None
+        self.error = None
+        self._lock = threading.Lock()
+        super().__init__()
+
+    @property
+    def loaded(self) -> bool:
+        return self._tool is not None
+
+    def load(self) -> Tool:
+        """Import and construct the real tool (once, even when called from several threads)."""
+        if self._tool is None:
+            with self._lock:
+                if self._tool is None:
+                    if self._factory is not None:
+                        tool = self._factory()
+                    else:
+                        module_name, class_name = self.target.split(":")
+                        tool = getattr(importlib.import_module(module_name), class_name)(**self._kwargs)
+                    if tool.name != self.name:
+                        raise ValueError(f"Lazy tool '{self.name}' built a tool named '{tool.name}'")
+                    self._tool = tool
+        return self._tool
+
+    def setup(self):
+        try:
+            self.load()
+        except Exception as e:
+            if self._fallback is None:
+                raise
+            self.error = e
+            print(f"⚠️ Could not load tool '{self.name}', using its fallback: {e}")
+        self.is_initialized = True
+
+    def forward(self, *args, **kwargs):
+        if self.error is not None:
+            return self._fallback(*args, **kwargs)
+        return self.load()(*args, **kwargs)
@@ -0,0 +1,287 @@
+"""Session-local index of everything the agent has searched for and read.
+
+`web_search`, `web_search_many` and `visit_webpage` add their results to the index of the
+current session: search snippets as small documents, visited pages (the whole markdown,
+not just the part that fits in the observation) split into passages. `local_search` then
+answers follow-up lookups from that index in milliseconds instead of going back to the
+network.
+
+Ranking is BM25 over word tokens. When numpy is installed a second tier scores passages by
+the cosine of hashed character-trigram vectors (int8, `vector_dims` bytes per passage),
+which also matches inflections and typos; the two rankings are merged by reciprocal rank
+fusion. An index holds at most `max_chunks` passages, dropping the oldest documents first.
+
+The index of the running session is kept in a context variable: `session(agent)` sets it
+for one run (the UI and the batch runner do this), and every agent keeps its own index for
+all of its runs. Outside a session the tools index nothing.
+"""
+import contextvars
+import hashlib
+import importlib.util
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from smolagents.tools import Tool
+
+from tools.chunking import split_text
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this to was were what when "
+    "where which who why will with".split()
+)
+
+_current = contextvars.ContextVar("research_index", default=None)
+
+
+def tokenize(text: str) -> list:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class ResearchIndex:
+    def __init__(self, max_chunks: int = 4000, chunk_tokens: int = 250, vectors: bool = True, vector_dims: int = 256,
+                 k1: float = 1.5, b: float = 0.75):
+        self.max_chunks = max_chunks
+        self.chunk_tokens = chunk_tokens
+        self.vector_dims = vector_dims
+        # numpy itself is imported by the first passage indexed, not by `import app`
+        self.vectors = vectors and importlib.util.find_spec("numpy") is not None
+        self.k1 = k1
+        self.b = b
+        self.documents = OrderedDict()  # (kind, url) -> {"source", "title", "kind", "chunks": [chunk ids]}
+        self.chunks = {}  # chunk id -> {"document", "text", "length", "terms"}
+        self.postings = {}  # term -> {chunk id: term frequency}
+        self.total_length = 0
+        self.searches = 0
+        self._vectors = {}  # chunk id -> int8 vector
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ResearchIndex":
+        return cls(
+            max_chunks=int(os.getenv("RESEARCH_INDEX_MAX_CHUNKS", 4000)),
+            vectors=os.getenv("RESEARCH_INDEX_VECTORS", "true").lower() in ("1", "true", "yes"),
+        )
+
+    def _embed(self, text: str):
+        """Hashed character trigrams of every word, L2-normalised and quantised to int8."""
+        import numpy as np
+
+        vector = np.zeros(self.vector_dims, dtype=np.float32)
+        for word in TOKEN_PATTERN.findall(text.lower()):
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                digest = hashlib.blake2b(padded[i:i + 3].encode(), digest_size=4).digest()
+                bucket = int.from_bytes(digest, "little")
+                vector[bucket % self.vector_dims] += 1.0 if bucket & 0x80000000 else -1.0
+        norm = float(np.linalg.norm(vector))
+        if norm == 0:
+            return np.zeros(self.vector_dims, dtype=np.int8)
+        return np.round(vector / norm * 127).astype(np.int8)
+
+    def add(self, key, text: str, source: str = "", title: str = "", kind: str = "page", replaces: tuple = ()) -> int:
+        """Index `text` under `key` (re-adding a key replaces it); returns the number of passages."""
+        text = (text or "").strip()
+        if not text:
+            return 0
+        passages = split_text(text, max_tokens=self.chunk_tokens) if len(text) > self.chunk_tokens * 4 else [text]
+        prepared = []
+        for passage in passages:
+            tokens = tokenize(f"{title} {passage}")
+            if tokens:
+                prepared.append((passage, Counter(tokens), len(tokens), self._embed(f"{title} {passage}") if self.vectors else None))
+        with self._lock:
+            for old in (key, *replaces):
+                self._remove(old)
+            ids = []
+            for passage, counts, length, vector in prepared:
+                chunk_id = self._next_id
+                self._next_id += 1
+                self.chunks[chunk_id] = {"document": key, "text": passage, "length": length, "terms": tuple(counts)}
+                for term, count in counts.items():
+                    self.postings.setdefault(term, {})[chunk_id] = count
+                if vector is not None:
+                    self._vectors[chunk_id] = vector
+                self.total_length += length
+                ids.append(chunk_id)
+            self.documents[key] = {"source": source, "title": title, "kind": kind, "chunks": ids}
+            while len(self.chunks) > self.max_chunks and len(self.documents) > 1:
+                self._remove(next(iter(self.documents)))
+        return len(prepared)
+
+    def _remove(self, key):
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+        for chunk_id in document["chunks"]:
+            chunk = self.chunks.pop(chunk_id)
+            self.total_length -= chunk["length"]
+            self._vectors.pop(chunk_id, None)
+            for term in chunk["terms"]:
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self.postings[term]
+
+    def add_search_results(self, query: str, results: list):
+        for result in results:
+            href = result.get("href") or ""
+            if href and ("page", href) in self.documents:
+                continue  # the full page is already indexed
+            self.add(("snippet", href or result.get("title", "")), result.get("body", ""), source=href,
+                     title=result.get("title", ""), kind=f"search result for '{query}'")
+
+    def add_page(self, url: str, markdown: str):
+        title = next((line.lstrip("# ").strip() for line in markdown.splitlines() if line.startswith("#")), "")
+        self.add(("page", url), markdown, source=url, title=title, kind="page", replaces=(("snippet", url),))
+
+    def _bm25(self, terms: list) -> dict:
+        count = len(self.chunks)
+        average = self.total_length / count
+        scores = {}
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, frequency in postings.items():
+                length = self.chunks[chunk_id]["length"]
+                denominator = frequency + self.k1 * (1 - self.b + self.b * length / average)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / denominator
+        return scores
+
+    def _cosine(self, query: str, min_similarity: float = 0.25) -> dict:
+        import numpy as np
+
+        ids = list(self._vectors)
+        if not ids:
+            return {}
+        matrix = np.stack([self._vectors[chunk_id] for chunk_id in ids]).astype(np.float32)
+        similarities = matrix @ self._embed(query).astype(np.float32) / (127.0 * 127.0)
+        return {chunk_id: float(s) for chunk_id, s in zip(ids, similarities) if s >= min_similarity}
+
+    def search(self, query: str, k: int = 5) -> list:
+        """The `k` best passages as dicts (text, source, title, kind, score), best first."""
+        with self._lock:
+            self.searches += 1
+            if not self.chunks:
+                return []
+            rankings = [self._bm25(tokenize(query))]
+            if self.vectors:
+                rankings.append(self._cosine(query))
+            if len(rankings) == 1:
+                fused = rankings[0]
+            else:
+                # Reciprocal rank fusion: robust to the two scores being on different scales
+                fused = {}
+                for scores in rankings:
+                    for rank, chunk_id in enumerate(sorted(scores, key=scores.get, reverse=True)):
+                        fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (60 + rank)
+            results = []
+            for chunk_id in sorted(fused, key=fused.get, reverse=True)[:k]:
+                chunk = self.chunks[chunk_id]
+                document = self.documents[chunk["document"]]
+                results.append({
+                    "text": chunk["text"],
+                    "source": document["source"],
+                    "title": document["title"],
+                    "kind": document["kind"],
+                    "score": fused[chunk_id],
+                })
+            return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "documents": len(self.documents),
+                "chunks": len(self.chunks),
+                "terms": len(self.postings),
+                "vectors": self.vectors,
+                "vector_bytes": len(self._vectors) * self.vector_dims,
+                "searches": self.searches,
+            }
+
+
+def current() -> Optional[ResearchIndex]:
+    """The index of the session whose run is executing in this context, if any."""
+    return _current.get()
+
+
+def index_for(agent) -> ResearchIndex:
+    """The agent's own index, created on first use."""
+    index = getattr(agent, "research_index", None)
+    if index is None:
+        index = agent.research_index = ResearchIndex.from_env()
+    return index
+
+
+@contextmanager
+def session(agent):
+    """Make `agent`'s index the current one while its run executes."""
+    token = _current.set(index_for(agent))
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+def record_search_results(query: str, results: list):
+    index = current()
+    if index is not None and results:
+        index.add_search_results(query, results)
+
+
+def record_page(url: str, markdown: str):
+    index = current()
+    if index is not None and markdown:
+        index.add_page(url, markdown)
+
+
+class LocalSearchTool(Tool):
+    name = "local_search"
+    description = (
+        "Searches the web search results and webpages already seen in this conversation (an index kept in memory) "
+        "and returns the most relevant passages with their source URLs. It takes milliseconds: call it before "
+        "web_search or visit_webpage when the answer may be in something you already looked up."
+    )
+    inputs = {
+        'query': {'type': 'string', 'description': 'What to look for in the pages and results seen so far.'},
+        'max_results': {'type': 'integer', 'description': 'How many passages to return (default 5).', 'nullable': True},
+    }
+    output_type = "string"
+
+    def __init__(self, passage_chars: int = 1200, **kwargs):
+        super().__init__()
+        self.passage_chars = passage_chars
+
+    def forward(self, query: str, max_results: Optional[int] = None) -> str:
+        index = current()
+        if index is None or not index.chunks:
+            return "The local index is empty: nothing has been searched or read in this conversation yet. Use web_search."
+        started = time.perf_counter()
+        results = index.search(query, k=max_results or 5)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stats = index.stats()
+        if not results:
+            return (
+                f"No local results for '{query}' in {stats['documents']} indexed sources. "
+                "Use web_search or visit_webpage to look it up."
+            )
+        sections = [
+            f"## Local results for: {query}\n"
+            f"({len(results)} of {stats['chunks']} passages from {stats['documents']} sources, {elapsed_ms:.1f} ms)"
+        ]
+        for result in results:
+            text = result["text"]
+            if len(text) > self.passage_chars:
+                text = text[: self.passage_chars] + " ..."
+            sections.append(f"[{result['title'] or result['source']}]({result['source']}) - {result['kind']}\n{text}")
+        return "\n\n".join(sections)
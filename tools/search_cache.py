@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from tools import tracing
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "web_search.sqlite3")
+
+
+class SearchCache:
+    """Disk-backed TTL + LRU cache for search results, shared by every process on the host.
+
+    Entries are keyed on the normalized query and `max_results`. The store is a SQLite
+    database in WAL mode, so several workers can read and write it at the same time.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = 24 * 3600, max_entries: int = 5000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, results TEXT NOT NULL,"
+                " created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @classmethod
+    def from_env(cls) -> Optional["SearchCache"]:
+        """Build the cache from WEB_SEARCH_CACHE_* variables; a TTL of 0 disables caching."""
+        ttl = float(os.getenv("WEB_SEARCH_CACHE_TTL", 24 * 3600))
+        if ttl <= 0:
+            return None
+        return cls(
+            path=os.getenv("WEB_SEARCH_CACHE_PATH", DEFAULT_CACHE_PATH),
+            ttl=ttl,
+            max_entries=int(os.getenv("WEB_SEARCH_CACHE_MAX_ENTRIES", 5000)),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def _key(self, query: str, max_results: int) -> str:
+        return f"{max_results}:{self.normalize(query)}"
+
+    def _count(self, conn: sqlite3.Connection, name: str):
+        with self._lock:
+            if name == "hits":
+                self.hits += 1
+            else:
+                self.misses += 1
+        tracing.record_cache("web_search", "hit" if name == "hits" else "miss")
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, query: str, max_results: int) -> Optional[list]:
+        conn = self._connect()
+        key = self._key(query, max_results)
+        now = time.time()
+        row = conn.execute("SELECT results, created_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            if row is not None:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._count(conn, "misses")
+            return None
+        conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+        self._count(conn, "hits")
+        return json.loads(row[0])
+
+    def set(self, query: str, max_results: int, results: list):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, results, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (self._key(query, max_results), json.dumps(results), now, now),
+            )
+            # Drop expired rows first, then the least recently used ones above the size cap
+            conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM results WHERE key IN ("
+                " SELECT key FROM results ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute("DELETE FROM results")
+        conn.execute("DELETE FROM counters")
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process and for all processes sharing the file."""
+        conn = self._connect()
+        shared = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        entries = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "shared_hits": shared.get("hits", 0),
+            "shared_misses": shared.get("misses", 0),
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        }
@@ -0,0 +1,61 @@
+"""Incremental output from long-running tools.
+
+A UI that wants partial tool output installs a sink with `capture(sink)` around the agent
+run. Tools (through `openai_client.chat_completion`) then `open_stream(label)` and write
+deltas to it; the sink is called with the `ToolStream` after every update. Without a sink
+`open_stream` returns None and tools behave exactly as before.
+"""
+import contextlib
+import contextvars
+import time
+from typing import Callable, Optional
+
+_sink = contextvars.ContextVar("tool_stream_sink", default=None)
+
+
+class ToolStream:
+    def __init__(self, label: str, sink: Callable[["ToolStream"], None]):
+        self.label = label
+        self.text = ""
+        self.closed = False
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self._sink = sink
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Seconds from opening the stream to its first non-empty delta."""
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    def write(self, delta: str):
+        if not delta:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.text += delta
+        self._sink(self)
+
+    def close(self):
+        self.closed = True
+        self._sink(self)
+
+
+@contextlib.contextmanager
+def capture(sink: Callable[[ToolStream], None]):
+    """Send every tool stream opened in this context (and threads started with a copy of it) to `sink`."""
+    token = _sink.set(sink)
+    try:
+        yield
+    finally:
+        _sink.reset(token)
+
+
+def is_capturing() -> bool:
+    return _sink.get() is not None
+
+
+def open_stream(label: str) -> Optional[ToolStream]:
+    sink = _sink.get()
+    return ToolStream(label, sink) if sink is not None else None
@@ -0,0 +1,447 @@
+"""Spans and metrics for agent runs, steps, model calls and tool calls.
+
+Every tool's `forward`, every call to the agent's model and every OpenAI request made by a
+tool becomes a span with its duration, payload sizes, cache hits/misses and error status.
+Spans nest through a context variable: a run (`run_span`) is the root, model calls, tool
+calls and agent steps hang off it, and OpenAI requests hang off the tool that made them.
+
+Finished spans update in-process Prometheus-style metrics (`render_metrics`, served on
+/metrics by `serve_metrics`) and, when TRACE_FILE is set, are appended to that JSONL file
+one span per line. Token totals per run are summed from the model calls themselves, once
+each, so planning and final-answer steps are counted exactly like any other step.
+"""
+import contextlib
+import contextvars
+import functools
+import http.server
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Optional
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Tools report most failures as a message instead of raising; these prefixes (the tools' own error formats, not
+# the bare word "Error", which legitimate output can start with) mark such results as errors
+ERROR_PREFIXES = (
+    "❌", "⏰", "💥",
+    "Error:", "Error in ", "Error fetching ",
+    "An unexpected error occurred:", "The request timed out.",
+)
+
+_current = contextvars.ContextVar("trace_span", default=None)
+_run = contextvars.ContextVar("trace_run", default=None)
+
+_tracer = None
+_lock = threading.Lock()
+
+
+class Span:
+    def __init__(self, name: str, kind: str, parent: "Span" = None, attributes: dict = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = time.time()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+        self.attributes = dict(attributes or {})
+        self._started = time.perf_counter()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, key: str, value: float):
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def fail(self, error):
+        self.status = "error"
+        self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration": round(self.duration, 6) if self.duration is not None else None,
+            "status": self.status,
+            "error": self.error[:500] if self.error else None,
+            "attributes": self.attributes,
+        }
+
+
+class Metrics:
+    """Counters and histograms rendered in the Prometheus text exposition format."""
+
+    def __init__(self, buckets: tuple = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels: dict) -> tuple:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, metric: str, value: float = 1, help: str = None, **labels):
+        with self._lock:
+            self._counters[(metric, self._labels(labels))] += value
+            if help:
+                self._help.setdefault(metric, help)
+
+    def observe(self, metric: str, value: float, help: str = None, **labels):
+        key = (metric, self._labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+            if help:
+                self._help.setdefault(metric, help)
+
+    def summary(self, metric: str, label: str) -> dict:
+        """{label value: {"count", "total", "avg"}} for one histogram, e.g. time per tool."""
+        result = {}
+        with self._lock:
+            for (name, labels), histogram in self._histograms.items():
+                if name != metric:
+                    continue
+                value = dict(labels).get(label)
+                entry = result.setdefault(value, {"count": 0, "total": 0.0})
+                entry["count"] += histogram["count"]
+                entry["total"] += histogram["sum"]
+        for entry in result.values():
+            entry["avg"] = entry["total"] / entry["count"] if entry["count"] else 0.0
+        return result
+
+    def render(self) -> str:
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self._lock:
+            for name in sorted({n for n, _ in self._counters}):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{label_text(labels)} {value:g}")
+            for name in sorted({n for n, _ in self._histograms}):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(self.buckets, histogram["buckets"]):
+                        lines.append(f"{name}_bucket{label_text(labels, [('le', f'{bound:g}')])} {count}")
+                    lines.append(f"{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram['count']}")
+                    lines.append(f"{name}_sum{label_text(labels)} {histogram['sum']:.6f}")
+                    lines.append(f"{name}_count{label_text(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class JsonlExporter:
+    """Appends finished spans to a JSONL file, one line per span."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class Tracer:
+    def __init__(self, exporters: list = None):
+        self.metrics = Metrics()
+        self.exporters = list(exporters or [])
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        trace_file = os.getenv("TRACE_FILE")
+        return cls(exporters=[JsonlExporter(trace_file)] if trace_file else [])
+
+    def start(self, name: str, kind: str, **attributes) -> Span:
+        """Start a span under the current one without making it current (for leaves such as model calls)."""
+        span = Span(name, kind, parent=_current.get(), attributes=attributes)
+        run = _run.get()
+        if run is not None and kind != "run":
+            span.attributes.setdefault("step", run.attributes.get("steps", 0) + 1)
+        return span
+
+    def finish(self, span: Span):
+        if span.duration is None:
+            span.duration = time.perf_counter() - span._started
+        self.metrics.observe(
+            f"agent_{span.kind}_duration_seconds", span.duration,
+            help=f"Duration of {span.kind} spans in seconds", name=span.name,
+        )
+        self.metrics.inc(f"agent_{span.kind}_calls_total", help=f"Finished {span.kind} spans", name=span.name, status=span.status)
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"⚠️ Trace export failed: {e}")
+
+    @contextlib.contextmanager
+    def span(self, name: str, kind: str, **attributes):
+        """Context manager for a span that is current (the parent of spans started inside it)."""
+        span = self.start(name, kind, **attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            _current.reset(token)
+            self.finish(span)
+
+    def record_tokens(self, input_tokens: int, output_tokens: int, source: str):
+        """Count the tokens of one model call, in the metrics and on the current run."""
+        input_tokens, output_tokens = input_tokens or 0, output_tokens or 0
+        help_text = "Tokens sent to and received from models (source: agent model or tools)"
+        self.metrics.inc("agent_tokens_total", input_tokens, help=help_text, source=source, direction="input")
+        self.metrics.inc("agent_tokens_total", output_tokens, help=help_text, source=source, direction="output")
+        run = _run.get()
+        if run is not None:
+            prefix = "" if source == "agent" else f"{source}_"
+            run.add(f"{prefix}input_tokens", input_tokens)
+            run.add(f"{prefix}output_tokens", output_tokens)
+
+
+def get_tracer() -> Tracer:
+    global _tracer
+    if _tracer is None:
+        with _lock:
+            if _tracer is None:
+                _tracer = Tracer.from_env()
+    return _tracer
+
+
+def current_run() -> Optional[Span]:
+    return _run.get()
+
+
+def payload_chars(value) -> int:
+    """Approximate size of tool arguments or results, in characters."""
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(payload_chars(v) for v in value)
+    if isinstance(value, dict):
+        return sum(payload_chars(v) for v in value.values())
+    return len(str(value))
+
+
+def record_cache(cache: str, result: str):
+    """Count a cache lookup ("hit", "miss", "revalidated", "joined") and note it on the current span."""
+    get_tracer().metrics.inc("agent_cache_lookups_total", help="Cache lookups by cache and result", cache=cache, result=result)
+    span = _current.get()
+    if span is not None:
+        span.add(f"cache.{cache}.{result}", 1)
+
+
+def record_rate_limit_wait(provider: str, seconds: float):
+    """Count the time a call queued for a provider's rate limit and note it on the current span."""
+    get_tracer().metrics.observe(
+        "rate_limit_wait_seconds", seconds, help="Time calls waited for a rate limit slot, by provider", provider=provider,
+    )
+    span = _current.get()
+    if span is not None and seconds > 0.001:
+        span.add(f"rate_limit.{provider}.wait_seconds", round(seconds, 3))
+
+
+@contextlib.contextmanager
+def run_span(agent, task: str, **attributes):
+    """Root span of one agent run; the run's token totals and step count end up on it."""
+    tracer = get_tracer()
+    with tracer.span("agent.run", "run", agent=getattr(agent, "name", None) or type(agent).__name__,
+                     task=str(task)[:200], input_tokens=0, output_tokens=0, steps=0, **attributes) as span:
+        token = _run.set(span)
+        try:
+            yield span
+        finally:
+            _run.reset(token)
+
+
+def step_callback(step, agent=None):
+    """Step callback recording each finished ActionStep/PlanningStep as a span of the current run."""
+    from smolagents.memory import ActionStep
+
+    tracer = get_tracer()
+    kind = "action" if isinstance(step, ActionStep) else "planning"
+    span = Span(f"step.{kind}", "step", parent=_current.get())
+    timing = getattr(step, "timing", None)
+    if timing is not None and timing.start_time:
+        span.start = timing.start_time
+        span.duration = timing.duration if timing.end_time else None
+    attributes = {"type": kind}
+    if isinstance(step, ActionStep):
+        attributes["step"] = step.step_number
+        attributes["final_answer"] = bool(step.is_final_answer)
+        attributes["tool_calls"] = [call.name for call in step.tool_calls or []]
+        attributes["observation_chars"] = payload_chars(step.observations)
+        memory_stats = getattr(step, "memory_stats", None)
+        if memory_stats:
+            attributes["prompt_tokens"] = memory_stats.get("prompt_tokens")
+            attributes["compacted_steps"] = memory_stats.get("compacted")
+        if step.error is not None:
+            span.fail(step.error)
+    usage = getattr(step, "token_usage", None)
+    if usage is not None:
+        attributes["input_tokens"] = usage.input_tokens
+        attributes["output_tokens"] = usage.output_tokens
+    span.set(**attributes)
+    tracer.finish(span)
+
+    run = _run.get()
+    if run is not None and isinstance(step, ActionStep):
+        run.set(steps=step.step_number)
+
+
+def instrument_tool(tool):
+    """Wrap `tool.forward` in a "tool" span (once per tool instance)."""
+    if getattr(tool, "_traced", False):
+        return tool
+    forward = tool.forward
+
+    @functools.wraps(forward)
+    def traced_forward(*args, **kwargs):
+        # LazyTools import and build the real tool on their first call
+        cold = getattr(tool, "loaded", True) is False
+        with get_tracer().span(tool.name, "tool", input_chars=payload_chars(args) + payload_chars(kwargs), cold_start=cold) as span:
+            result = forward(*args, **kwargs)
+            span.set(output_chars=payload_chars(result))
+            if isinstance(result, str) and result.lstrip().startswith(ERROR_PREFIXES):
+                span.fail(result.strip().splitlines()[0])
+            return result
+
+    tool.forward = traced_forward
+    tool._traced = True
+    return tool
+
+
+def instrument_tools(tools: list) -> list:
+    for tool in tools:
+        instrument_tool(tool)
+    return tools
+
+
+def instrument_model(model):
+    """Wrap the model's generate/generate_stream in "model" spans that also count its tokens."""
+    if getattr(model, "_traced", False):
+        return model
+    tracer = get_tracer()
+    name = getattr(model, "model_id", None) or type(model).__name__
+    generate, generate_stream = model.generate, getattr(model, "generate_stream", None)
+
+    def start(messages):
+        return tracer.start(name, "model", messages=len(messages), input_chars=sum(
+            payload_chars(m.content if hasattr(m, "content") else m.get("content")) for m in messages
+        ))
+
+    def finish(span, output_chars, usage):
+        span.set(output_chars=output_chars)
+        if usage is not None:
+            span.set(input_tokens=usage.input_tokens, output_tokens=usage.output_tokens)
+            tracer.record_tokens(usage.input_tokens, usage.output_tokens, source="agent")
+        tracer.finish(span)
+
+    @functools.wraps(generate)
+    def traced_generate(messages, *args, **kwargs):
+        span = start(messages)
+        try:
+            message = generate(messages, *args, **kwargs)
+        except BaseException as e:
+            span.fail(e)
+            tracer.finish(span)
+            raise
+        finish(span, payload_chars(message.content), message.token_usage)
+        return message
+
+    model.generate = traced_generate
+
+    if generate_stream is not None:
+        @functools.wraps(generate_stream)
+        def traced_generate_stream(messages, *args, **kwargs):
+            from smolagents.monitoring import TokenUsage
+
+            span = start(messages)
+            output_chars, input_tokens, output_tokens, has_usage = 0, 0, 0, False
+            try:
+                for delta in generate_stream(messages, *args, **kwargs):
+                    if "first_token" not in span.attributes and delta.content:
+                        span.set(first_token=round(time.perf_counter() - span._started, 4))
+                    output_chars += len(delta.content or "")
+                    if delta.token_usage is not None:
+                        has_usage = True
+                        input_tokens += delta.token_usage.input_tokens
+                        output_tokens += delta.token_usage.output_tokens
+                    yield delta
+            except BaseException as e:
+                span.fail(e)
+                raise
+            finally:
+                finish(span, output_chars, TokenUsage(input_tokens, output_tokens) if has_usage else None)
+
+        model.generate_stream = traced_generate_stream
+
+    model._traced = True
+    return model
+
+
+def render_metrics() -> str:
+    return get_tracer().metrics.render()
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> http.server.ThreadingHTTPServer:
+    """Serve `render_metrics()` on http://host:port/metrics from a daemon thread."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = render_metrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
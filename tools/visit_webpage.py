@@ -1,8 +1,24 @@
+import codecs
+import os
+import re
 from typing import Any, Optional
 from smolagents.tools import Tool
 import requests
 import markdownify
 import smolagents
+from tools import http_client, research_index, tracing
+from tools.html_extraction import extract_markdown
+from tools.page_cache import DEFAULT_PAGE_CACHE_DIR, PageCache
+
+# Content types worth downloading and converting; anything else is skipped before the body is read
+TEXTUAL_CONTENT_TYPES = (
+    "text/html",
+    "application/xhtml+xml",
+    "text/plain",
+    "text/markdown",
+    "text/xml",
+    "application/xml",
+)
 
 class VisitWebpageTool(Tool):
     name = "visit_webpage"
@@ -13,7 +29,6 @@ class VisitWebpageTool(Tool):
     def forward(self, url: str) -> str:
         try:
             import requests
-            from markdownify import markdownify
             from requests.exceptions import RequestException
 
             from smolagents.utils import truncate_content
@@ -22,17 +37,24 @@ class VisitWebpageTool(Tool):
                 "You must install packages `markdownify` and `requests` to run this tool: for instance run `pip install markdownify requests`."
             ) from e
         try:
-            # Send a GET request to the URL with a 20-second timeout
-            response = requests.get(url, timeout=20)
-            response.raise_for_status()  # Raise an exception for bad status codes
+            page = self.fetch(url)
+            if page["skipped"]:
+                return (
+                    f"The URL points to non-HTML content ({page['content_type']}), so it was not downloaded. "
+                    "Try another page about the same topic."
+                )
 
-            # Convert the HTML content to Markdown
-            markdown_content = markdownify(response.text).strip()
+            # Convert the main content of the page to Markdown (markdownify is the fallback engine)
+            markdown_content = extract_markdown(page["body"], engine=self.engine, base_url=url)
 
             # Remove multiple line breaks
             markdown_content = re.sub(r"\n{3,}", "\n\n", markdown_content)
+            # The whole page goes to the session's index, including what the truncation below cuts off
+            research_index.record_page(url, markdown_content)
+            if page["truncated"]:
+                markdown_content += f"\n\n_(page truncated after the first {self.max_bytes:,} bytes)_"
 
-            return truncate_content(markdown_content, 10000)
+            return truncate_content(markdown_content, self.max_output_length)
 
         except requests.exceptions.Timeout:
             return "The request timed out. Please try again later or check the URL."
@@ -41,5 +63,75 @@ class VisitWebpageTool(Tool):
         except Exception as e:
             return f"An unexpected error occurred: {str(e)}"
 
-    def __init__(self, *args, **kwargs):
+    def fetch(self, url: str) -> dict:
+        """Stream the page body up to `max_bytes`, revalidating any cached copy with a conditional GET."""
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None and cached["truncated"] and cached["max_bytes"] < self.max_bytes:
+            cached = None  # cached body is shorter than what we are now allowed to read
+        headers = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        with http_client.get(url, headers=headers, stream=True, timeout=20) as response:
+            if response.status_code == 304 and cached is not None:
+                self.cache.revalidated += 1
+                self.cache.touch(url)
+                tracing.record_cache("page", "revalidated")
+                return {**cached, "skipped": False}
+            response.raise_for_status()  # Raise an exception for bad status codes
+
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if content_type and not content_type.startswith(TEXTUAL_CONTENT_TYPES):
+                return {"body": "", "content_type": content_type, "truncated": False, "skipped": True}
+
+            body = bytearray()
+            truncated = False
+            for chunk in response.iter_content(chunk_size=16 * 1024):
+                body.extend(chunk)
+                if len(body) >= self.max_bytes:
+                    del body[self.max_bytes:]
+                    truncated = True
+                    break
+
+            page = {
+                "body": bytes(body).decode(self._detect_encoding(response, body), errors="replace"),
+                "content_type": content_type,
+                "truncated": truncated,
+                "max_bytes": self.max_bytes,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+
+        if self.cache is not None:
+            self.cache.misses += 1
+            tracing.record_cache("page", "miss")
+            if page["etag"] or page["last_modified"]:
+                self.cache.put(url, page)
+        return {**page, "skipped": False}
+
+    @staticmethod
+    def _detect_encoding(response, body: bytearray) -> str:
+        # requests falls back to ISO-8859-1 for text/* without a charset, which mangles most modern pages
+        if "charset" in response.headers.get("Content-Type", "").lower() and response.encoding:
+            return response.encoding
+        match = re.search(rb"""<meta[^>]+charset=["']?([\w-]+)""", bytes(body[:4096]), re.IGNORECASE)
+        if match:
+            try:
+                return codecs.lookup(match.group(1).decode("ascii")).name
+            except LookupError:
+                pass
+        return "utf-8"
+
+    def __init__(self, max_bytes=None, max_output_length=10000, cache_dir=None, use_cache=True, engine=None, *args, **kwargs):
         self.is_initialized = False
+        self.engine = engine
+        self.max_bytes = max_bytes or int(os.getenv("VISIT_WEBPAGE_MAX_BYTES", 2_000_000))
+        self.max_output_length = max_output_length
+        self.cache = (
+            PageCache(cache_dir or os.getenv("VISIT_WEBPAGE_CACHE_DIR", DEFAULT_PAGE_CACHE_DIR))
+            if use_cache
+            else None
+        )
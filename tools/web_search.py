@@ -1,5 +1,11 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Optional
 from smolagents.tools import Tool
+from tools import http_client, rate_limit, research_index
+from tools.search_cache import SearchCache
 try:
     from ddgs import DDGS
 except ImportError:
@@ -14,18 +20,140 @@ class DuckDuckGoSearchTool(Tool):
     inputs = {'query': {'type': 'string', 'description': 'The search query to perform.'}}
     output_type = "string"
 
-    def __init__(self, max_results=10, **kwargs):
+    def __init__(self, max_results=10, max_workers=4, cache=True, endpoint=None, **kwargs):
         super().__init__()
         self.max_results = max_results
+        self.max_workers = max_workers
+        # `cache` may be a SearchCache, True (configured from WEB_SEARCH_CACHE_* env vars) or False
+        self.cache = SearchCache.from_env() if cache is True else (cache or None)
+        # A JSON search backend (e.g. a SearxNG instance or the offline benchmark's mock) replaces DuckDuckGo
+        self.endpoint = endpoint or os.getenv("WEB_SEARCH_ENDPOINT") or None
+        self._local = threading.local()
+        self.ddgs_kwargs = kwargs
+        self.ddgs = None
+        if self.endpoint:
+            return
         if DDGS is None:
             raise ImportError(
                 "You must install package `ddgs` to run this tool: run `pip install ddgs`."
             )
         self.ddgs = DDGS(**kwargs)
 
+    def _client(self):
+        """Return a DDGS session for the calling thread (the main one is kept for single queries)."""
+        if threading.current_thread() is threading.main_thread():
+            return self.ddgs
+        client = getattr(self._local, "ddgs", None)
+        if client is None:
+            client = DDGS(**self.ddgs_kwargs)
+            self._local.ddgs = client
+        return client
+
+    def _endpoint_search(self, query: str) -> list:
+        """GET {endpoint}?q=...&format=json; accepts a list of results or SearxNG's {"results": [...]}."""
+        response = http_client.get(self.endpoint, params={"q": query, "format": "json", "max_results": self.max_results})
+        response.raise_for_status()
+        data = response.json()
+        items = data.get("results", []) if isinstance(data, dict) else data
+        return [
+            {
+                "title": item.get("title", ""),
+                "href": item.get("href") or item.get("url", ""),
+                "body": item.get("body") or item.get("content", ""),
+            }
+            for item in items[: self.max_results]
+        ]
+
+    def _search(self, query: str) -> list:
+        if self.cache is not None:
+            cached = self.cache.get(query, self.max_results)
+            if cached is not None:
+                return cached
+        # Shared by every session: DuckDuckGo bans clients that send bursts of queries
+        if self.endpoint:
+            results = rate_limit.get_limiter("search_endpoint").call(self._endpoint_search, query)
+        else:
+            results = rate_limit.get_limiter("duckduckgo").call(self._client().text, query, max_results=self.max_results)
+        if self.cache is not None and results:
+            self.cache.set(query, self.max_results, results)
+        return results
+
+    @staticmethod
+    def _format_results(results: list) -> str:
+        postprocessed_results = [f"[{result['title']}]({result['href']})\n{result['body']}" for result in results]
+        return "\n\n".join(postprocessed_results)
+
     def forward(self, query: str) -> str:
-        results = self.ddgs.text(query, max_results=self.max_results)
+        results = self._search(query)
         if len(results) == 0:
             raise Exception("No results found! Try a less restrictive/shorter query.")
-        postprocessed_results = [f"[{result['title']}]({result['href']})\n{result['body']}" for result in results]
-        return "## Search Results\n\n" + "\n\n".join(postprocessed_results)
+        research_index.record_search_results(query, results)
+        return "## Search Results\n\n" + self._format_results(results)
+
+    def search_many(self, queries: list, max_workers: Optional[int] = None) -> dict:
+        """Run several queries concurrently and return {query: results} in input order.
+
+        Results are deduplicated by `href` across the whole batch: a link is kept under the
+        first query (in input order) that returned it. A query that fails maps to the exception
+        it raised instead of a list of results.
+        """
+        unique_queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+        if not unique_queries:
+            return {}
+
+        workers = max(1, min(max_workers or self.max_workers, len(unique_queries)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="web_search") as pool:
+            # Each query runs in a copy of the caller's context so its cache lookups count towards the caller's trace span
+            futures = {query: pool.submit(contextvars.copy_context().run, self._search, query) for query in unique_queries}
+
+        seen_hrefs = set()
+        merged = {}
+        for query, future in futures.items():
+            try:
+                results = future.result()
+            except Exception as e:
+                merged[query] = e
+                continue
+            kept = []
+            for result in results:
+                href = result.get("href")
+                if href in seen_hrefs:
+                    continue
+                seen_hrefs.add(href)
+                kept.append(result)
+            merged[query] = kept
+        return merged
+
+
+class MultiQueryWebSearchTool(Tool):
+    name = "web_search_many"
+    description = (
+        "Runs several duckduckgo web searches at once (e.g. one per city, product or person) and returns the "
+        "results grouped by query, with duplicate links removed. Prefer this over calling web_search in a loop."
+    )
+    inputs = {'queries': {'type': 'array', 'description': 'The list of search queries to perform.'}}
+    output_type = "string"
+
+    def __init__(self, search_tool: Optional[DuckDuckGoSearchTool] = None, max_workers=4, **kwargs):
+        super().__init__()
+        self.search_tool = search_tool or DuckDuckGoSearchTool(max_workers=max_workers, **kwargs)
+        self.max_workers = max_workers
+
+    def forward(self, queries: list) -> str:
+        if isinstance(queries, str):
+            queries = [queries]
+        batch = self.search_tool.search_many(queries, max_workers=self.max_workers)
+        if not batch:
+            raise Exception("No queries given! Pass a list of search strings.")
+
+        sections = []
+        for query, results in batch.items():
+            if isinstance(results, Exception):
+                body = f"Search failed: {results}"
+            elif len(results) == 0:
+                body = "No new results (none found, or all duplicates of earlier queries)."
+            else:
+                body = self.search_tool._format_results(results)
+                research_index.record_search_results(query, results)
+            sections.append(f"## Search Results for: {query}\n\n{body}")
+        return "\n\n".join(sections)